@@ -0,0 +1,203 @@
+"""
+PostgreSQL statistics for the monitoring dashboard.
+
+This module provides:
+- Row counts estimated from the planner statistics (pg_class.reltuples),
+  with exact COUNT(*) only on request
+- Per-table activity, size and dead-tuple (bloat) figures from
+  pg_stat_user_tables
+- Index usage and size from pg_stat_user_indexes
+- Caching of the collected figures for DATABASE_METRICS_CACHE_TTL seconds
+"""
+
+import os
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'api:database_metrics:{mode}'
+
+EXCLUDED_APPS = ('admin', 'auth', 'contenttypes', 'sessions')
+
+# Partitioned parents have no rows of their own; add up their partitions
+ESTIMATES_SQL = """
+    SELECT c.relname,
+           CASE WHEN c.relkind = 'p' THEN (
+               SELECT COALESCE(SUM(GREATEST(p.reltuples, 0)), 0)
+               FROM pg_inherits i JOIN pg_class p ON p.oid = i.inhrelid
+               WHERE i.inhparent = c.oid
+           ) ELSE GREATEST(c.reltuples, 0) END
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p')
+"""
+
+TABLES_SQL = """
+    SELECT relname, n_live_tup, n_dead_tup, seq_scan, seq_tup_read,
+           COALESCE(idx_scan, 0), n_tup_ins, n_tup_upd, n_tup_del,
+           pg_total_relation_size(relid), pg_relation_size(relid),
+           last_vacuum, last_autovacuum, last_analyze, last_autoanalyze
+    FROM pg_stat_user_tables
+    ORDER BY pg_total_relation_size(relid) DESC
+"""
+
+INDEXES_SQL = """
+    SELECT s.relname, s.indexrelname, s.idx_scan, s.idx_tup_read, s.idx_tup_fetch,
+           pg_relation_size(s.indexrelid), i.indisunique, i.indisprimary
+    FROM pg_stat_user_indexes s
+    JOIN pg_index i ON i.indexrelid = s.indexrelid
+    ORDER BY pg_relation_size(s.indexrelid) DESC
+"""
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _dead_ratio(live: int, dead: int) -> float:
+    total = live + dead
+    return round(dead / total, 4) if total else 0.0
+
+
+def _table_stats(cursor) -> List[Dict[str, Any]]:
+    cursor.execute(TABLES_SQL)
+    tables = []
+    for row in cursor.fetchall():
+        (name, live, dead, seq_scan, seq_tup_read, idx_scan, inserted, updated, deleted,
+         total_bytes, table_bytes, last_vacuum, last_autovacuum, last_analyze, last_autoanalyze) = row
+        scans = seq_scan + idx_scan
+        tables.append({
+            "table_name": name,
+            "row_count": live,
+            "dead_rows": dead,
+            # Share of dead tuples, a cheap stand-in for table bloat
+            "dead_ratio": _dead_ratio(live, dead),
+            "total_size_bytes": total_bytes,
+            "table_size_bytes": table_bytes,
+            "index_size_bytes": total_bytes - table_bytes,
+            "seq_scans": seq_scan,
+            "seq_rows_read": seq_tup_read,
+            "index_scans": idx_scan,
+            "index_scan_ratio": round(idx_scan / scans, 4) if scans else None,
+            "rows_inserted": inserted,
+            "rows_updated": updated,
+            "rows_deleted": deleted,
+            "last_vacuum": _isoformat(last_vacuum or last_autovacuum),
+            "last_analyze": _isoformat(last_analyze or last_autoanalyze),
+        })
+    return tables
+
+
+def _index_stats(cursor) -> List[Dict[str, Any]]:
+    cursor.execute(INDEXES_SQL)
+    return [
+        {
+            "table_name": table,
+            "index_name": index,
+            "scans": scans,
+            "rows_read": rows_read,
+            "rows_fetched": rows_fetched,
+            "size_bytes": size,
+            "unique": unique,
+            "primary": primary,
+            # Unique indexes enforce constraints even when never scanned
+            "unused": scans == 0 and not unique,
+        }
+        for table, index, scans, rows_read, rows_fetched, size, unique, primary in cursor.fetchall()
+    ]
+
+
+def _model_stats(estimates: Dict[str, float], exact: bool) -> List[Dict[str, Any]]:
+    model_stats = []
+    for model in apps.get_models():
+        if model._meta.app_label in EXCLUDED_APPS:
+            continue
+
+        stats = {
+            "model": f"{model._meta.app_label}.{model._meta.model_name}",
+            "table_name": model._meta.db_table,
+            "row_count": int(estimates.get(model._meta.db_table, 0)),
+            "estimated": True,
+            "fields": len(model._meta.fields),
+        }
+        if exact:
+            try:
+                stats["row_count"] = model.objects.count()
+                stats["estimated"] = False
+            except Exception as e:
+                logger.warning(f"Could not count rows of {stats['model']}: {str(e)}")
+        model_stats.append(stats)
+    return model_stats
+
+
+def collect_database_metrics(exact: bool = False) -> Dict[str, Any]:
+    """
+    Collect database metrics.
+
+    Row counts come from the planner statistics, which are refreshed by
+    (auto)analyze. With `exact` every model table is counted instead, which
+    scans each table.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT version(), pg_database_size(current_database())")
+        version, db_size_bytes = cursor.fetchone()
+
+        cursor.execute("SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()")
+        connection_count = cursor.fetchone()[0]
+
+        cursor.execute(ESTIMATES_SQL)
+        estimates = dict(cursor.fetchall())
+
+        table_stats = _table_stats(cursor)
+        index_stats = _index_stats(cursor)
+
+    total_live = sum(table["row_count"] for table in table_stats)
+    total_dead = sum(table["dead_rows"] for table in table_stats)
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "version": version,
+        "host": os.environ.get("DB_HOST", "postgres"),
+        "port": os.environ.get("DB_PORT", "5432"),
+        "size_bytes": db_size_bytes,
+        "size_mb": round(db_size_bytes / (1024 * 1024), 2),
+        "connections": connection_count,
+        "row_counts": "exact" if exact else "estimated",
+        "bloat": {
+            "dead_rows": total_dead,
+            "dead_ratio": _dead_ratio(total_live, total_dead),
+        },
+        "tables": table_stats,
+        "indexes": index_stats,
+        "unused_indexes": [index["index_name"] for index in index_stats if index["unused"]],
+        "models": _model_stats(estimates, exact),
+    }
+
+
+def get_database_metrics(exact: bool = False, refresh: bool = False) -> Dict[str, Any]:
+    """Get database metrics, cached for DATABASE_METRICS_CACHE_TTL seconds"""
+    key = CACHE_KEY.format(mode='exact' if exact else 'estimated')
+
+    if not refresh:
+        try:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            logger.warning(f"Could not read cached database metrics: {str(e)}")
+
+    metrics = collect_database_metrics(exact)
+
+    try:
+        cache.set(key, metrics, getattr(settings, 'DATABASE_METRICS_CACHE_TTL', 60))
+    except Exception as e:
+        logger.warning(f"Could not cache database metrics: {str(e)}")
+
+    return metrics
@@ -0,0 +1,172 @@
+"""
+Health checks for liveness and readiness probes.
+
+This module provides:
+- Component checks for the database, Redis, the Celery queues and the
+  panels' circuit breakers
+- Reuse of pooled connections (Django's database connection, the
+  django-redis pool and one broker client per process)
+- A short per-process cache of component results, so frequent probes do
+  not turn into a query per probe
+- A summary without panel names, queue names or error messages for
+  anonymous callers
+"""
+
+import asyncio
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, Optional
+
+import redis
+from django.conf import settings
+from django.db import connection
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+STATUS_HEALTHY = 'healthy'
+STATUS_WARNING = 'warning'
+STATUS_UNHEALTHY = 'unhealthy'
+
+STARTED_AT = time.time()
+
+_results: Dict[str, tuple] = {}
+_results_lock = threading.Lock()
+_broker: Optional[redis.Redis] = None
+
+
+def _cached(name: str, check: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """Run a component check at most once per HEALTH_CHECK_CACHE_TTL seconds"""
+    now = time.monotonic()
+    with _results_lock:
+        cached = _results.get(name)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    try:
+        result = check()
+    except Exception as e:
+        result = {'status': STATUS_UNHEALTHY, 'error': str(e)}
+
+    with _results_lock:
+        _results[name] = (now + getattr(settings, 'HEALTH_CHECK_CACHE_TTL', 5), result)
+    return result
+
+
+def _get_broker() -> redis.Redis:
+    """Redis client of the Celery broker, pooled for the process"""
+    global _broker
+    if _broker is None:
+        _broker = redis.Redis.from_url(settings.CELERY_BROKER_URL, socket_timeout=2, socket_connect_timeout=2)
+    return _broker
+
+
+def check_database() -> Dict[str, Any]:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    return {'status': STATUS_HEALTHY, 'error': None}
+
+
+def check_redis() -> Dict[str, Any]:
+    get_redis_connection('default').ping()
+    return {'status': STATUS_HEALTHY, 'error': None}
+
+
+def check_celery_queues() -> Dict[str, Any]:
+    """Number of tasks waiting in each Celery queue"""
+    broker = _get_broker()
+    queues = getattr(settings, 'HEALTH_CHECK_CELERY_QUEUES', ['celery'])
+    depths = dict(zip(queues, [broker.llen(queue) for queue in queues]))
+    limit = getattr(settings, 'HEALTH_CHECK_QUEUE_DEPTH_WARNING', 1000)
+
+    backlog = [queue for queue, depth in depths.items() if depth > limit]
+    return {
+        'status': STATUS_WARNING if backlog else STATUS_HEALTHY,
+        'error': f"Queue backlog over {limit} tasks: {', '.join(backlog)}" if backlog else None,
+        'queues': depths,
+    }
+
+
+def check_panels() -> Dict[str, Any]:
+    """Circuit breaker state of every active server's panel"""
+    from main.models import Server
+    from v2ray.async_utils import run_async
+    from v2ray.circuit_breaker import CircuitBreaker, STATE_CLOSED
+
+    servers = list(Server.objects.filter(is_active=True))
+
+    async def get_states():
+        return await asyncio.gather(*[CircuitBreaker.for_server(server).get_state() for server in servers])
+
+    states = run_async(get_states(), timeout=5) if servers else []
+    panels = {
+        server.name: state['state']
+        for server, state in zip(servers, states)
+    }
+    down = [name for name, state in panels.items() if state != STATE_CLOSED]
+
+    return {
+        'status': STATUS_WARNING if down else STATUS_HEALTHY,
+        'error': f"Panels marked down: {', '.join(down)}" if down else None,
+        'panels': panels,
+    }
+
+
+def liveness() -> Dict[str, Any]:
+    """Process is up and serving requests; no external calls"""
+    return {
+        'status': 'ok',
+        'uptime_seconds': time.time() - STARTED_AT,
+    }
+
+
+def readiness() -> Dict[str, Any]:
+    """
+    Check every component.
+
+    The database and Redis are required: if either is unhealthy the status
+    is 'unavailable'. Open panel circuits and a Celery backlog only mark the
+    service 'degraded', since the API can still serve requests.
+    """
+    components = {
+        'database': _cached('database', check_database),
+        'redis': _cached('redis', check_redis),
+        'celery': _cached('celery', check_celery_queues),
+        'panels': _cached('panels', check_panels),
+    }
+
+    if any(components[name]['status'] == STATUS_UNHEALTHY for name in ('database', 'redis')):
+        overall = 'unavailable'
+    elif any(component['status'] != STATUS_HEALTHY for component in components.values()):
+        overall = 'degraded'
+    else:
+        overall = 'ok'
+
+    return {
+        'status': overall,
+        'uptime_seconds': time.time() - STARTED_AT,
+        'components': components,
+    }
+
+
+def public_summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Readiness result reduced to what anonymous callers may see: the overall
+    status, each component's status and how many panels are marked down.
+    """
+    components = {
+        name: {'status': component['status']}
+        for name, component in result['components'].items()
+    }
+    panels = result['components'].get('panels', {}).get('panels')
+    if panels is not None:
+        from v2ray.circuit_breaker import STATE_CLOSED
+        components['panels']['total'] = len(panels)
+        components['panels']['down'] = sum(1 for state in panels.values() if state != STATE_CLOSED)
+
+    return {
+        'status': result['status'],
+        'uptime_seconds': result['uptime_seconds'],
+        'components': components,
+    }
@@ -0,0 +1,318 @@
+"""
+Background sampling of host and container metrics.
+
+This module provides:
+- A sampler thread per process that collects a metric snapshot on an
+  interval into a fixed-size ring buffer
+- Collectors for host metrics (psutil) and Docker container stats, with
+  container stats fetched concurrently
+
+The monitoring endpoints read the latest snapshot instead of measuring on
+every request, so a poll no longer blocks a worker for seconds.
+"""
+
+import os
+import re
+import socket
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import psutil
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+GB = 1024 * 1024 * 1024
+
+
+class MetricsSampler:
+    """Collects snapshots on an interval in a daemon thread"""
+
+    def __init__(self, name: str, collect: Callable[[], Dict[str, Any]], interval: float,
+                 history_size: int, prime: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.collect = collect
+        self.interval = interval
+        self.prime = prime
+        self.snapshots = deque(maxlen=history_size)
+        self.last_error: Optional[Exception] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def start(self) -> None:
+        """Start the sampler thread unless it is already running in this process"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f"metrics-sampler-{self.name}", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        if self.prime:
+            self.prime()
+        while True:
+            started = time.monotonic()
+            self.sample()
+            time.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+    def sample(self) -> Optional[Dict[str, Any]]:
+        """Collect one snapshot into the buffer"""
+        try:
+            snapshot = self.collect()
+        except Exception as e:
+            logger.error(f"Error collecting {self.name} metrics: {str(e)}")
+            self.last_error = e
+            self._ready.set()
+            return None
+
+        self.last_error = None
+        self.snapshots.append(snapshot)
+        self._ready.set()
+        return snapshot
+
+    def latest(self, wait: float = 0) -> Optional[Dict[str, Any]]:
+        """
+        Get the most recent snapshot.
+
+        Starts the sampler if needed and waits up to `wait` seconds for the
+        first snapshot of a freshly started sampler.
+        """
+        self.start()
+        if wait:
+            self._ready.wait(wait)
+        return self.snapshots[-1] if self.snapshots else None
+
+    def history(self, count: int) -> List[Dict[str, Any]]:
+        """Get up to `count` of the most recent snapshots, oldest first"""
+        if count <= 0:
+            return []
+        return list(self.snapshots)[-count:]
+
+
+def _prime_cpu() -> None:
+    """Make the first non-blocking CPU reading measure a real interval"""
+    psutil.cpu_percent(interval=None, percpu=True)
+    psutil.cpu_times_percent(interval=None)
+    time.sleep(0.5)
+
+
+def collect_system_metrics() -> Dict[str, Any]:
+    """Host CPU, memory, disk and network snapshot"""
+    # Non-blocking: measured since the previous call, i.e. one sampling interval
+    cpu_percent = psutil.cpu_percent(interval=None, percpu=True)
+    cpu_times = psutil.cpu_times_percent(interval=None)
+
+    virtual_memory = psutil.virtual_memory()
+    swap_memory = psutil.swap_memory()
+    disk_usage = psutil.disk_usage('/')
+    disk_io = psutil.disk_io_counters()
+    net_io = psutil.net_io_counters()
+    load_avg = psutil.getloadavg()
+    boot_time = psutil.boot_time()
+
+    try:
+        net_connections = len(psutil.net_connections())
+    except psutil.AccessDenied:
+        net_connections = None
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "hostname": socket.gethostname(),
+        "boot_time": datetime.fromtimestamp(boot_time).isoformat(),
+        "uptime_seconds": int(time.time() - boot_time),
+        "cpu": {
+            "percent_per_core": cpu_percent,
+            "average": sum(cpu_percent) / len(cpu_percent),
+            "cores": len(cpu_percent),
+            "times_percent": {
+                "user": cpu_times.user,
+                "system": cpu_times.system,
+                "idle": cpu_times.idle,
+            }
+        },
+        "memory": {
+            "total_mb": round(virtual_memory.total / MB, 2),
+            "available_mb": round(virtual_memory.available / MB, 2),
+            "used_mb": round(virtual_memory.used / MB, 2),
+            "percent": virtual_memory.percent,
+            "swap_total_mb": round(swap_memory.total / MB, 2),
+            "swap_used_mb": round(swap_memory.used / MB, 2),
+            "swap_percent": swap_memory.percent,
+        },
+        "disk": {
+            "total_gb": round(disk_usage.total / GB, 2),
+            "used_gb": round(disk_usage.used / GB, 2),
+            "free_gb": round(disk_usage.free / GB, 2),
+            "percent": disk_usage.percent,
+            "read_mb": round(disk_io.read_bytes / MB, 2) if disk_io else None,
+            "write_mb": round(disk_io.write_bytes / MB, 2) if disk_io else None,
+        },
+        "network": {
+            "bytes_sent_mb": round(net_io.bytes_sent / MB, 2),
+            "bytes_recv_mb": round(net_io.bytes_recv / MB, 2),
+            "packets_sent": net_io.packets_sent,
+            "packets_recv": net_io.packets_recv,
+            "connections": net_connections,
+        },
+        "load_average": {
+            "1min": load_avg[0],
+            "5min": load_avg[1],
+            "15min": load_avg[2],
+        },
+        "processes": {
+            "count": len(psutil.pids()),
+        }
+    }
+
+
+def container_cpu_percent(stats: Dict[str, Any]) -> float:
+    """CPU usage of a container from a Docker stats payload"""
+    cpu_stats = stats.get('cpu_stats', {})
+    precpu_stats = stats.get('precpu_stats', {})
+    cpu_delta = cpu_stats.get('cpu_usage', {}).get('total_usage', 0) - precpu_stats.get('cpu_usage', {}).get('total_usage', 0)
+    system_cpu_delta = cpu_stats.get('system_cpu_usage', 0) - precpu_stats.get('system_cpu_usage', 0)
+    if system_cpu_delta <= 0 or cpu_delta <= 0:
+        return 0.0
+    # percpu_usage is absent on cgroup v2 hosts
+    cores = cpu_stats.get('online_cpus') or len(cpu_stats.get('cpu_usage', {}).get('percpu_usage') or [1])
+    return (cpu_delta / system_cpu_delta) * 100.0 * cores
+
+
+def container_memory_percent(stats: Dict[str, Any]) -> float:
+    """Memory usage of a container from a Docker stats payload"""
+    memory_stats = stats.get('memory_stats', {})
+    if memory_stats.get('usage') and memory_stats.get('limit'):
+        return (memory_stats['usage'] / memory_stats['limit']) * 100.0
+    return 0.0
+
+
+def _created_at(value) -> datetime:
+    """Container creation time in UTC; Docker reports an RFC 3339 string"""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc)
+    # fromisoformat wants a numeric offset and exactly six fractional digits,
+    # Docker sends a Z suffix and up to nine
+    value = value.replace('Z', '+00:00')
+    value = re.sub(r'\.(\d+)', lambda match: '.' + match.group(1)[:6].ljust(6, '0'), value)
+    created = datetime.fromisoformat(value)
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return created
+
+
+def _container_snapshot(container) -> Dict[str, Any]:
+    stats = container.stats(stream=False)
+    start_time = _created_at(container.attrs['Created'])
+
+    # Get container logs (last 5 lines)
+    logs = container.logs(tail=5, timestamps=True).decode('utf-8').strip().split('\n')
+    if logs == ['']:
+        logs = []
+
+    return {
+        "id": container.id[:12],
+        "name": container.name,
+        "image": container.image.tags[0] if container.image.tags else container.image.id[:12],
+        "status": container.status,
+        "state": container.attrs['State'],
+        "created": start_time.isoformat(),
+        "uptime": str(datetime.now(timezone.utc) - start_time).split('.')[0],
+        "ports": container.ports,
+        "cpu_percent": round(container_cpu_percent(stats), 2),
+        "memory_percent": round(container_memory_percent(stats), 2),
+        "recent_logs": logs
+    }
+
+
+class ContainerCollector:
+    """Collects stats of the MRJBot containers, one Docker call per container in parallel"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._client = None
+
+    def _docker(self):
+        if self._client is None:
+            import docker
+            self._client = docker.from_env()
+        return self._client
+
+    def __call__(self) -> Dict[str, Any]:
+        try:
+            containers = self._docker().containers.list(all=True, filters={"name": "mrjbot"})
+        except Exception:
+            # Reconnect on the next sample
+            self._client = None
+            raise
+
+        container_data = []
+        if containers:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(containers))) as executor:
+                futures = [executor.submit(_container_snapshot, container) for container in containers]
+            for container, future in zip(containers, futures):
+                try:
+                    container_data.append(future.result())
+                except Exception as e:
+                    logger.warning(f"Error fetching stats of container {container.name}: {str(e)}")
+                    container_data.append({
+                        "id": container.id[:12],
+                        "name": container.name,
+                        "status": container.status,
+                        "error": str(e),
+                    })
+
+        boot_time = psutil.boot_time()
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "system": {
+                "cpu_percent": psutil.cpu_percent(interval=None),
+                "memory_percent": psutil.virtual_memory().percent,
+                "disk_percent": psutil.disk_usage('/').percent,
+                "hostname": socket.gethostname(),
+                "uptime_seconds": int(time.time() - boot_time)
+            },
+            "containers": container_data
+        }
+
+
+_samplers: Dict[str, MetricsSampler] = {}
+_samplers_lock = threading.Lock()
+
+
+def _get_sampler(name: str, factory: Callable[[], MetricsSampler]) -> MetricsSampler:
+    with _samplers_lock:
+        sampler = _samplers.get(name)
+        if sampler is None:
+            sampler = _samplers[name] = factory()
+        return sampler
+
+
+def get_system_sampler() -> MetricsSampler:
+    """Get the host metrics sampler of this process"""
+    return _get_sampler('system', lambda: MetricsSampler(
+        'system',
+        collect_system_metrics,
+        interval=getattr(settings, 'MONITORING_SYSTEM_SAMPLE_INTERVAL', 5),
+        history_size=getattr(settings, 'MONITORING_HISTORY_SIZE', 120),
+        prime=_prime_cpu,
+    ))
+
+
+def get_container_sampler() -> MetricsSampler:
+    """Get the Docker container metrics sampler of this process"""
+    return _get_sampler('containers', lambda: MetricsSampler(
+        'containers',
+        ContainerCollector(getattr(settings, 'MONITORING_DOCKER_WORKERS', 8)),
+        interval=getattr(settings, 'MONITORING_CONTAINER_SAMPLE_INTERVAL', 15),
+        history_size=getattr(settings, 'MONITORING_HISTORY_SIZE', 120),
+        prime=_prime_cpu,
+    ))
@@ -0,0 +1,35 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from api import database_stats
+
+
+class DatabaseMetricsCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = {}
+        cache = mock.Mock()
+        cache.get.side_effect = self.cache.get
+        cache.set.side_effect = lambda key, value, ttl: self.cache.__setitem__(key, value)
+        for target, value in (('cache', cache), ('collect_database_metrics', mock.Mock(side_effect=lambda exact: {'exact': exact}))):
+            patcher = mock.patch.object(database_stats, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_result_is_cached_per_mode(self):
+        database_stats.get_database_metrics()
+        database_stats.get_database_metrics()
+        database_stats.get_database_metrics(exact=True)
+
+        self.assertEqual(database_stats.collect_database_metrics.call_count, 2)
+        self.assertEqual(self.cache['api:database_metrics:exact'], {'exact': True})
+
+    def test_refresh_skips_cache(self):
+        database_stats.get_database_metrics()
+        database_stats.get_database_metrics(refresh=True)
+
+        self.assertEqual(database_stats.collect_database_metrics.call_count, 2)
+
+    def test_dead_ratio(self):
+        self.assertEqual(database_stats._dead_ratio(75, 25), 0.25)
+        self.assertEqual(database_stats._dead_ratio(0, 0), 0.0)
@@ -0,0 +1,72 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from api import health
+
+
+@override_settings(HEALTH_CHECK_CACHE_TTL=60)
+class ReadinessTest(SimpleTestCase):
+    def setUp(self):
+        health._results.clear()
+        self.addCleanup(health._results.clear)
+
+    def patch_checks(self, **results):
+        checks = {
+            'check_database': {'status': health.STATUS_HEALTHY, 'error': None},
+            'check_redis': {'status': health.STATUS_HEALTHY, 'error': None},
+            'check_celery_queues': {'status': health.STATUS_HEALTHY, 'error': None},
+            'check_panels': {'status': health.STATUS_HEALTHY, 'error': None},
+        }
+        checks.update(results)
+        mocks = {}
+        for name, result in checks.items():
+            patcher = mock.patch.object(health, name, mock.Mock(return_value=result))
+            mocks[name] = patcher.start()
+            self.addCleanup(patcher.stop)
+        return mocks
+
+    def test_all_healthy(self):
+        self.patch_checks()
+        self.assertEqual(health.readiness()['status'], 'ok')
+
+    def test_open_circuit_only_degrades(self):
+        self.patch_checks(check_panels={'status': health.STATUS_WARNING, 'error': 'down'})
+        self.assertEqual(health.readiness()['status'], 'degraded')
+
+    def test_database_failure_is_unavailable(self):
+        self.patch_checks()
+        health.check_database.side_effect = Exception('connection refused')
+
+        result = health.readiness()
+        self.assertEqual(result['status'], 'unavailable')
+        self.assertEqual(result['components']['database']['error'], 'connection refused')
+
+    def test_results_are_cached(self):
+        mocks = self.patch_checks()
+        health.readiness()
+        health.readiness()
+        self.assertEqual(mocks['check_database'].call_count, 1)
+
+
+class PublicSummaryTest(SimpleTestCase):
+    def test_hides_panel_names_and_errors(self):
+        result = {
+            'status': 'degraded',
+            'uptime_seconds': 10,
+            'components': {
+                'database': {'status': health.STATUS_HEALTHY, 'error': None},
+                'redis': {'status': health.STATUS_UNHEALTHY, 'error': 'Error 111 connecting to redis:6379'},
+                'panels': {
+                    'status': health.STATUS_WARNING,
+                    'error': 'Panels marked down: de-1',
+                    'panels': {'de-1': 'open', 'nl-1': 'closed'},
+                },
+            },
+        }
+
+        summary = health.public_summary(result)
+        self.assertEqual(summary['status'], 'degraded')
+        self.assertEqual(summary['components']['redis'], {'status': health.STATUS_UNHEALTHY})
+        self.assertEqual(summary['components']['panels'], {'status': health.STATUS_WARNING, 'total': 2, 'down': 1})
+        self.assertNotIn('de-1', str(summary))
@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+
+from django.test import SimpleTestCase
+
+from api.metrics_sampler import MetricsSampler, _created_at, container_cpu_percent, container_memory_percent
+
+
+class MetricsSamplerTest(SimpleTestCase):
+    def make_sampler(self, collect, history_size=3):
+        return MetricsSampler('test', collect, interval=60, history_size=history_size)
+
+    def test_ring_buffer_keeps_latest_snapshots(self):
+        counter = iter(range(10))
+        sampler = self.make_sampler(lambda: {'n': next(counter)})
+        for _ in range(5):
+            sampler.sample()
+
+        self.assertEqual([s['n'] for s in sampler.snapshots], [2, 3, 4])
+        self.assertEqual([s['n'] for s in sampler.history(2)], [3, 4])
+        self.assertEqual(sampler.history(0), [])
+
+    def test_failed_sample_keeps_previous_snapshot(self):
+        results = [{'n': 1}, RuntimeError('boom')]
+
+        def collect():
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        sampler = self.make_sampler(collect)
+        sampler.sample()
+        self.assertIsNone(sampler.sample())
+        self.assertEqual(sampler.snapshots[-1], {'n': 1})
+        self.assertEqual(str(sampler.last_error), 'boom')
+
+
+class ContainerStatsTest(SimpleTestCase):
+    def test_cpu_percent_uses_online_cpus(self):
+        stats = {
+            'cpu_stats': {'cpu_usage': {'total_usage': 300}, 'system_cpu_usage': 2000, 'online_cpus': 2},
+            'precpu_stats': {'cpu_usage': {'total_usage': 100}, 'system_cpu_usage': 1000},
+        }
+        self.assertEqual(container_cpu_percent(stats), 40.0)
+
+    def test_cpu_percent_without_previous_sample(self):
+        self.assertEqual(container_cpu_percent({'cpu_stats': {}, 'precpu_stats': {}}), 0.0)
+
+    def test_memory_percent(self):
+        self.assertEqual(container_memory_percent({'memory_stats': {'usage': 50, 'limit': 200}}), 25.0)
+        self.assertEqual(container_memory_percent({'memory_stats': {}}), 0.0)
+
+    def test_created_at_is_utc(self):
+        expected = datetime(2024, 5, 1, 12, 38, 41, 123456, tzinfo=timezone.utc)
+        self.assertEqual(_created_at('2024-05-01T12:38:41.123456789Z'), expected)
+        self.assertEqual(_created_at('2024-05-01T16:08:41.123456789+03:30'), expected)
+        self.assertEqual(_created_at('2024-05-01T12:38:41.1Z'), expected.replace(microsecond=100000))
+        self.assertEqual(_created_at('2024-05-01T12:38:41Z'), expected.replace(microsecond=0))
+        self.assertEqual(_created_at(expected.timestamp()), expected)
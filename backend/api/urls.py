@@ -28,6 +28,8 @@ urlpatterns = [
     path('bot/config/', views.BotConfigView.as_view(), name='bot-config'),
     # Add health check endpoint
     path('health/', views.health_check, name='health_check'),
+    path('health/live/', views.health_live, name='health_live'),
+    path('health/ready/', views.health_check, name='health_ready'),
     # Add container metrics endpoint
     path('metrics/containers/', views.container_metrics, name='container_metrics'),
     # Add database metrics endpoint
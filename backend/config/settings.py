@@ -305,6 +305,55 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# 3x-UI Panel Settings
+THREEXUI_API_TIMEOUT = env.int('THREEXUI_API_TIMEOUT', default=30)
+THREEXUI_SESSION_EXPIRY = env.int('THREEXUI_SESSION_EXPIRY', default=3600)
+THREEXUI_MAX_RETRIES = env.int('THREEXUI_MAX_RETRIES', default=3)
+THREEXUI_RETRY_DELAY = env.float('THREEXUI_RETRY_DELAY', default=1.0)  # Base backoff delay in seconds
+THREEXUI_RETRY_MAX_DELAY = env.float('THREEXUI_RETRY_MAX_DELAY', default=30.0)
+THREEXUI_MAX_CONNECTIONS = env.int('THREEXUI_MAX_CONNECTIONS', default=100)
+THREEXUI_KEEPALIVE_EXPIRY = env.int('THREEXUI_KEEPALIVE_EXPIRY', default=60)
+THREEXUI_VERIFY_SSL = env.bool('THREEXUI_VERIFY_SSL', default=True)
+THREEXUI_CONNECT_TIMEOUT = env.int('THREEXUI_CONNECT_TIMEOUT', default=5)
+# Circuit breaker state must live in the same Redis database the bot uses
+THREEXUI_CIRCUIT_REDIS_URL = env('REDIS_URL', default='redis://redis:6379/0')
+THREEXUI_CIRCUIT_FAILURE_THRESHOLD = env.int('THREEXUI_CIRCUIT_FAILURE_THRESHOLD', default=5)
+THREEXUI_CIRCUIT_RECOVERY_TIMEOUT = env.int('THREEXUI_CIRCUIT_RECOVERY_TIMEOUT', default=30)
+
+# V2Ray Sync Settings
+V2RAY_SYNC_BATCH_SIZE = env.int('V2RAY_SYNC_BATCH_SIZE', default=500)
+V2RAY_SYNC_HASH_TTL = env.int('V2RAY_SYNC_HASH_TTL', default=3600)  # Full row comparison at least this often
+V2RAY_SYNC_CONCURRENCY = env.int('V2RAY_SYNC_CONCURRENCY', default=10)  # Servers synced at the same time
+V2RAY_SYNC_SERVER_TIMEOUT = env.int('V2RAY_SYNC_SERVER_TIMEOUT', default=60)
+V2RAY_SYNC_REDIS_URL = env('REDIS_URL', default='redis://redis:6379/0')
+V2RAY_SYNC_BASE_INTERVAL = env.int('V2RAY_SYNC_BASE_INTERVAL', default=300)
+V2RAY_SYNC_MIN_INTERVAL = env.int('V2RAY_SYNC_MIN_INTERVAL', default=60)
+V2RAY_SYNC_MAX_INTERVAL = env.int('V2RAY_SYNC_MAX_INTERVAL', default=1800)
+V2RAY_SYNC_LEASE_TTL = env.int('V2RAY_SYNC_LEASE_TTL', default=30)  # Renewed every third of the TTL while held
+V2RAY_TRAFFIC_HOURLY_AFTER = env.int('V2RAY_TRAFFIC_HOURLY_AFTER', default=6)  # Hours of 5-minute samples
+V2RAY_TRAFFIC_DAILY_AFTER = env.int('V2RAY_TRAFFIC_DAILY_AFTER', default=7)  # Days of hourly samples
+V2RAY_TRAFFIC_RETENTION_DAYS = env.int('V2RAY_TRAFFIC_RETENTION_DAYS', default=365)
+V2RAY_METRICS_RAW_RETENTION_DAYS = env.int('V2RAY_METRICS_RAW_RETENTION_DAYS', default=7)
+V2RAY_METRICS_HOURLY_RETENTION_DAYS = env.int('V2RAY_METRICS_HOURLY_RETENTION_DAYS', default=90)
+V2RAY_METRICS_DELETE_BATCH_SIZE = env.int('V2RAY_METRICS_DELETE_BATCH_SIZE', default=5000)
+V2RAY_ROTATION_LOG_RETENTION_DAYS = env.int('V2RAY_ROTATION_LOG_RETENTION_DAYS', default=7)
+V2RAY_SERVER_MONITOR_RETENTION_DAYS = env.int('V2RAY_SERVER_MONITOR_RETENTION_DAYS', default=30)
+V2RAY_PARTITION_PREMAKE_DAYS = env.int('V2RAY_PARTITION_PREMAKE_DAYS', default=14)  # Partitions created ahead of time
+
+# Monitoring Settings
+MONITORING_SYSTEM_SAMPLE_INTERVAL = env.int('MONITORING_SYSTEM_SAMPLE_INTERVAL', default=5)
+MONITORING_CONTAINER_SAMPLE_INTERVAL = env.int('MONITORING_CONTAINER_SAMPLE_INTERVAL', default=15)
+MONITORING_HISTORY_SIZE = env.int('MONITORING_HISTORY_SIZE', default=120)  # Snapshots kept per sampler
+MONITORING_DOCKER_WORKERS = env.int('MONITORING_DOCKER_WORKERS', default=8)  # Containers queried at the same time
+MONITORING_FIRST_SAMPLE_WAIT = env.int('MONITORING_FIRST_SAMPLE_WAIT', default=3)
+DATABASE_METRICS_CACHE_TTL = env.int('DATABASE_METRICS_CACHE_TTL', default=60)
+# Bearer token required by /metrics; without it /metrics is only served with DEBUG on.
+# Set PROMETHEUS_MULTIPROC_DIR for Celery/gunicorn workers
+PROMETHEUS_METRICS_TOKEN = env('PROMETHEUS_METRICS_TOKEN', default='')
+HEALTH_CHECK_CACHE_TTL = env.int('HEALTH_CHECK_CACHE_TTL', default=5)  # Seconds a component result is reused
+HEALTH_CHECK_CELERY_QUEUES = env.list('HEALTH_CHECK_CELERY_QUEUES', default=['celery'])
+HEALTH_CHECK_QUEUE_DEPTH_WARNING = env.int('HEALTH_CHECK_QUEUE_DEPTH_WARNING', default=1000)
+
 # Email Settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = env('EMAIL_HOST', default='smtp.gmail.com')
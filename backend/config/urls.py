@@ -22,6 +22,7 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
 from api.views import monitoring_dashboard
+from main.metrics import metrics_view
 
 # Swagger documentation settings
 schema_view = get_schema_view(
@@ -48,6 +49,7 @@ urlpatterns = [
     path('api/v1/services/', include('main.urls')),
     path('api/v1/payments/', include('payments.urls')),
     path('api/v1/notifications/', include('telegrambot.urls')),
+    path('api/v1/v2ray/', include('v2ray.urls')),
     
     # Authentication
     path('accounts/', include('allauth.urls')),
@@ -59,6 +61,9 @@ urlpatterns = [
 
     # Add monitoring dashboard
     path('admin/monitoring/', monitoring_dashboard, name='monitoring_dashboard'),
+
+    # Prometheus scrape endpoint
+    path('metrics', metrics_view, name='prometheus_metrics'),
 ]
 
 # Serve media files in development
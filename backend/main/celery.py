@@ -24,12 +24,16 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
 
+# Record task durations (connects the task_prerun/task_postrun signals)
+import main.metrics  # noqa: E402,F401
+
 # Configure Celery beat schedule
 app.conf.beat_schedule = {
     # Server synchronization tasks
-    'sync-servers': {
-        'task': 'v2ray.tasks.sync_servers',
-        'schedule': 300.0,  # Every 5 minutes
+    # Due servers are picked by the adaptive scheduler (v2ray.sync_scheduler)
+    'dispatch-server-syncs': {
+        'task': 'v2ray.tasks.dispatch_server_syncs',
+        'schedule': 15.0,  # Every 15 seconds
     },
     'monitor-servers': {
         'task': 'v2ray.tasks.monitor_servers',
@@ -39,10 +43,22 @@ app.conf.beat_schedule = {
         'task': 'v2ray.tasks.check_server_health',
         'schedule': 900.0,  # Every 15 minutes
     },
+    'aggregate-monitoring-data': {
+        'task': 'v2ray.tasks.aggregate_monitoring_data',
+        'schedule': crontab(minute=10),  # Every hour
+    },
     'cleanup-monitoring-data': {
         'task': 'v2ray.tasks.cleanup_old_monitoring_data',
         'schedule': crontab(hour=0, minute=0),  # Daily at midnight
     },
+    'rollup-client-traffic': {
+        'task': 'v2ray.tasks.rollup_client_traffic',
+        'schedule': crontab(minute=5),  # Every hour
+    },
+    'maintain-monitoring-partitions': {
+        'task': 'v2ray.tasks.maintain_monitoring_partitions',
+        'schedule': crontab(hour=0, minute=15),  # Daily at 00:15
+    },
     'update-seller-commissions': {
         'task': 'v2ray.tasks.update_seller_commissions',
         'schedule': crontab(hour=0, minute=30),  # Daily at 00:30
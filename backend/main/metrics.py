@@ -0,0 +1,143 @@
+"""
+Prometheus metrics for the backend and Celery workers.
+
+This module provides:
+- 3x-UI panel request latency and errors per panel and endpoint
+  (same metric names as the bot's bot/utils/metrics.py)
+- Duration of the v2ray.tasks.* Celery tasks, recorded from task signals
+- Notification send counts
+- The /metrics view
+
+Celery prefork workers and web workers are separate processes. Set
+PROMETHEUS_MULTIPROC_DIR to a directory shared by all of them and the view
+reports the metrics of every process.
+"""
+
+import os
+import hmac
+import time
+import logging
+from urllib.parse import urlparse
+
+import httpx
+from celery.signals import task_prerun, task_postrun
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+
+logger = logging.getLogger(__name__)
+
+PANEL_REQUEST_LATENCY = Histogram(
+    'threexui_request_duration_seconds',
+    'Latency of 3x-UI panel requests',
+    ['panel', 'endpoint', 'method']
+)
+PANEL_REQUEST_ERRORS = Counter(
+    'threexui_request_errors_total',
+    'Failed 3x-UI panel requests',
+    ['panel', 'endpoint', 'reason']
+)
+TASK_DURATION = Histogram(
+    'celery_task_duration_seconds',
+    'Run time of v2ray Celery tasks',
+    ['task', 'state'],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+NOTIFICATIONS = Counter(
+    'backend_notifications_total',
+    'Notifications handled, by channel and outcome',
+    ['channel', 'status']
+)
+
+TASK_PREFIX = 'v2ray.tasks.'
+
+
+def endpoint_label(path: str) -> str:
+    """Reduce a panel request path to its /panel/api/<group>/<action> prefix"""
+    parts = [part for part in path.split('/') if part]
+    for i in range(len(parts) - 1):
+        if parts[i] == 'panel' and parts[i + 1] == 'api':
+            return '/' + '/'.join(parts[i:i + 4])
+    if parts and parts[-1] == 'login':
+        # Panels may be served under a secret base path
+        return '/login'
+    return '/' + '/'.join('{id}' if part.isdigit() else part for part in parts)
+
+
+def panel_label(base_url: str) -> str:
+    return urlparse(base_url).netloc or base_url
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records latency and errors of panel requests"""
+
+    def __init__(self, transport, base_url):
+        self.transport = transport
+        self.panel = panel_label(base_url)
+
+    async def handle_async_request(self, request):
+        endpoint = endpoint_label(request.url.path)
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except httpx.TransportError as e:
+            PANEL_REQUEST_ERRORS.labels(self.panel, endpoint, type(e).__name__).inc()
+            raise
+        finally:
+            PANEL_REQUEST_LATENCY.labels(self.panel, endpoint, request.method).observe(time.perf_counter() - started)
+
+        if response.status_code >= 400:
+            PANEL_REQUEST_ERRORS.labels(self.panel, endpoint, f"http_{response.status_code}").inc()
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def count_notification(channel: str, status: str) -> None:
+    """Count a notification by channel (e.g. telegram) and outcome (sent, failed, disabled)"""
+    NOTIFICATIONS.labels(channel, status).inc()
+
+
+_task_started = {}
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, task=None, **kwargs):
+    if task is not None and task.name.startswith(TASK_PREFIX):
+        _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+def _registry():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint.
+
+    The scraper must send PROMETHEUS_METRICS_TOKEN as a bearer token. Without
+    a token the metrics are only served when DEBUG is on.
+    """
+    token = getattr(settings, 'PROMETHEUS_METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            logger.warning("Refusing to serve /metrics: PROMETHEUS_METRICS_TOKEN is not set")
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode()):
+        return HttpResponseForbidden()
+
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -12,6 +12,8 @@ from ..models.recommendation import (
 )
 from ..models.subscription import Plan, Subscription
 from ..utils.telegram import send_user_notification
+from main.models import Subscription as V2RaySubscription
+from v2ray.traffic import get_average_daily_usage_gb
 
 CACHE_TTL = 3600  # 1 hour cache
 
@@ -42,6 +44,16 @@ class RecommendationManager:
             avg_stability=Avg('connection_stability')
         )
 
+        # Prefer measured usage from the pre-aggregated traffic time series
+        client_emails = list(V2RaySubscription.objects.filter(
+            user=user,
+            client_email__isnull=False
+        ).values_list('client_email', flat=True))
+        if client_emails:
+            measured_daily = get_average_daily_usage_gb(client_emails, days=30)
+            if measured_daily:
+                metrics['avg_daily'] = measured_daily
+
         # Get peak hours usage efficiently
         peak_hours = {
             str(hour): subscriptions.filter(
@@ -15,6 +15,7 @@ from django.db import models
 
 from main.models import Server, SubscriptionPlan, Subscription
 from v2ray.models import Inbound, Client, SyncLog, ClientConfig
+from v2ray.traffic import get_average_daily_usage_gb
 from payments.models import Transaction, CardPayment, ZarinpalPayment, PaymentMethod, Discount
 from telegrambot.models import TelegramMessage, TelegramCallback, TelegramState, TelegramNotification, TelegramLog
 from .default_messages import get_default_message
@@ -1882,10 +1883,14 @@ async def show_subscription_stats(update: Update, context: ContextTypes.DEFAULT_
         days_left = subscription.remaining_days()
         days_used = total_days - days_left
         
-        if days_used > 0:
+        # Recent daily average from the traffic time series, falling back to
+        # the cumulative counter for subscriptions without samples yet
+        recent_days = min(days_used, 7)
+        daily_avg = 0
+        if recent_days > 0 and subscription.client_email:
+            daily_avg = get_average_daily_usage_gb(subscription.client_email, days=recent_days)
+        if not daily_avg and days_used > 0:
             daily_avg = subscription.data_usage_gb / days_used
-        else:
-            daily_avg = 0
         
         # Format period
         period = f"{subscription.start_date.strftime('%Y-%m-%d')} تا {subscription.end_date.strftime('%Y-%m-%d')}"
@@ -7,6 +7,8 @@ from django.contrib.auth import get_user_model
 from telegram.error import TelegramError
 from telegram.constants import ParseMode
 
+from main.metrics import count_notification
+
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
@@ -45,6 +47,7 @@ class NotificationService:
         """
         if not self.bot or not self.notifications_enabled:
             logger.info("Notifications are disabled or bot not initialized")
+            count_notification('telegram', 'disabled')
             return False
         
         try:
@@ -53,12 +56,15 @@ class NotificationService:
                 text=message,
                 parse_mode=ParseMode.MARKDOWN
             )
+            count_notification('telegram', 'sent')
             return True
         except TelegramError as e:
             logger.error(f"Telegram error sending message to {chat_id}: {str(e)}")
+            count_notification('telegram', 'failed')
             return False
         except Exception as e:
             logger.error(f"Error sending message to {chat_id}: {str(e)}")
+            count_notification('telegram', 'failed')
             return False
 
 
@@ -1,19 +1,30 @@
-import requests
+import asyncio
+import base64
 import json
 import logging
 import uuid
 import random
 import string
 from datetime import datetime, timedelta
+
+import httpx
+from asgiref.sync import sync_to_async
 from django.utils import timezone
 from django.conf import settings
 from .models import Inbound, Client, SyncLog, ClientConfig
+from .async_utils import get_http_transport, run_async
+from .circuit_breaker import CircuitBreaker, CircuitBreakerTransport, CircuitOpenError
+from main.metrics import InstrumentedTransport
+from .json_stream import JSONArrayStream
+from .sync_writer import write_server_snapshot
+from .sync_lease import LeaseLost, server_lease
 from main.models import Server, Subscription
 
 logger = logging.getLogger(__name__)
 
-class ThreeXUIClient:
-    """Client for interacting with 3x-UI API"""
+
+class AsyncThreeXUIClient:
+    """Async client for interacting with 3x-UI API over a shared connection pool"""
     
     def __init__(self, server):
         """Initialize the client with a server instance"""
@@ -21,11 +32,31 @@ class ThreeXUIClient:
         self.base_url = server.url.rstrip('/')
         self.username = server.username
         self.password = server.password
-        self.session = requests.Session()
-        self.timeout = getattr(settings, 'THREEXUI_API_TIMEOUT', 30)
+        self.timeout = httpx.Timeout(
+            getattr(settings, 'THREEXUI_API_TIMEOUT', 30),
+            connect=getattr(settings, 'THREEXUI_CONNECT_TIMEOUT', 5)
+        )
         self.session_expiry = getattr(settings, 'THREEXUI_SESSION_EXPIRY', 3600)
         self.max_retries = getattr(settings, 'THREEXUI_MAX_RETRIES', 3)
         self.retry_delay = getattr(settings, 'THREEXUI_RETRY_DELAY', 2)  # seconds
+        self.retry_max_delay = getattr(settings, 'THREEXUI_RETRY_MAX_DELAY', 30)  # seconds
+        self.breaker = CircuitBreaker.for_server(server)
+        self._http = None
+        self._authenticated = False
+        self._login_lock = asyncio.Lock()
+    
+    @property
+    def http(self):
+        """HTTP client bound to the shared transport of the running loop"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                transport=InstrumentedTransport(
+                    CircuitBreakerTransport(get_http_transport(), self.breaker), self.base_url
+                ),
+                timeout=self.timeout
+            )
+        return self._http
     
     def _handle_response(self, response):
         """Handle API response and check for errors"""
@@ -36,137 +67,218 @@ class ThreeXUIClient:
                 logger.error(f"API error: {data.get('msg')}")
                 return None
             return data
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPStatusError as e:
             logger.error(f"Request error: {str(e)}")
             return None
-        except json.JSONDecodeError:
+        except ValueError:
             logger.error(f"Invalid JSON response: {response.text[:100]}...")
             return None
     
-    def _request_with_retry(self, method, url, **kwargs):
-        """Make a request with retry logic"""
-        retries = 0
-        while retries < self.max_retries:
+    @staticmethod
+    def _is_login_redirect(response):
+        """Check whether the panel bounced the request to its login page"""
+        if response.status_code == 401:
+            return True
+        if response.is_redirect:
+            return 'login' in response.headers.get('location', '')
+        return False
+    
+    async def _backoff(self, attempt):
+        """Sleep with exponential backoff and full jitter"""
+        delay = min(self.retry_max_delay, self.retry_delay * (2 ** attempt))
+        await asyncio.sleep(random.uniform(0, delay))
+    
+    async def _save_session(self):
+        """Persist the session cookie on the server"""
+        await sync_to_async(self.server.save, thread_sensitive=False)(
+            update_fields=['session_cookie', 'session_expiry']
+        )
+    
+    async def _clear_session(self):
+        """Forget the current session cookie"""
+        self._authenticated = False
+        self.http.cookies.clear()
+        self.server.session_cookie = None
+        self.server.session_expiry = None
+        await self._save_session()
+    
+    async def _request(self, method, path, **kwargs):
+        """
+        Make a request with retry logic.
+        
+        Transport errors and 5xx responses are retried with exponential
+        backoff. The session is re-established only when the panel redirects
+        to its login page.
+        """
+        if not await self.login():
+            return None
+        
+        attempt = 0
+        relogged = False
+        
+        while True:
             try:
-                response = self.session.request(method, url, **kwargs)
-                result = self._handle_response(response)
-                
-                # Check if session expired and reauthenticate
-                if not result and 'login' in response.url and retries < self.max_retries - 1:
-                    logger.info("Session expired, attempting to re-login")
-                    self.server.session_cookie = None
-                    self.server.session_expiry = None
-                    self.server.save()
-                    if self.login():
-                        retries += 1
-                        continue
-                
-                return result
-            except Exception as e:
-                logger.error(f"Request error (attempt {retries+1}/{self.max_retries}): {str(e)}")
-                retries += 1
-                if retries < self.max_retries:
-                    # Wait before retrying
-                    import time
-                    time.sleep(self.retry_delay)
-                    continue
+                response = await self.http.request(method, path, **kwargs)
+            except CircuitOpenError as e:
+                # Panel is marked down, fail fast without retrying
+                logger.warning(str(e))
                 return None
-        return None
+            except httpx.TransportError as e:
+                logger.error(f"Request error (attempt {attempt+1}/{self.max_retries}): {str(e)}")
+                attempt += 1
+                if attempt >= self.max_retries:
+                    return None
+                await self._backoff(attempt - 1)
+                continue
+            
+            # Check if session expired and reauthenticate
+            if self._is_login_redirect(response):
+                if relogged:
+                    logger.error(f"Panel at {self.base_url} rejected a fresh session")
+                    return None
+                logger.info("Session expired, attempting to re-login")
+                await self._clear_session()
+                if not await self.login():
+                    return None
+                relogged = True
+                continue
+            
+            if response.status_code >= 500 and attempt < self.max_retries - 1:
+                logger.error(f"Server error {response.status_code} (attempt {attempt+1}/{self.max_retries})")
+                await self._backoff(attempt)
+                attempt += 1
+                continue
+            
+            return self._handle_response(response)
     
-    def login(self):
-        """Login to 3x-UI panel and store session cookie"""
-        # Check if we already have a valid session
-        if self.server.is_session_valid():
-            # Load existing session cookie
+    async def login(self):
+        """
+        Ensure a session cookie is available.
+        
+        A stored, unexpired cookie is trusted without a verification request;
+        a stale one is detected lazily by _request() when the panel redirects
+        to its login page.
+        """
+        if self._authenticated:
+            return True
+        
+        async with self._login_lock:
+            if self._authenticated:
+                return True
+            
+            # Check if we already have a valid session
+            if self.server.is_session_valid():
+                try:
+                    self.http.cookies.update(json.loads(self.server.session_cookie))
+                    self._authenticated = True
+                    return True
+                except (TypeError, ValueError) as e:
+                    logger.error(f"Error loading saved session: {str(e)}")
+            
+            # Login to get a new session
             try:
-                self.session.cookies.update(json.loads(self.server.session_cookie))
+                data = {
+                    "username": self.username,
+                    "password": self.password
+                }
+                response = await self.http.post('/login', json=data)
+                result = self._handle_response(response)
                 
-                # Verify session is valid by making a test request
-                test_url = f"{self.base_url}/panel/api/server/status"
-                response = self.session.get(test_url, timeout=self.timeout)
-                if response.status_code == 200 and 'login' not in response.url:
+                if result and result.get('success'):
+                    # Store session cookie
+                    self.server.session_cookie = json.dumps(dict(self.http.cookies))
+                    self.server.session_expiry = timezone.now() + timedelta(seconds=self.session_expiry)
+                    await self._save_session()
+                    self._authenticated = True
+                    
+                    # Log successful login
+                    logger.info(f"Successfully logged in to 3x-UI panel at {self.base_url}")
                     return True
                 
-                # Session invalid, clear it
-                logger.info("Saved session invalid, getting a new one")
-                self.server.session_cookie = None
-                self.server.session_expiry = None
-                self.server.save()
+                # Log login failure
+                logger.error(f"Failed to login to 3x-UI panel at {self.base_url}: {result.get('msg') if result else 'No response'}")
+                return False
+            except CircuitOpenError as e:
+                logger.warning(f"Skipping login: {str(e)}")
+                return False
             except Exception as e:
-                logger.error(f"Error loading saved session: {str(e)}")
-                self.server.session_cookie = None
-                self.server.session_expiry = None
-                self.server.save()
-        
-        # Login to get a new session
-        try:
-            url = f"{self.base_url}/login"
-            data = {
-                "username": self.username,
-                "password": self.password
-            }
-            response = self.session.post(url, json=data, timeout=self.timeout)
-            result = self._handle_response(response)
-            
-            if result and result.get('success'):
-                # Store session cookie
-                self.server.session_cookie = json.dumps(dict(self.session.cookies))
-                self.server.session_expiry = timezone.now() + timedelta(seconds=self.session_expiry)
-                self.server.save()
-                
-                # Log successful login
-                logger.info(f"Successfully logged in to 3x-UI panel at {self.base_url}")
-                return True
-            
-            # Log login failure
-            logger.error(f"Failed to login to 3x-UI panel at {self.base_url}: {result.get('msg') if result else 'No response'}")
-            return False
-        except Exception as e:
-            logger.error(f"Login error for 3x-UI panel at {self.base_url}: {str(e)}")
-            return False
+                logger.error(f"Login error for 3x-UI panel at {self.base_url}: {str(e)}")
+                return False
     
-    def get_server_status(self):
+    async def get_server_status(self):
         """Get server status information"""
-        if not self.login():
-            return None
-        
-        url = f"{self.base_url}/panel/api/server/status"
-        return self._request_with_retry('GET', url, timeout=self.timeout)
+        return await self._request('GET', '/panel/api/server/status')
     
-    def get_inbounds(self):
+    async def get_inbounds(self):
         """Get all inbounds from the panel"""
-        if not self.login():
-            return None
-        
-        url = f"{self.base_url}/panel/api/inbounds/list"
-        result = self._request_with_retry('GET', url, timeout=self.timeout)
+        result = await self._request('GET', '/panel/api/inbounds/list')
         
         if result and result.get('success'):
             return result.get('obj', [])
         
         return None
     
-    def get_inbound(self, inbound_id):
+    async def iter_inbounds(self, stream=None):
+        """
+        Stream the inbound list, yielding one inbound at a time.
+        
+        Only the inbound being parsed is held in memory, not the whole
+        response. Nothing is retried once items have been yielded; errors are
+        logged and end the iteration, so pass a JSONArrayStream to check
+        afterwards whether the full list was received
+        (`stream.found and stream.done`).
+        """
+        stream = stream or JSONArrayStream()
+        if not await self.login():
+            return
+        
+        for attempt in range(2):
+            try:
+                async with self.http.stream('GET', '/panel/api/inbounds/list') as response:
+                    if self._is_login_redirect(response):
+                        if attempt:
+                            logger.error(f"Panel at {self.base_url} rejected a fresh session")
+                            return
+                        logger.info("Session expired, attempting to re-login")
+                        await self._clear_session()
+                        if not await self.login():
+                            return
+                        continue
+                    
+                    if response.status_code != 200:
+                        logger.error(f"HTTP error {response.status_code} while listing inbounds")
+                        return
+                    
+                    async for chunk in response.aiter_text():
+                        for inbound in stream.feed(chunk):
+                            yield inbound
+                    
+                    if not stream.found:
+                        logger.error(f"Failed to get inbounds from {self.base_url}")
+                    elif not stream.done:
+                        logger.error(f"Inbound list from {self.base_url} ended early")
+                    return
+            except CircuitOpenError as e:
+                logger.warning(str(e))
+                return
+            except httpx.HTTPError as e:
+                logger.error(f"Error streaming inbounds from {self.base_url}: {str(e)}")
+                return
+    
+    async def get_inbound(self, inbound_id):
         """Get a specific inbound by ID"""
-        if not self.login():
-            return None
-        
-        url = f"{self.base_url}/panel/api/inbounds/get/{inbound_id}"
-        result = self._request_with_retry('GET', url, timeout=self.timeout)
+        result = await self._request('GET', f'/panel/api/inbounds/get/{inbound_id}')
         
         if result and result.get('success'):
             return result.get('obj')
         
         return None
     
-    def add_client(self, inbound_id, email, uuid_str=None, traffic_limit_gb=0, expiry_time=None):
+    async def add_client(self, inbound_id, email, uuid_str=None, traffic_limit_gb=0, expiry_time=None):
         """Add a client to an inbound"""
-        if not self.login():
-            return None
-        
         try:
             # Get inbound to determine protocol
-            inbound = self.get_inbound(inbound_id)
+            inbound = await self.get_inbound(inbound_id)
             if not inbound:
                 logger.error(f"Inbound {inbound_id} not found")
                 return False
@@ -199,19 +311,18 @@ class ThreeXUIClient:
             client = {k: v for k, v in client.items() if v is not None}
             
             # Create request data
-            url = f"{self.base_url}/panel/api/inbounds/addClient"
             data = {
                 "id": inbound_id,
                 "client": client
             }
             
-            result = self._request_with_retry('POST', url, json=data, timeout=self.timeout)
+            result = await self._request('POST', '/panel/api/inbounds/addClient', json=data)
             
             if result and result.get('success'):
                 logger.info(f"Successfully added client {email} to inbound {inbound_id}")
                 
                 # Generate client config
-                self.generate_client_config(inbound_id, email, uuid_str, protocol)
+                await self.generate_client_config(inbound_id, email, uuid_str, protocol, inbound=inbound)
                 
                 return True
             
@@ -221,14 +332,12 @@ class ThreeXUIClient:
             logger.error(f"Add client error: {str(e)}")
             return False
     
-    def generate_client_config(self, inbound_id, email, uuid_str, protocol):
+    async def generate_client_config(self, inbound_id, email, uuid_str, protocol, inbound=None):
         """Generate client configuration links"""
-        if not self.login():
-            return None
-        
         try:
             # Get inbound details
-            inbound = self.get_inbound(inbound_id)
+            if inbound is None:
+                inbound = await self.get_inbound(inbound_id)
             if not inbound:
                 logger.error(f"Inbound {inbound_id} not found")
                 return None
@@ -262,7 +371,6 @@ class ThreeXUIClient:
                     "tls": ""
                 }
                 
-                import base64
                 vmess_link = f"vmess://{base64.b64encode(json.dumps(vmess_config).encode()).decode()}"
             
             elif protocol == 'vless':
@@ -278,40 +386,26 @@ class ThreeXUIClient:
                 trojan_link = f"trojan://{uuid_str}@{domain}:{port}"
             
             # Save client config
-            client = Client.objects.filter(
-                inbound__inbound_id=inbound_id,
-                email=email
-            ).first()
-            
-            if client:
-                ClientConfig.objects.update_or_create(
-                    client=client,
-                    defaults={
-                        'vmess_link': vmess_link,
-                        'vless_link': vless_link,
-                        'trojan_link': trojan_link,
-                        'shadowsocks_link': shadowsocks_link,
-                        'subscription_url': subscription_url,
-                        'qrcode_data': vmess_link or vless_link or trojan_link or shadowsocks_link
-                    }
-                )
-                logger.info(f"Generated config for client {email}")
-                return True
-            
-            logger.error(f"Client {email} not found in database")
-            return False
+            return await sync_to_async(_save_client_config, thread_sensitive=False)(
+                inbound_id,
+                email,
+                {
+                    'vmess_link': vmess_link,
+                    'vless_link': vless_link,
+                    'trojan_link': trojan_link,
+                    'shadowsocks_link': shadowsocks_link,
+                    'subscription_url': subscription_url,
+                    'qrcode_data': vmess_link or vless_link or trojan_link or shadowsocks_link
+                }
+            )
         
         except Exception as e:
             logger.error(f"Generate client config error: {str(e)}")
             return False
     
-    def remove_client(self, inbound_id, email):
+    async def remove_client(self, inbound_id, email):
         """Remove a client from an inbound"""
-        if not self.login():
-            return False
-        
-        url = f"{self.base_url}/panel/api/inbounds/delClient/{inbound_id}/{email}"
-        result = self._request_with_retry('POST', url, timeout=self.timeout)
+        result = await self._request('POST', f'/panel/api/inbounds/delClient/{inbound_id}/{email}')
         
         if result and result.get('success'):
             logger.info(f"Successfully removed client {email} from inbound {inbound_id}")
@@ -320,22 +414,22 @@ class ThreeXUIClient:
         logger.error(f"Failed to remove client {email} from inbound {inbound_id}: {result.get('msg') if result else 'No response'}")
         return False
     
-    def update_client_traffic(self, inbound_id, email, traffic_limit_gb):
+    async def update_client_traffic(self, inbound_id, email, traffic_limit_gb):
         """Update a client's traffic limit"""
-        if not self.login():
-            return False
-        
         # Convert traffic limit from GB to bytes
         traffic_limit = traffic_limit_gb * 1024 * 1024 * 1024 if traffic_limit_gb > 0 else 0
         
-        url = f"{self.base_url}/panel/api/inbounds/updateClientTraffic/{inbound_id}/{email}"
         data = {
             "id": inbound_id,
             "email": email,
             "total": traffic_limit
         }
         
-        result = self._request_with_retry('POST', url, json=data, timeout=self.timeout)
+        result = await self._request(
+            'POST',
+            f'/panel/api/inbounds/updateClientTraffic/{inbound_id}/{email}',
+            json=data
+        )
         
         if result and result.get('success'):
             logger.info(f"Successfully updated traffic limit for client {email} to {traffic_limit_gb} GB")
@@ -344,22 +438,22 @@ class ThreeXUIClient:
         logger.error(f"Failed to update traffic limit for client {email}: {result.get('msg') if result else 'No response'}")
         return False
     
-    def update_client_expiry(self, inbound_id, email, expiry_time):
+    async def update_client_expiry(self, inbound_id, email, expiry_time):
         """Update a client's expiry time"""
-        if not self.login():
-            return False
-        
         # Format expiry time
         expiry_time_ms = int(expiry_time.timestamp() * 1000)
         
-        url = f"{self.base_url}/panel/api/inbounds/updateClientExpiryTime/{inbound_id}/{email}"
         data = {
             "id": inbound_id,
             "email": email,
             "expiryTime": expiry_time_ms
         }
         
-        result = self._request_with_retry('POST', url, json=data, timeout=self.timeout)
+        result = await self._request(
+            'POST',
+            f'/panel/api/inbounds/updateClientExpiryTime/{inbound_id}/{email}',
+            json=data
+        )
         
         if result and result.get('success'):
             logger.info(f"Successfully updated expiry time for client {email} to {expiry_time}")
@@ -368,13 +462,9 @@ class ThreeXUIClient:
         logger.error(f"Failed to update expiry time for client {email}: {result.get('msg') if result else 'No response'}")
         return False
     
-    def get_client_traffic(self, inbound_id, email=None):
+    async def get_client_traffic(self, inbound_id, email=None):
         """Get client traffic statistics"""
-        if not self.login():
-            return None
-        
-        url = f"{self.base_url}/panel/api/inbounds/getClientTraffics/{inbound_id}"
-        result = self._request_with_retry('GET', url, timeout=self.timeout)
+        result = await self._request('GET', f'/panel/api/inbounds/getClientTraffics/{inbound_id}')
         
         if result and result.get('success'):
             clients = result.get('obj', [])
@@ -393,13 +483,9 @@ class ThreeXUIClient:
         logger.error(f"Failed to get client traffic statistics: {result.get('msg') if result else 'No response'}")
         return None
     
-    def reset_client_traffic(self, inbound_id, email):
+    async def reset_client_traffic(self, inbound_id, email):
         """Reset a client's traffic usage"""
-        if not self.login():
-            return False
-        
-        url = f"{self.base_url}/panel/api/inbounds/resetClientTraffic/{inbound_id}/{email}"
-        result = self._request_with_retry('POST', url, timeout=self.timeout)
+        result = await self._request('POST', f'/panel/api/inbounds/resetClientTraffic/{inbound_id}/{email}')
         
         if result and result.get('success'):
             logger.info(f"Successfully reset traffic usage for client {email}")
@@ -408,13 +494,9 @@ class ThreeXUIClient:
         logger.error(f"Failed to reset traffic usage for client {email}: {result.get('msg') if result else 'No response'}")
         return False
     
-    def get_client_url(self, inbound_id, email):
+    async def get_client_url(self, inbound_id, email):
         """Get client connection URL"""
-        if not self.login():
-            return None
-        
-        url = f"{self.base_url}/panel/api/inbounds/getClientUrl/{inbound_id}/{email}"
-        result = self._request_with_retry('GET', url, timeout=self.timeout)
+        result = await self._request('GET', f'/panel/api/inbounds/getClientUrl/{inbound_id}/{email}')
         
         if result and result.get('success'):
             return result.get('obj')
@@ -422,8 +504,149 @@ class ThreeXUIClient:
         return None
 
 
+class IncompleteInboundList(Exception):
+    """The panel's inbound list could not be read to the end"""
+
+
+async def fetch_server_snapshot(client):
+    """
+    Read a panel's inbounds and client traffic for write_server_snapshot.
+    
+    Inbounds are streamed one at a time and the client settings JSON, which
+    is not stored, is dropped as each one arrives; the rest of the snapshot
+    is kept until the whole list is in. Client traffic comes with the
+    inbound list; only panels that omit clientStats get a request per
+    inbound.
+    
+    Raises:
+        IncompleteInboundList: If the list could not be read to the end
+    """
+    stream = JSONArrayStream()
+    inbounds = []
+    client_traffic = {}
+    async for inbound_data in client.iter_inbounds(stream):
+        inbound_id = inbound_data.get('id')
+        if not inbound_id:
+            continue
+        entries = inbound_data.pop('clientStats', None)
+        if entries is None:
+            entries = await client.get_client_traffic(inbound_id) or []
+        client_traffic[inbound_id] = entries
+        inbound_data.pop('settings', None)
+        inbounds.append(inbound_data)
+    
+    if not stream.found:
+        raise IncompleteInboundList(f"No inbound list in the response of {client.base_url}")
+    if not stream.done:
+        raise IncompleteInboundList(
+            f"Inbound list from {client.base_url} ended after {len(inbounds)} inbounds"
+        )
+    return inbounds, client_traffic
+
+
+def _save_client_config(inbound_id, email, links):
+    """Store generated configuration links for a client"""
+    client = Client.objects.filter(
+        inbound__inbound_id=inbound_id,
+        email=email
+    ).first()
+    
+    if client:
+        ClientConfig.objects.update_or_create(client=client, defaults=links)
+        logger.info(f"Generated config for client {email}")
+        return True
+    
+    logger.error(f"Client {email} not found in database")
+    return False
+
+
+class ThreeXUIClient:
+    """
+    Synchronous facade over AsyncThreeXUIClient.
+    
+    Calls run on the process-wide background event loop so that all sync
+    callers share one connection pool.
+    """
+    
+    def __init__(self, server):
+        """Initialize the client with a server instance"""
+        self.server = server
+        self.base_url = server.url.rstrip('/')
+        self.async_client = AsyncThreeXUIClient(server)
+    
+    def login(self):
+        """Login to 3x-UI panel and store session cookie"""
+        return run_async(self.async_client.login())
+    
+    def get_server_status(self):
+        """Get server status information"""
+        return run_async(self.async_client.get_server_status())
+    
+    def get_inbounds(self):
+        """Get all inbounds from the panel"""
+        return run_async(self.async_client.get_inbounds())
+    
+    def iter_inbounds(self, stream=None):
+        """Stream inbounds from the panel one at a time"""
+        inbounds = self.async_client.iter_inbounds(stream)
+        try:
+            while True:
+                try:
+                    yield run_async(inbounds.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            run_async(inbounds.aclose())
+    
+    def get_inbound(self, inbound_id):
+        """Get a specific inbound by ID"""
+        return run_async(self.async_client.get_inbound(inbound_id))
+    
+    def add_client(self, inbound_id, email, uuid_str=None, traffic_limit_gb=0, expiry_time=None):
+        """Add a client to an inbound"""
+        return run_async(self.async_client.add_client(
+            inbound_id, email, uuid_str=uuid_str, traffic_limit_gb=traffic_limit_gb, expiry_time=expiry_time
+        ))
+    
+    def generate_client_config(self, inbound_id, email, uuid_str, protocol):
+        """Generate client configuration links"""
+        return run_async(self.async_client.generate_client_config(inbound_id, email, uuid_str, protocol))
+    
+    def remove_client(self, inbound_id, email):
+        """Remove a client from an inbound"""
+        return run_async(self.async_client.remove_client(inbound_id, email))
+    
+    def update_client_traffic(self, inbound_id, email, traffic_limit_gb):
+        """Update a client's traffic limit"""
+        return run_async(self.async_client.update_client_traffic(inbound_id, email, traffic_limit_gb))
+    
+    def update_client_expiry(self, inbound_id, email, expiry_time):
+        """Update a client's expiry time"""
+        return run_async(self.async_client.update_client_expiry(inbound_id, email, expiry_time))
+    
+    def get_client_traffic(self, inbound_id, email=None):
+        """Get client traffic statistics"""
+        return run_async(self.async_client.get_client_traffic(inbound_id, email))
+    
+    def reset_client_traffic(self, inbound_id, email):
+        """Reset a client's traffic usage"""
+        return run_async(self.async_client.reset_client_traffic(inbound_id, email))
+    
+    def get_client_url(self, inbound_id, email):
+        """Get client connection URL"""
+        return run_async(self.async_client.get_client_url(inbound_id, email))
+
+
 def sync_server(server_id):
     """Sync a server with the 3x-UI panel"""
+    with server_lease(server_id) as lease:
+        if not lease.acquired:
+            logger.info(f"Skipping sync of server {server_id}: another worker is syncing it")
+            return False
+        return _sync_server(server_id, lease)
+
+
+def _sync_server(server_id, lease):
     try:
         server = Server.objects.get(id=server_id)
         
@@ -437,108 +660,39 @@ def sync_server(server_id):
         # Create API client
         client = ThreeXUIClient(server)
         
-        # Get inbounds
-        inbounds = client.get_inbounds()
-        if not inbounds:
+        try:
+            inbounds, client_traffic = run_async(fetch_server_snapshot(client.async_client))
+        except IncompleteInboundList as e:
+            # Stored rows must not be diffed against a partial list
+            logger.error(f"Server sync error: {str(e)}")
             sync_log.status = 'failed'
-            sync_log.message = "Failed to get inbounds from server"
+            sync_log.message = f"Failed to get inbounds from server: {str(e)}"
             sync_log.save()
             return False
         
-        # Store inbounds
-        for inbound_data in inbounds:
-            inbound_id = inbound_data.get('id')
-            
-            # Skip if inbound doesn't have an ID
-            if not inbound_id:
-                continue
-            
-            # Parse settings
-            try:
-                settings = json.loads(inbound_data.get('settings', '{}'))
-            except:
-                settings = {}
-            
-            # Parse stream settings
-            try:
-                stream_settings = json.loads(inbound_data.get('streamSettings', '{}'))
-            except:
-                stream_settings = {}
-            
-            # Update or create inbound
-            inbound, created = Inbound.objects.update_or_create(
-                server=server,
-                inbound_id=inbound_id,
-                defaults={
-                    'protocol': inbound_data.get('protocol', ''),
-                    'tag': inbound_data.get('remark', ''),
-                    'port': inbound_data.get('port', 0),
-                    'network': stream_settings.get('network', ''),
-                    'enable': inbound_data.get('enable', False),
-                    'expiry_time': datetime.fromtimestamp(inbound_data.get('expiryTime', 0) / 1000) if inbound_data.get('expiryTime', 0) > 0 else None,
-                    'listen': inbound_data.get('listen', ''),
-                    'total': inbound_data.get('total', 0),
-                    'remark': inbound_data.get('remark', ''),
-                    'up': inbound_data.get('up', 0),
-                    'down': inbound_data.get('down', 0),
-                    'last_sync': timezone.now()
-                }
-            )
-            
-            # Get client traffic
-            client_traffic = client.get_client_traffic(inbound_id)
-            
-            if client_traffic:
-                for traffic_data in client_traffic:
-                    email = traffic_data.get('email', '')
-                    
-                    # Skip if email is empty
-                    if not email:
-                        continue
-                    
-                    # Update or create client
-                    client_obj, created = Client.objects.update_or_create(
-                        inbound=inbound,
-                        email=email,
-                        defaults={
-                            'client_id': traffic_data.get('id', ''),
-                            'enable': traffic_data.get('enable', True),
-                            'expiry_time': datetime.fromtimestamp(traffic_data.get('expiryTime', 0) / 1000) if traffic_data.get('expiryTime', 0) > 0 else None,
-                            'total': traffic_data.get('total', 0),
-                            'up': traffic_data.get('up', 0),
-                            'down': traffic_data.get('down', 0),
-                            'last_sync': timezone.now()
-                        }
-                    )
-                    
-                    # Update subscription if client is linked to one
-                    try:
-                        subscription = Subscription.objects.get(client_email=email)
-                        
-                        # Update data usage
-                        total_gb = client_obj.total / (1024 * 1024 * 1024) if client_obj.total > 0 else 0
-                        used_gb = (client_obj.up + client_obj.down) / (1024 * 1024 * 1024)
-                        
-                        subscription.data_usage_gb = used_gb
-                        
-                        # Update status if expired
-                        if client_obj.expiry_time and client_obj.expiry_time < timezone.now():
-                            subscription.status = 'expired'
-                        elif not client_obj.enable:
-                            subscription.status = 'suspended'
-                        
-                        subscription.save()
-                    except Subscription.DoesNotExist:
-                        # No subscription linked to this client
-                        pass
+        # Store inbounds, clients and linked subscriptions
+        lease.check()
+        stats = write_server_snapshot(server, inbounds, client_traffic)
         
         # Update sync log
         sync_log.status = 'completed'
-        sync_log.message = "Synchronization completed successfully"
+        sync_log.message = (
+            f"Synchronization completed successfully: "
+            f"{stats['rows_written']} rows written, {stats['rows_skipped']} unchanged rows skipped"
+        )
+        sync_log.details = stats
         sync_log.save()
         
         return True
     
+    except LeaseLost as e:
+        # Another worker owns the server now; leave the rest to it
+        logger.warning(f"Aborted sync of server {server_id}: {str(e)}")
+        sync_log.status = 'failed'
+        sync_log.message = f"Synchronization aborted: {str(e)}"
+        sync_log.save()
+        return False
+    
     except Exception as e:
         logger.error(f"Server sync error: {str(e)}")
         
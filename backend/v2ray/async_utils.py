@@ -0,0 +1,152 @@
+"""
+Asyncio helpers for the V2Ray app.
+
+This module provides:
+- A per-process background event loop for running coroutines from sync code
+- A decorator that runs coroutine functions as Celery tasks on that loop
+- Thread-pool execution of blocking ORM work from coroutines
+- Shared httpx and aiohttp connection pools for panel requests
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import logging
+import weakref
+from typing import Any, Callable, Coroutine, Optional
+
+import aiohttp
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+
+# One connection pool per event loop, since httpx transports are loop-bound
+_transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = weakref.WeakKeyDictionary()
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the background event loop of the current process.
+
+    The loop runs forever in a daemon thread and is recreated after a fork,
+    so each Celery worker process gets its own.
+    """
+    global _loop, _loop_pid
+
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid() or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            thread = threading.Thread(
+                target=_loop.run_forever,
+                name='v2ray-event-loop',
+                daemon=True
+            )
+            thread.start()
+        return _loop
+
+
+def run_async(coro: Coroutine[Any, Any, Any], timeout: Optional[float] = None) -> Any:
+    """
+    Run a coroutine on the background event loop and wait for its result.
+
+    Args:
+        coro: Coroutine to run
+        timeout: Maximum number of seconds to wait
+
+    Returns:
+        The coroutine's result
+    """
+    loop = get_event_loop()
+
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+
+    if running_loop is loop:
+        coro.close()
+        raise RuntimeError("run_async() cannot be called from the background event loop")
+
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    return future.result(timeout)
+
+
+def async_task(func: Callable[..., Coroutine[Any, Any, Any]]) -> Callable[..., Any]:
+    """
+    Make a coroutine function callable from a Celery worker.
+
+    The coroutine runs on the worker process's background loop, so the loop
+    and the shared connection pools survive across task invocations.
+    Apply it below @shared_task:
+
+        @shared_task
+        @async_task
+        async def sync_servers():
+            ...
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return run_async(func(*args, **kwargs))
+    return wrapper
+
+
+def db_async(func: Callable[..., Any]) -> Callable[..., Coroutine[Any, Any, Any]]:
+    """Run blocking ORM/cache work in the thread pool instead of on the event loop"""
+    return sync_to_async(func, thread_sensitive=False)
+
+
+def get_http_transport() -> httpx.AsyncHTTPTransport:
+    """
+    Get the shared httpx transport (connection pool) for the running loop.
+
+    Clients built on it keep their own cookies but share keep-alive
+    connections. They must not be closed, since that closes the transport.
+    """
+    loop = asyncio.get_running_loop()
+    transport = _transports.get(loop)
+
+    if transport is None:
+        max_connections = getattr(settings, 'THREEXUI_MAX_CONNECTIONS', 100)
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=getattr(settings, 'THREEXUI_KEEPALIVE_EXPIRY', 60)
+            ),
+            verify=getattr(settings, 'THREEXUI_VERIFY_SSL', True)
+        )
+        _transports[loop] = transport
+
+    return transport
+
+
+def get_aiohttp_session() -> aiohttp.ClientSession:
+    """
+    Get the shared aiohttp session for the running loop.
+
+    It is reused by every task run on the loop and must not be closed by
+    callers.
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=getattr(settings, 'THREEXUI_MAX_CONNECTIONS', 100)),
+            timeout=aiohttp.ClientTimeout(
+                total=getattr(settings, 'THREEXUI_API_TIMEOUT', 30),
+                connect=getattr(settings, 'THREEXUI_CONNECT_TIMEOUT', 5)
+            )
+        )
+        _sessions[loop] = session
+
+    return session
@@ -0,0 +1,167 @@
+"""
+Per-panel circuit breaker for 3x-UI servers.
+
+This module provides:
+- A Redis-backed closed / open / half-open circuit per panel
+- An httpx transport that fails fast while a panel's circuit is open
+
+State lives in Redis under the same keys the Telegram bot uses
+(bot/services/circuit_breaker.py), so a panel marked down by one process is
+skipped by all of them.
+"""
+
+import asyncio
+import logging
+import weakref
+from typing import Dict, Any
+
+import httpx
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+# Redis clients are bound to the event loop that created them
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = weakref.WeakKeyDictionary()
+
+
+def get_redis() -> aioredis.Redis:
+    """Get the async Redis client for the running loop"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+
+    if client is None:
+        client = aioredis.Redis.from_url(
+            settings.THREEXUI_CIRCUIT_REDIS_URL,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5
+        )
+        _clients[loop] = client
+
+    return client
+
+
+def circuit_key(base_url: str) -> str:
+    """Redis key prefix of a panel, shared with the bot"""
+    return f"threexui:circuit:{base_url.rstrip('/').lower()}"
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of sending a request while a panel's circuit is open"""
+
+
+class CircuitBreaker:
+    """Redis-backed circuit breaker for a single panel"""
+
+    def __init__(self, base_url, failure_threshold=None, recovery_timeout=None):
+        self.base_url = base_url
+        self.key = circuit_key(base_url)
+        self.failure_threshold = failure_threshold or getattr(settings, 'THREEXUI_CIRCUIT_FAILURE_THRESHOLD', 5)
+        self.recovery_timeout = recovery_timeout or getattr(settings, 'THREEXUI_CIRCUIT_RECOVERY_TIMEOUT', 30)
+
+    @classmethod
+    def for_server(cls, server):
+        """Get the circuit breaker of a server's panel"""
+        return cls(server.url)
+
+    async def allow_request(self) -> bool:
+        """
+        Check whether a request to the panel may be sent.
+
+        While half-open only a single probe is let through across all
+        processes. If Redis is unreachable the request is allowed.
+        """
+        try:
+            redis_client = get_redis()
+            is_open, failures = await redis_client.mget(f"{self.key}:open", f"{self.key}:failures")
+
+            if is_open:
+                return False
+
+            if failures and int(failures) >= self.failure_threshold:
+                return bool(await redis_client.set(
+                    f"{self.key}:probe", 1, nx=True, ex=self.recovery_timeout
+                ))
+
+            return True
+        except RedisError as e:
+            logger.warning(f"Circuit breaker unavailable for {self.base_url}: {str(e)}")
+            return True
+
+    async def record_success(self) -> None:
+        """Close the circuit"""
+        try:
+            await get_redis().delete(f"{self.key}:failures", f"{self.key}:probe")
+        except RedisError as e:
+            logger.warning(f"Circuit breaker unavailable for {self.base_url}: {str(e)}")
+
+    async def record_failure(self) -> None:
+        """Count a failure and open the circuit past the threshold"""
+        try:
+            redis_client = get_redis()
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.incr(f"{self.key}:failures")
+                pipe.expire(f"{self.key}:failures", self.recovery_timeout * 10)
+                failures, _ = await pipe.execute()
+
+            if failures >= self.failure_threshold:
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    pipe.set(f"{self.key}:open", 1, ex=self.recovery_timeout)
+                    pipe.delete(f"{self.key}:probe")
+                    await pipe.execute()
+                logger.warning(f"Circuit opened for panel {self.base_url} after {failures} failures")
+        except RedisError as e:
+            logger.warning(f"Circuit breaker unavailable for {self.base_url}: {str(e)}")
+
+    async def get_state(self) -> Dict[str, Any]:
+        """Get the circuit state, failure count and seconds until the next probe"""
+        try:
+            redis_client = get_redis()
+            failures = int(await redis_client.get(f"{self.key}:failures") or 0)
+            retry_in = await redis_client.ttl(f"{self.key}:open")
+        except RedisError as e:
+            logger.warning(f"Circuit breaker unavailable for {self.base_url}: {str(e)}")
+            return {'state': STATE_CLOSED, 'failures': 0, 'retry_in': 0}
+
+        if retry_in > 0:
+            state = STATE_OPEN
+        elif failures >= self.failure_threshold:
+            state = STATE_HALF_OPEN
+        else:
+            state = STATE_CLOSED
+
+        return {'state': state, 'failures': failures, 'retry_in': max(retry_in, 0)}
+
+
+class CircuitBreakerTransport(httpx.AsyncBaseTransport):
+    """httpx transport that checks a circuit breaker around every request"""
+
+    def __init__(self, transport, breaker):
+        self.transport = transport
+        self.breaker = breaker
+
+    async def handle_async_request(self, request):
+        if not await self.breaker.allow_request():
+            raise CircuitOpenError(f"Panel {self.breaker.base_url} is marked down", request=request)
+
+        try:
+            response = await self.transport.handle_async_request(request)
+        except httpx.TransportError:
+            await self.breaker.record_failure()
+            raise
+
+        if response.status_code >= 500:
+            await self.breaker.record_failure()
+        else:
+            await self.breaker.record_success()
+
+        return response
+
+    async def aclose(self):
+        # The wrapped transport is the shared pool and outlives this client
+        pass
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from v2ray.partitions import PARTITIONED_TABLES, convert_to_partitioned, is_partitioned, list_partitions, maintain_partitions
+
+
+class Command(BaseCommand):
+    help = 'Manage range partitions of the server monitoring tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Convert plain monitoring tables to partitioned tables (locks them while copying)')
+        parser.add_argument('--list', action='store_true', help='List partitions and exit')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for entry in PARTITIONED_TABLES:
+                table = entry.model._meta.db_table
+                if not is_partitioned(entry.model):
+                    self.stdout.write(f"{table}: not partitioned")
+                    continue
+                self.stdout.write(f"{table}:")
+                for name in list_partitions(entry.model):
+                    self.stdout.write(f"  {name}")
+            return
+
+        if options['convert']:
+            for entry in PARTITIONED_TABLES:
+                table = entry.model._meta.db_table
+                if convert_to_partitioned(entry):
+                    self.stdout.write(self.style.SUCCESS(f"Converted {table}"))
+                else:
+                    self.stdout.write(f"{table} is already partitioned")
+
+        for table, result in maintain_partitions().items():
+            if 'error' in result:
+                self.stdout.write(self.style.ERROR(f"{table}: {result['error']}"))
+                continue
+            self.stdout.write(
+                f"{table}: {result['created']} partitions ahead, dropped {len(result['dropped'])} expired, "
+                f"deleted {result['purged']} expired rows from the default partition"
+            )
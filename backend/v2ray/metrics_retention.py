@@ -0,0 +1,177 @@
+"""
+Retention pipeline for server monitoring data.
+
+This module provides:
+- Hourly and daily min / avg / max / p95 aggregates of ServerMetrics and
+  ServerHealthCheck samples
+- Batched deletion of raw samples once they are aggregated and past their
+  retention period
+
+Raw samples are kept for V2RAY_METRICS_RAW_RETENTION_DAYS, hourly aggregates
+for V2RAY_METRICS_HOURLY_RETENTION_DAYS and daily aggregates indefinitely,
+which is a few rows per server and metric per day. Raw samples in
+partitioned tables are expired by partitions.maintain_partitions() instead.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import ServerMetrics, ServerHealthCheck, ServerRotationLog, ServerMetricsAggregate
+from .partitions import is_partitioned
+
+logger = logging.getLogger(__name__)
+
+# (metric name, SQL expression) per source
+SOURCES: Dict[str, Tuple[type, List[Tuple[str, str]]]] = {
+    'metrics': (ServerMetrics, [
+        ('cpu_usage', 'cpu_usage'),
+        ('memory_usage', 'memory_usage'),
+        ('disk_usage', 'disk_usage'),
+        ('network_in', 'network_in'),
+        ('network_out', 'network_out'),
+        ('active_connections', 'active_connections'),
+    ]),
+    'health': (ServerHealthCheck, [
+        ('cpu_usage', 'cpu_usage'),
+        ('memory_usage', 'memory_usage'),
+        ('disk_usage', 'disk_usage'),
+        ('uptime', 'uptime'),
+        # Average is the share of checks that found the server healthy
+        ('healthy', "CASE WHEN status = 'healthy' THEN 1 ELSE 0 END"),
+    ]),
+}
+
+AGGREGATE_TABLE = ServerMetricsAggregate._meta.db_table
+
+AGGREGATE_SQL = """
+INSERT INTO {target} (server_id, source, period, bucket, metric, sample_count,
+                      min_value, avg_value, max_value, p95_value)
+SELECT server_id, %s, %s, date_trunc(%s, timestamp), m.metric, COUNT(*),
+       MIN(m.value), AVG(m.value), MAX(m.value),
+       percentile_cont(0.95) WITHIN GROUP (ORDER BY m.value)
+FROM {source}
+CROSS JOIN LATERAL (VALUES {values}) AS m(metric, value)
+WHERE timestamp >= %s AND timestamp < %s
+GROUP BY server_id, date_trunc(%s, timestamp), m.metric
+ON CONFLICT (server_id, source, period, bucket, metric) DO UPDATE SET
+    sample_count = EXCLUDED.sample_count,
+    min_value = EXCLUDED.min_value,
+    avg_value = EXCLUDED.avg_value,
+    max_value = EXCLUDED.max_value,
+    p95_value = EXCLUDED.p95_value
+"""
+
+
+def _truncate(at: datetime, period: str) -> datetime:
+    at = at.replace(minute=0, second=0, microsecond=0)
+    if period == 'day':
+        at = at.replace(hour=0)
+    return at
+
+
+def aggregate_source(source: str, period: str, now: Optional[datetime] = None) -> int:
+    """
+    Aggregate the closed periods of a source that are not aggregated yet.
+
+    The last aggregated period is recomputed as well, so samples that
+    arrived late are included. Re-running is harmless.
+
+    Args:
+        source: 'metrics' or 'health'
+        period: 'hour' or 'day'
+        now: Current time, defaults to now
+
+    Returns:
+        Number of aggregate rows written
+    """
+    model, metrics = SOURCES[source]
+    end = _truncate(now or timezone.now(), period)
+
+    start = ServerMetricsAggregate.objects.filter(source=source, period=period).aggregate(
+        last=Max('bucket')
+    )['last']
+    if start is None:
+        start = model.objects.aggregate(first=Min('timestamp'))['first']
+        if start is None:
+            return 0
+        start = _truncate(start, period)
+
+    if start >= end:
+        return 0
+
+    values = ', '.join(f"('{name}', ({expression})::float8)" for name, expression in metrics)
+    sql = AGGREGATE_SQL.format(target=AGGREGATE_TABLE, source=model._meta.db_table, values=values)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [source, period, period, start, end, period])
+        return cursor.rowcount
+
+
+def update_aggregates(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Bring hourly and daily aggregates of every source up to date"""
+    return {
+        f"{source}_{period}": aggregate_source(source, period, now)
+        for source in SOURCES
+        for period in ('hour', 'day')
+    }
+
+
+def delete_in_batches(queryset, batch_size: Optional[int] = None) -> int:
+    """
+    Delete the rows of a queryset a batch at a time.
+
+    Short deletes keep lock times and WAL bursts small and let autovacuum
+    keep up, unlike a single DELETE over a week of rows.
+    """
+    batch_size = batch_size or getattr(settings, 'V2RAY_METRICS_DELETE_BATCH_SIZE', 5000)
+    model = queryset.model
+    deleted = 0
+
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        count, _ = model.objects.filter(pk__in=ids).delete()
+        deleted += count
+
+
+def apply_retention(now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Aggregate pending periods, then drop raw samples and hourly aggregates
+    past their retention.
+
+    Raw samples are only deleted up to the last daily aggregate, so nothing
+    is dropped before it has been summarized.
+
+    Returns:
+        Counts of aggregate rows written and rows deleted
+    """
+    now = now or timezone.now()
+    result = update_aggregates(now)
+
+    raw_cutoff = now - timedelta(days=getattr(settings, 'V2RAY_METRICS_RAW_RETENTION_DAYS', 7))
+    # Everything before the start of the current day has a daily aggregate
+    raw_cutoff = min(raw_cutoff, _truncate(now, 'day'))
+    hourly_cutoff = now - timedelta(days=getattr(settings, 'V2RAY_METRICS_HOURLY_RETENTION_DAYS', 90))
+    log_cutoff = now - timedelta(days=getattr(settings, 'V2RAY_ROTATION_LOG_RETENTION_DAYS', 7))
+
+    # Partitioned tables expire by dropping partitions (see partitions.py)
+    for key, model in (('metrics_deleted', ServerMetrics), ('health_deleted', ServerHealthCheck)):
+        if is_partitioned(model):
+            result[key] = 0
+        else:
+            result[key] = delete_in_batches(model.objects.filter(timestamp__lt=raw_cutoff))
+    result['hourly_deleted'] = delete_in_batches(
+        ServerMetricsAggregate.objects.filter(period='hour', bucket__lt=hourly_cutoff)
+    )
+    result['rotation_logs_deleted'] = delete_in_batches(
+        ServerRotationLog.objects.filter(timestamp__lt=log_cutoff)
+    )
+
+    return result
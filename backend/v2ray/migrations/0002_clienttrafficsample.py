@@ -0,0 +1,33 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+        ('v2ray', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientTrafficSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.CharField(max_length=255)),
+                ('granularity', models.CharField(choices=[('5m', '5 minutes'), ('1h', 'Hourly'), ('1d', 'Daily')], max_length=2)),
+                ('bucket', models.DateTimeField(help_text='Start of the time bucket')),
+                ('up', models.BigIntegerField(default=0, help_text='Upload traffic in bytes during the bucket')),
+                ('down', models.BigIntegerField(default=0, help_text='Download traffic in bytes during the bucket')),
+                ('server', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='traffic_samples', to='main.server')),
+            ],
+            options={
+                'ordering': ['-bucket'],
+                'indexes': [
+                    models.Index(fields=['email', 'bucket'], name='v2ray_clien_email_6f1c2e_idx'),
+                    models.Index(fields=['granularity', 'bucket'], name='v2ray_clien_granula_0b7d4a_idx'),
+                ],
+                'unique_together': {('server', 'email', 'granularity', 'bucket')},
+            },
+        ),
+    ]
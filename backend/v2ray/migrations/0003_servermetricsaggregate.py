@@ -0,0 +1,36 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+        ('v2ray', '0002_clienttrafficsample'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServerMetricsAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('metrics', 'Server Metrics'), ('health', 'Health Checks')], max_length=10)),
+                ('period', models.CharField(choices=[('hour', 'Hourly'), ('day', 'Daily')], max_length=4)),
+                ('bucket', models.DateTimeField(help_text='Start of the aggregated period')),
+                ('metric', models.CharField(max_length=50)),
+                ('sample_count', models.PositiveIntegerField()),
+                ('min_value', models.FloatField()),
+                ('avg_value', models.FloatField()),
+                ('max_value', models.FloatField()),
+                ('p95_value', models.FloatField()),
+                ('server', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_aggregates', to='main.server')),
+            ],
+            options={
+                'ordering': ['-bucket'],
+                'indexes': [
+                    models.Index(fields=['server', 'period', 'bucket'], name='v2ray_serve_server__5d2a91_idx'),
+                ],
+                'unique_together': {('server', 'source', 'period', 'bucket', 'metric')},
+            },
+        ),
+    ]
@@ -133,6 +133,39 @@ class ServerHealthCheck(models.Model):
         
         return 'healthy'
 
+class ServerMetricsAggregate(models.Model):
+    """Model for hourly and daily aggregates of server monitoring samples."""
+    SOURCE_CHOICES = (
+        ('metrics', _('Server Metrics')),
+        ('health', _('Health Checks')),
+    )
+    PERIOD_CHOICES = (
+        ('hour', _('Hourly')),
+        ('day', _('Daily')),
+    )
+    
+    server = models.ForeignKey(Server, on_delete=models.CASCADE, related_name='metric_aggregates')
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField(help_text='Start of the aggregated period')
+    metric = models.CharField(max_length=50)
+    sample_count = models.PositiveIntegerField()
+    min_value = models.FloatField()
+    avg_value = models.FloatField()
+    max_value = models.FloatField()
+    p95_value = models.FloatField()
+    
+    class Meta:
+        app_label = 'v2ray'
+        ordering = ['-bucket']
+        unique_together = ['server', 'source', 'period', 'bucket', 'metric']
+        indexes = [
+            models.Index(fields=['server', 'period', 'bucket']),
+        ]
+    
+    def __str__(self):
+        return f"{self.server.name} - {self.metric} - {self.period} - {self.bucket}"
+
 class ServerRotationLog(models.Model):
     """Model for server rotation logs."""
     STATUS_CHOICES = (
@@ -159,6 +192,36 @@ class ServerRotationLog(models.Model):
     def __str__(self):
         return f"{self.subscription.id} - {self.old_server.name} -> {self.new_server.name} - {self.status}"
 
+class ClientTrafficSample(models.Model):
+    """Model for per-client traffic usage within a time bucket."""
+    GRANULARITY_5MIN = '5m'
+    GRANULARITY_HOUR = '1h'
+    GRANULARITY_DAY = '1d'
+    GRANULARITY_CHOICES = (
+        (GRANULARITY_5MIN, _('5 minutes')),
+        (GRANULARITY_HOUR, _('Hourly')),
+        (GRANULARITY_DAY, _('Daily')),
+    )
+    
+    server = models.ForeignKey(Server, on_delete=models.CASCADE, related_name='traffic_samples')
+    email = models.CharField(max_length=255)
+    granularity = models.CharField(max_length=2, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField(help_text='Start of the time bucket')
+    up = models.BigIntegerField(default=0, help_text='Upload traffic in bytes during the bucket')
+    down = models.BigIntegerField(default=0, help_text='Download traffic in bytes during the bucket')
+    
+    class Meta:
+        app_label = 'v2ray'
+        ordering = ['-bucket']
+        unique_together = ['server', 'email', 'granularity', 'bucket']
+        indexes = [
+            models.Index(fields=['email', 'bucket']),
+            models.Index(fields=['granularity', 'bucket']),
+        ]
+    
+    def __str__(self):
+        return f"{self.email} - {self.granularity} - {self.bucket}"
+
 class SyncLog(models.Model):
     """Model for 3x-UI sync logs"""
     STATUS_CHOICES = (
@@ -0,0 +1,307 @@
+"""
+Native Postgres range partitioning for the monitoring tables.
+
+This module provides:
+- One-off conversion of ServerMonitor, ServerMetrics and ServerHealthCheck
+  into tables range-partitioned on `timestamp`
+- Creation of future partitions ahead of time
+- Retention by dropping whole expired partitions instead of DELETE
+
+Partitions are named <table>_p<YYYYMMDD> after the start of their range. A
+<table>_default partition catches rows outside every range, so inserts never
+fail if maintenance falls behind; those rows move into their partition once
+it is created, and expired ones are deleted from the default partition.
+"""
+
+import re
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from main.models import ServerMonitor
+from .models import ServerMetrics, ServerHealthCheck
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionedTable(NamedTuple):
+    model: type
+    interval: str  # 'day' or 'week'
+    retention_setting: str
+    retention_default: int
+
+
+PARTITIONED_TABLES = [
+    PartitionedTable(ServerMonitor, 'day', 'V2RAY_SERVER_MONITOR_RETENTION_DAYS', 30),
+    PartitionedTable(ServerMetrics, 'day', 'V2RAY_METRICS_RAW_RETENTION_DAYS', 7),
+    PartitionedTable(ServerHealthCheck, 'week', 'V2RAY_METRICS_RAW_RETENTION_DAYS', 7),
+]
+
+PARTITION_SUFFIX = re.compile(r'_p(\d{8})$')
+
+
+def period_start(at: datetime, interval: str) -> datetime:
+    """Start of the partition period containing a timestamp"""
+    start = at.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == 'week':
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def period_end(start: datetime, interval: str) -> datetime:
+    """End (exclusive) of the partition period starting at `start`"""
+    return start + timedelta(days=7 if interval == 'week' else 1)
+
+
+def partition_name(table: str, start: datetime) -> str:
+    return f"{table}_p{start:%Y%m%d}"
+
+
+def is_partitioned(model) -> bool:
+    """Check whether a model's table is a partitioned table"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s",
+            [model._meta.db_table]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(model) -> List[str]:
+    """Names of the partitions attached to a model's table"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s ORDER BY c.relname",
+            [model._meta.db_table]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _create_partition(cursor, table: str, start: datetime, interval: str) -> bool:
+    """
+    Create the partition starting at `start` unless it exists.
+
+    Postgres refuses to add a partition while the default partition holds
+    rows of its range, so those rows are moved into the new table before it
+    is attached.
+
+    Returns:
+        True if the partition was created
+    """
+    name = partition_name(table, start)
+    cursor.execute("SELECT to_regclass(%s)", [f'"{name}"'])
+    if cursor.fetchone()[0] is not None:
+        return False
+
+    end = period_end(start, interval)
+    with transaction.atomic():
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{table}_default" WHERE "timestamp" >= %s AND "timestamp" < %s '
+            f'RETURNING *) INSERT INTO "{name}" SELECT * FROM moved',
+            [start, end]
+        )
+        if cursor.rowcount:
+            logger.info(f"Moved {cursor.rowcount} rows from {table}_default into {name}")
+        cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [start, end])
+    return True
+
+
+def ensure_partitions(entry: PartitionedTable, now: Optional[datetime] = None) -> int:
+    """
+    Create the partitions for the current period and the next ones.
+
+    Returns:
+        Number of partitions that now cover the period up to the horizon
+    """
+    table = entry.model._meta.db_table
+    now = now or timezone.now()
+    horizon = now + timedelta(days=getattr(settings, 'V2RAY_PARTITION_PREMAKE_DAYS', 14))
+
+    start = period_start(now, entry.interval)
+    count = 0
+    with connection.cursor() as cursor:
+        while start <= horizon:
+            _create_partition(cursor, table, start, entry.interval)
+            start = period_end(start, entry.interval)
+            count += 1
+    return count
+
+
+def drop_expired_partitions(entry: PartitionedTable, now: Optional[datetime] = None) -> List[str]:
+    """
+    Detach and drop partitions whose whole range is past retention.
+
+    Returns:
+        Names of the dropped partitions
+    """
+    table = entry.model._meta.db_table
+    now = now or timezone.now()
+    retention = getattr(settings, entry.retention_setting, entry.retention_default)
+    cutoff = now - timedelta(days=retention)
+
+    dropped = []
+    for name in list_partitions(entry.model):
+        match = PARTITION_SUFFIX.search(name)
+        if not match:
+            continue
+        start = datetime.strptime(match.group(1), '%Y%m%d').replace(tzinfo=now.tzinfo)
+        if period_end(start, entry.interval) > cutoff:
+            continue
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+            cursor.execute(f'DROP TABLE "{name}"')
+        dropped.append(name)
+
+    return dropped
+
+
+def purge_default_partition(entry: PartitionedTable, now: Optional[datetime] = None) -> int:
+    """
+    Delete rows past retention from the default partition.
+
+    Returns:
+        Number of deleted rows
+    """
+    table = entry.model._meta.db_table
+    now = now or timezone.now()
+    retention = getattr(settings, entry.retention_setting, entry.retention_default)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM "{table}_default" WHERE "timestamp" < %s',
+            [now - timedelta(days=retention)]
+        )
+        return cursor.rowcount
+
+
+def convert_to_partitioned(entry: PartitionedTable, now: Optional[datetime] = None) -> bool:
+    """
+    Convert a plain table into a range-partitioned one, keeping its rows.
+
+    The table is locked while rows are copied, so run it in a maintenance
+    window. The primary key becomes (id, timestamp), since Postgres requires
+    the partition key in every unique constraint. Unique indexes without
+    `timestamp` are not recreated.
+
+    Returns:
+        True if the table was converted, False if it already was partitioned
+    """
+    if is_partitioned(entry.model):
+        return False
+
+    table = entry.model._meta.db_table
+    heap = f"{table}_heap"
+    now = now or timezone.now()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{table}" IN ACCESS EXCLUSIVE MODE')
+
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN ("
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u'))",
+            [table, table]
+        )
+        index_defs = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table]
+        )
+        foreign_keys = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+            [table]
+        )
+        is_identity = bool(cursor.fetchone()[0])
+        cursor.execute('SELECT MIN("timestamp") FROM "{}"'.format(table))
+        first = cursor.fetchone()[0] or now
+
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+            [table]
+        )
+        primary_key = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{heap}"')
+        if primary_key:
+            # Free the primary key's index name for the new table
+            cursor.execute(f'ALTER TABLE "{heap}" RENAME CONSTRAINT "{primary_key[0]}" TO "{heap}_pkey"')
+        cursor.execute(
+            f'CREATE TABLE "{table}" (LIKE "{heap}" INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(f'ALTER TABLE "{table}" ADD PRIMARY KEY (id, "timestamp")')
+
+        if not is_identity:
+            # A serial column's sequence belongs to the old table; keep it alive
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [heap])
+            sequence = cursor.fetchone()[0]
+            if sequence:
+                cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{table}".id')
+
+        cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+        start = period_start(first, entry.interval)
+        while start <= now:
+            _create_partition(cursor, table, start, entry.interval)
+            start = period_end(start, entry.interval)
+
+        cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{heap}"')
+        cursor.execute(f'DROP TABLE "{heap}"')
+
+        if is_identity:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT MAX(id) FROM \"{table}\"), 0) + 1, false)",
+                [table]
+            )
+
+        for index_def in index_defs:
+            if index_def.startswith('CREATE UNIQUE'):
+                logger.warning(f"Not recreating unique index on partitioned {table}: {index_def}")
+                continue
+            cursor.execute(re.sub(r' ON (ONLY )?(\S+\.)?"?' + re.escape(table) + r'"? ', f' ON "{table}" ', index_def))
+        for foreign_key in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{table}" ADD {foreign_key}')
+
+    logger.info(f"Converted {table} to a partitioned table")
+    return True
+
+
+def maintain_partitions(now: Optional[datetime] = None) -> Dict[str, Dict]:
+    """
+    Create upcoming partitions and drop expired ones for every partitioned
+    monitoring table. Tables that have not been converted are skipped, and a
+    failure on one table does not stop the others.
+
+    Monitoring aggregates are brought up to date first, so no samples are
+    dropped before they have been summarized.
+    """
+    # Imported here because metrics_retention depends on this module
+    from .metrics_retention import update_aggregates
+
+    now = now or timezone.now()
+    update_aggregates(now)
+
+    result = {}
+    for entry in PARTITIONED_TABLES:
+        table = entry.model._meta.db_table
+        try:
+            if not is_partitioned(entry.model):
+                continue
+            result[table] = {
+                'created': ensure_partitions(entry, now),
+                'dropped': drop_expired_partitions(entry, now),
+                'purged': purge_default_partition(entry, now),
+            }
+        except Exception as e:
+            logger.error(f"Error maintaining partitions of {table}: {str(e)}")
+            result[table] = {'error': str(e)}
+    return result
@@ -0,0 +1,162 @@
+"""
+Redis leases for coordinating syncs across Celery workers.
+
+This module provides:
+- Per-server leases with TTL renewal, so a panel is synced by one worker
+  at a time
+- Coalescing of periodic ticks, so a slow run absorbs the ticks that arrive
+  while it is still going instead of stacking runs on top of it
+"""
+
+import uuid
+import asyncio
+import functools
+import logging
+from typing import Any, Callable, Coroutine, Optional
+
+from redis.exceptions import RedisError
+from django.conf import settings
+
+from .async_utils import run_async
+from .sync_scheduler import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Only touch the key while it still holds our token
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseLost(Exception):
+    """The lease expired or was taken over by another worker while held"""
+
+
+class Lease:
+    """
+    Redis lease renewed in the background while it is held.
+
+    Use it with `async with` from coroutines or `with` from sync code, which
+    runs it on the process's background loop. `acquired` tells whether the
+    lease was obtained; `lost` is set if renewal failed while it was held,
+    and check() raises LeaseLost from then on.
+    """
+
+    def __init__(self, key: str, ttl: Optional[float] = None):
+        self.key = key
+        self.ttl = ttl or getattr(settings, 'V2RAY_SYNC_LEASE_TTL', 30)
+        self.token = uuid.uuid4().hex
+        self.acquired = False
+        self.lost = False
+        self._renewal: Optional[asyncio.Task] = None
+
+    async def acquire(self) -> bool:
+        """Try to take the lease without waiting"""
+        try:
+            self.acquired = bool(await get_redis().set(self.key, self.token, nx=True, px=int(self.ttl * 1000)))
+        except RedisError as e:
+            # Syncing twice is better than not syncing at all
+            logger.warning(f"Lease {self.key} unavailable, continuing without it: {str(e)}")
+            self.acquired = True
+            return True
+
+        if self.acquired:
+            self._renewal = asyncio.get_running_loop().create_task(self._renew())
+        return self.acquired
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                renewed = await get_redis().eval(RENEW_SCRIPT, 1, self.key, self.token, int(self.ttl * 1000))
+            except RedisError as e:
+                logger.warning(f"Could not renew lease {self.key}: {str(e)}")
+                continue
+            if not renewed:
+                self.lost = True
+                logger.error(f"Lease {self.key} was lost while held")
+                return
+
+    def check(self) -> None:
+        """Raise LeaseLost if the lease is no longer ours; call it before writing"""
+        if self.lost:
+            raise LeaseLost(f"Lease {self.key} was lost while held")
+
+    async def release(self) -> None:
+        """Stop renewing and give the lease up if it is still ours"""
+        if self._renewal:
+            self._renewal.cancel()
+            self._renewal = None
+
+        if not self.acquired:
+            return
+
+        self.acquired = False
+        try:
+            await get_redis().eval(RELEASE_SCRIPT, 1, self.key, self.token)
+        except RedisError as e:
+            logger.warning(f"Could not release lease {self.key}: {str(e)}")
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.release()
+
+    def __enter__(self):
+        run_async(self.acquire())
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        run_async(self.release())
+
+
+def server_lease(server_id: int) -> Lease:
+    """Lease that gives a worker exclusive sync rights on a server"""
+    return Lease(f"v2ray:sync:lease:{server_id}")
+
+
+def coalesce(name: str) -> Callable:
+    """
+    Coalesce overlapping runs of a periodic coroutine.
+
+    A run that starts while another is still going only flags that another
+    round is wanted and returns None. The running one repeats once at the
+    end, however many ticks arrived in the meantime.
+    """
+    def decorator(func: Callable[..., Coroutine[Any, Any, Any]]):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            pending_key = f"v2ray:tick:{name}:pending"
+            lease = Lease(f"v2ray:tick:{name}", ttl=getattr(settings, 'V2RAY_SYNC_LEASE_TTL', 30))
+
+            if not await lease.acquire():
+                try:
+                    await get_redis().set(pending_key, 1, ex=int(lease.ttl * 10))
+                except RedisError as e:
+                    logger.warning(f"Could not flag pending run of {name}: {str(e)}")
+                logger.info(f"{name} is still running, coalescing this tick")
+                return None
+
+            try:
+                while True:
+                    result = await func(*args, **kwargs)
+                    try:
+                        if not await get_redis().delete(pending_key):
+                            return result
+                    except RedisError:
+                        return result
+            finally:
+                await lease.release()
+        return wrapper
+    return decorator
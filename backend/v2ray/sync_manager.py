@@ -15,70 +15,162 @@ import asyncio
 import aiohttp
 from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
 from django.db.models import F
 
-from main.models import Server, ServerMonitor, User
-from v2ray.models import Inbound, Client
+from main.models import Server, ServerMonitor
+from v2ray.models import SyncLog
+from v2ray.async_utils import db_async
+from v2ray.circuit_breaker import CircuitBreaker
+from v2ray.sync_lease import Lease, LeaseLost, server_lease
+from v2ray.api_client import AsyncThreeXUIClient, IncompleteInboundList, fetch_server_snapshot
+from v2ray.sync_writer import write_server_snapshot
 from utils.notifications import send_telegram_notification
 
 logger = logging.getLogger(__name__)
 
+
 class ServerSyncManager:
     """Manager class for server synchronization."""
     
-    def __init__(self):
-        self.session = None
-        self.sync_lock = asyncio.Lock()
+    def __init__(self, concurrency: Optional[int] = None, server_timeout: Optional[float] = None,
+                 session: Optional[aiohttp.ClientSession] = None):
+        self.session = session
+        # A session passed in is shared with other users and is not closed here
+        self._owns_session = session is None
+        self.concurrency = concurrency or getattr(settings, 'V2RAY_SYNC_CONCURRENCY', 10)
+        self.server_timeout = server_timeout or getattr(settings, 'V2RAY_SYNC_SERVER_TIMEOUT', 60)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self._server_locks: Dict[int, asyncio.Lock] = {}
+        # Row counts of the last successful sync per server id
+        self.sync_details: Dict[int, Dict[str, int]] = {}
+        # Servers left alone because another worker holds their lease
+        self.skipped_servers = set()
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        if not self._owns_session:
+            return self
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency * 2),
+            timeout=aiohttp.ClientTimeout(
+                total=getattr(settings, 'THREEXUI_API_TIMEOUT', 30),
+                connect=getattr(settings, 'THREEXUI_CONNECT_TIMEOUT', 5)
+            )
+        )
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        if self.session and self._owns_session:
             await self.session.close()
     
+    def _server_lock(self, server: Server) -> asyncio.Lock:
+        """Get the lock that keeps a server from being synced twice at once."""
+        return self._server_locks.setdefault(server.id, asyncio.Lock())
+    
+    async def _mark_unsynced(self, server: Server) -> None:
+        server.is_synced = False
+        await db_async(server.save)(update_fields=['is_synced'])
+    
     async def sync_server(self, server: Server) -> bool:
         """
         Synchronize a single server.
         
+        At most `concurrency` servers sync at the same time, each one is
+        synced by a single worker at a time (see v2ray.sync_lease) and gives
+        up after `server_timeout` seconds.
+        
         Args:
             server: Server instance to sync
             
         Returns:
             True if sync successful, False otherwise
         """
-        async with self.sync_lock:
+        breaker = CircuitBreaker.for_server(server)
+        if not await breaker.allow_request():
+            logger.warning(f"Skipping sync of server {server.name}: panel is marked down")
+            return False
+        
+        async with self._server_lock(server), self.semaphore, server_lease(server.id) as lease:
+            if not lease.acquired:
+                logger.info(f"Skipping sync of server {server.name}: another worker is syncing it")
+                self.skipped_servers.add(server.id)
+                return False
+            
             try:
-                # Get server status
-                status = await self._get_server_status(server)
-                
-                # Update server status
-                server.is_active = status.get('is_active', False)
-                server.is_synced = True
-                server.last_sync = timezone.now()
-                server.save()
-                
-                # Sync inbounds
-                await self._sync_inbounds(server)
-                
-                # Sync clients
-                await self._sync_clients(server)
-                
-                # Record monitoring data
-                await self._record_monitoring_data(server, status)
-                
+                await asyncio.wait_for(self._sync_server(server, lease), timeout=self.server_timeout)
+                await breaker.record_success()
                 return True
+            except LeaseLost as e:
+                # Another worker owns the server now; leave the rest to it
+                logger.warning(f"Aborted sync of server {server.name}: {str(e)}")
+                self.skipped_servers.add(server.id)
+                return False
+            except asyncio.TimeoutError:
+                logger.error(f"Sync of server {server.name} timed out after {self.server_timeout}s")
+                await breaker.record_failure()
+                await self._mark_unsynced(server)
+                return False
+            except aiohttp.ClientError as e:
+                logger.error(f"Error syncing server {server.name}: {str(e)}")
+                await breaker.record_failure()
+                await self._mark_unsynced(server)
+                return False
             except Exception as e:
                 logger.error(f"Error syncing server {server.name}: {str(e)}")
-                server.is_synced = False
-                server.save()
+                await self._mark_unsynced(server)
                 return False
     
+    async def _sync_server(self, server: Server, lease: Lease) -> None:
+        """
+        Fetch and store the state of a server.
+        
+        Inbounds, clients and their traffic samples are written by
+        write_server_snapshot, as for manual syncs. The lease is checked
+        before each write so a sync whose lease was lost stops with LeaseLost
+        instead of racing the worker that took over.
+        """
+        # Get server status
+        status = await self._get_server_status(server)
+        
+        # Read inbounds and client traffic from the panel
+        try:
+            inbounds, client_traffic = await fetch_server_snapshot(AsyncThreeXUIClient(server))
+        except IncompleteInboundList as e:
+            await db_async(SyncLog.objects.create)(
+                server=server,
+                status='failed',
+                message=f"Failed to get inbounds from server: {str(e)}"
+            )
+            raise
+        
+        # Update server status
+        lease.check()
+        server.is_active = status.get('is_active', False)
+        server.is_synced = True
+        server.last_sync = timezone.now()
+        await db_async(server.save)()
+        
+        # Store inbounds, clients, linked subscriptions and traffic samples
+        lease.check()
+        details = await db_async(write_server_snapshot)(server, inbounds, client_traffic)
+        
+        # Record monitoring data
+        lease.check()
+        await db_async(self._record_monitoring_data)(server, status)
+        
+        self.sync_details[server.id] = details
+        await db_async(SyncLog.objects.create)(
+            server=server,
+            status='success',
+            message=(
+                f"Synchronization completed successfully: {details['rows_written']} rows written, "
+                f"{details['rows_skipped']} unchanged rows skipped"
+            ),
+            details=details
+        )
+    
     async def sync_all_servers(self) -> Dict[str, int]:
         """
-        Synchronize all active servers.
+        Synchronize all active servers concurrently.
         
         Returns:
             Dict with sync results
@@ -86,20 +178,23 @@ class ServerSyncManager:
         results = {
             'total': 0,
             'success': 0,
-            'failed': 0
+            'failed': 0,
+            'skipped': 0
         }
         
-        servers = Server.objects.filter(is_active=True)
-        results['total'] = servers.count()
+        servers = await db_async(list)(Server.objects.filter(is_active=True))
+        results['total'] = len(servers)
         
         tasks = [self.sync_server(server) for server in servers]
         results_list = await asyncio.gather(*tasks, return_exceptions=True)
         
-        for result in results_list:
+        for server, result in zip(servers, results_list):
             if isinstance(result, Exception):
                 results['failed'] += 1
             elif result:
                 results['success'] += 1
+            elif server.id in self.skipped_servers:
+                results['skipped'] += 1
             else:
                 results['failed'] += 1
         
@@ -112,64 +207,7 @@ class ServerSyncManager:
             response.raise_for_status()
             return await response.json()
     
-    async def _sync_inbounds(self, server: Server) -> None:
-        """Synchronize server inbounds."""
-        url = f"{settings.V2RAY_API_URL}/server/{server.sync_id}/inbounds"
-        async with self.session.get(url, timeout=30) as response:
-            response.raise_for_status()
-            inbounds_data = await response.json()
-            
-            for inbound_data in inbounds_data:
-                await self._update_inbound(server, inbound_data)
-    
-    async def _update_inbound(self, server: Server, inbound_data: Dict) -> None:
-        """Update or create inbound."""
-        Inbound.objects.update_or_create(
-            server=server,
-            port=inbound_data['port'],
-            defaults={
-                'protocol': inbound_data['protocol'],
-                'settings': inbound_data['settings'],
-                'stream_settings': inbound_data['stream_settings'],
-                'remark': inbound_data['remark']
-            }
-        )
-    
-    async def _sync_clients(self, server: Server) -> None:
-        """Synchronize server clients."""
-        url = f"{settings.V2RAY_API_URL}/server/{server.sync_id}/clients"
-        async with self.session.get(url, timeout=30) as response:
-            response.raise_for_status()
-            clients_data = await response.json()
-            
-            for client_data in clients_data:
-                await self._update_client(server, client_data)
-    
-    async def _update_client(self, server: Server, client_data: Dict) -> None:
-        """Update or create client."""
-        try:
-            user = User.objects.get(id=client_data['user_id'])
-            inbound = Inbound.objects.get(
-                server=server,
-                port=client_data['inbound_port']
-            )
-            
-            Client.objects.update_or_create(
-                user=user,
-                inbound=inbound,
-                defaults={
-                    'email': client_data['email'],
-                    'uuid': client_data['uuid'],
-                    'flow': client_data.get('flow', ''),
-                    'total_gb': client_data['total_gb'],
-                    'expire_days': client_data['expire_days'],
-                    'enable': client_data['enable']
-                }
-            )
-        except (User.DoesNotExist, Inbound.DoesNotExist) as e:
-            logger.error(f"Error updating client: {str(e)}")
-    
-    async def _record_monitoring_data(self, server: Server, status: Dict) -> None:
+    def _record_monitoring_data(self, server: Server, status: Dict) -> None:
         """Record server monitoring data."""
         ServerMonitor.objects.create(
             server=server,
@@ -194,8 +232,17 @@ class ServerSyncManager:
     
     async def check_server_health(self, server: Server) -> Dict:
         """Check server health status."""
+        breaker = CircuitBreaker.for_server(server)
+        if not await breaker.allow_request():
+            return {
+                'is_healthy': False,
+                'error': 'Panel is marked down by the circuit breaker',
+                'last_check': timezone.now()
+            }
+        
         try:
             status = await self._get_server_status(server)
+            await breaker.record_success()
             return {
                 'is_healthy': status.get('is_active', False),
                 'cpu_usage': status.get('cpu_usage', 0),
@@ -206,6 +253,8 @@ class ServerSyncManager:
             }
         except Exception as e:
             logger.error(f"Error checking server health: {str(e)}")
+            if isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+                await breaker.record_failure()
             return {
                 'is_healthy': False,
                 'error': str(e),
@@ -228,19 +277,18 @@ class ServerSyncManager:
         """Rotate subscriptions to alternative server."""
         try:
             # Find alternative server
-            alternative_server = Server.objects.filter(
-                is_active=True,
-                id__ne=server.id
-            ).order_by("?").first()
+            alternative_server = await db_async(
+                Server.objects.filter(is_active=True).exclude(id=server.id).order_by("?").first
+            )()
             
             if not alternative_server:
                 logger.warning(f"No alternative server available for rotation from {server.name}")
                 return
             
             # Get unhealthy subscriptions
-            subscriptions = server.v2ray_subscriptions.filter(
+            subscriptions = await db_async(list)(server.v2ray_subscriptions.filter(
                 status="active"
-            )
+            ))
             
             for subscription in subscriptions:
                 await self._rotate_subscription(subscription, alternative_server)
@@ -266,7 +314,7 @@ class ServerSyncManager:
                 # Update subscription
                 subscription.server = new_server
                 subscription.inbound_id = new_client['inbound_id']
-                subscription.save()
+                await db_async(subscription.save)()
                 
                 # Send notification
                 await send_telegram_notification(
@@ -0,0 +1,184 @@
+"""
+Adaptive per-server sync scheduler.
+
+This module provides:
+- A Redis sorted set of servers keyed by their next-due sync time
+- Per-server intervals that shrink for busy servers and back off for idle ones
+- A hard cap on the number of syncs running at the same time
+
+A short beat tick (v2ray.tasks.dispatch_server_syncs) claims the servers that
+are due instead of syncing every server on a flat 5-minute beat, so panel and
+database load is spread over time.
+"""
+
+import math
+import time
+import random
+import asyncio
+import logging
+import weakref
+from typing import List, Iterable
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_KEY = 'v2ray:sync:schedule'  # server id -> next due timestamp
+INTERVAL_KEY = 'v2ray:sync:interval'  # server id -> current interval in seconds
+RUNNING_KEY = 'v2ray:sync:running'    # server id -> sync start timestamp
+
+# Prune stale claims, count free slots and move due servers to running in one
+# step, so concurrent dispatchers cannot exceed the cap and a crash cannot
+# leave a server in neither set
+CLAIM_SCRIPT = """
+redis.call('zremrangebyscore', KEYS[2], '-inf', ARGV[2])
+local free = tonumber(ARGV[3]) - redis.call('zcard', KEYS[2])
+if free <= 0 then
+    return {}
+end
+local due = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, free)
+for _, member in ipairs(due) do
+    redis.call('zrem', KEYS[1], member)
+    redis.call('zadd', KEYS[2], ARGV[1], member)
+end
+return due
+"""
+
+# Redis clients are bound to the event loop that created them
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = weakref.WeakKeyDictionary()
+
+
+def get_redis() -> aioredis.Redis:
+    """Get the async Redis client for the running loop"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+
+    if client is None:
+        client = aioredis.Redis.from_url(settings.V2RAY_SYNC_REDIS_URL)
+        _clients[loop] = client
+
+    return client
+
+
+class SyncScheduler:
+    """Priority queue of servers ordered by next-due sync time"""
+
+    def __init__(self):
+        self.base_interval = getattr(settings, 'V2RAY_SYNC_BASE_INTERVAL', 300)
+        self.min_interval = getattr(settings, 'V2RAY_SYNC_MIN_INTERVAL', 60)
+        self.max_interval = getattr(settings, 'V2RAY_SYNC_MAX_INTERVAL', 1800)
+        self.max_concurrent = getattr(settings, 'V2RAY_SYNC_CONCURRENCY', 10)
+        # A sync that never reported back frees its slot after this long
+        self.stale_after = getattr(settings, 'V2RAY_SYNC_SERVER_TIMEOUT', 60) * 2
+
+    def next_interval(self, previous: float, rows_written: int, rows_total: int, active_clients: int) -> float:
+        """
+        Compute the interval until a server's next sync.
+
+        Servers with many active clients or a high share of changed rows
+        sync more often. Servers where nothing changed back off from their
+        previous interval.
+
+        Args:
+            previous: Interval used for the sync that just finished
+            rows_written: Rows changed by that sync
+            rows_total: Rows compared by that sync
+            active_clients: Enabled clients on the server
+
+        Returns:
+            Interval in seconds, within the configured bounds
+        """
+        if rows_written:
+            change_rate = rows_written / max(rows_total, 1)
+            activity = 1 + math.log10(1 + active_clients / 50)
+            interval = self.base_interval / activity / (1 + 10 * change_rate)
+        else:
+            interval = previous * 1.5
+
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def _due_at(self, interval: float) -> float:
+        # Jitter keeps servers from drifting back into lockstep
+        return time.time() + interval * random.uniform(0.9, 1.1)
+
+    async def ensure_scheduled(self, server_ids: Iterable[int]) -> None:
+        """
+        Add new servers to the schedule and drop removed ones.
+
+        New servers get a random first due time within the base interval so
+        a fresh schedule does not start with every server due at once.
+        """
+        server_ids = {str(server_id) for server_id in server_ids}
+        try:
+            redis_client = get_redis()
+            scheduled = {member.decode() for member in await redis_client.zrange(SCHEDULE_KEY, 0, -1)}
+            running = {member.decode() for member in await redis_client.zrange(RUNNING_KEY, 0, -1)}
+
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for server_id in server_ids - scheduled - running:
+                    pipe.zadd(SCHEDULE_KEY, {server_id: time.time() + random.uniform(0, self.base_interval)}, nx=True)
+                removed = scheduled - server_ids
+                if removed:
+                    pipe.zrem(SCHEDULE_KEY, *removed)
+                    pipe.hdel(INTERVAL_KEY, *removed)
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Could not update sync schedule: {str(e)}")
+
+    async def claim_due(self) -> List[int]:
+        """
+        Take the servers whose sync is due, up to the free concurrency slots.
+
+        Returns:
+            IDs of the claimed servers; each must be passed to complete()
+        """
+        now = time.time()
+        try:
+            claimed = await get_redis().eval(
+                CLAIM_SCRIPT, 2, SCHEDULE_KEY, RUNNING_KEY, now, now - self.stale_after, self.max_concurrent
+            )
+            return [int(member) for member in claimed]
+        except RedisError as e:
+            logger.error(f"Could not read sync schedule: {str(e)}")
+            return []
+
+    async def complete(self, server_id: int, success: bool, rows_written: int = 0,
+                       rows_total: int = 0, active_clients: int = 0) -> None:
+        """Release a claimed server and schedule its next sync"""
+        try:
+            redis_client = get_redis()
+            previous = float(await redis_client.hget(INTERVAL_KEY, server_id) or self.base_interval)
+
+            if success:
+                interval = self.next_interval(previous, rows_written, rows_total, active_clients)
+            else:
+                interval = min(self.max_interval, previous * 1.5)
+
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.hset(INTERVAL_KEY, server_id, interval)
+                pipe.zadd(SCHEDULE_KEY, {str(server_id): self._due_at(interval)})
+                pipe.zrem(RUNNING_KEY, str(server_id))
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Could not reschedule sync of server {server_id}: {str(e)}")
+
+    async def reschedule(self, server_id: int) -> None:
+        """Release a claimed server and keep its current interval"""
+        try:
+            redis_client = get_redis()
+            interval = float(await redis_client.hget(INTERVAL_KEY, server_id) or self.base_interval)
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.zadd(SCHEDULE_KEY, {str(server_id): self._due_at(interval)})
+                pipe.zrem(RUNNING_KEY, str(server_id))
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(f"Could not reschedule sync of server {server_id}: {str(e)}")
+
+    async def release(self, server_id: int) -> None:
+        """Release a claimed server without rescheduling it"""
+        try:
+            await get_redis().zrem(RUNNING_KEY, str(server_id))
+        except RedisError as e:
+            logger.error(f"Could not release sync of server {server_id}: {str(e)}")
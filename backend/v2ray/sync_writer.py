@@ -0,0 +1,327 @@
+"""
+Bulk writer for 3x-UI server synchronization.
+
+This module provides:
+- Parsing of the panel's inbound list into Inbound / Client field values
+- Content hashes per inbound and client so unchanged rows are skipped
+  without being loaded
+- A diff of the remaining payload against the stored rows
+- Chunked bulk_create / bulk_update of only the rows that changed
+- Per-client usage deltas for the traffic time series (see traffic.py)
+- A single client_email__in lookup for linked subscriptions
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Any, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Inbound, Client
+from .traffic import record_client_deltas, traffic_delta
+from main.models import Subscription
+
+logger = logging.getLogger(__name__)
+
+INBOUND_FIELDS = [
+    'protocol', 'tag', 'port', 'network', 'enable', 'expiry_time',
+    'listen', 'total', 'remark', 'up', 'down',
+]
+CLIENT_FIELDS = ['client_id', 'enable', 'expiry_time', 'total', 'up', 'down']
+
+GB = 1024 * 1024 * 1024
+
+
+def _batch_size():
+    return getattr(settings, 'V2RAY_SYNC_BATCH_SIZE', 500)
+
+
+def content_hash(values: Dict[str, Any]) -> str:
+    """Stable hash of parsed field values"""
+    payload = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _hash_key(server_id, kind: str) -> str:
+    return f"v2ray:sync_hashes:{kind}:{server_id}"
+
+
+def load_hashes(server_id, kind: str) -> Dict[str, str]:
+    """Get the content hashes stored by the last sync of a server"""
+    try:
+        return cache.get(_hash_key(server_id, kind)) or {}
+    except Exception as e:
+        logger.warning(f"Could not load sync hashes for server {server_id}: {str(e)}")
+        return {}
+
+
+def save_hashes(server_id, kind: str, hashes: Dict[str, str]) -> None:
+    """
+    Store the content hashes of a sync.
+
+    The hashes expire after V2RAY_SYNC_HASH_TTL so every row is compared
+    against the database again from time to time.
+    """
+    try:
+        cache.set(_hash_key(server_id, kind), hashes, getattr(settings, 'V2RAY_SYNC_HASH_TTL', 3600))
+    except Exception as e:
+        logger.warning(f"Could not save sync hashes for server {server_id}: {str(e)}")
+
+
+def clear_hashes(server_id, kind: str) -> None:
+    """Force the next sync of a server to compare every row"""
+    try:
+        cache.delete(_hash_key(server_id, kind))
+    except Exception as e:
+        logger.warning(f"Could not clear sync hashes for server {server_id}: {str(e)}")
+
+
+def split_changed(parsed: Dict[str, Dict[str, Any]], known: Dict[str, str]):
+    """
+    Split parsed rows into changed rows and the new hash map.
+
+    Args:
+        parsed: Field values keyed by a string row key
+        known: Hashes stored by the previous sync
+
+    Returns:
+        Tuple of (changed row keys, hashes of all rows)
+    """
+    hashes = {key: content_hash(values) for key, values in parsed.items()}
+    changed = {key for key, value in hashes.items() if known.get(key) != value}
+    return changed, hashes
+
+
+def _from_ms(value) -> Optional[datetime]:
+    """Convert a 3x-UI millisecond timestamp to an aware datetime"""
+    if not value or value <= 0:
+        return None
+    return datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+
+
+def _load_json(value) -> Dict[str, Any]:
+    """Parse a JSON string field of the panel payload"""
+    if isinstance(value, dict):
+        return value
+    try:
+        return json.loads(value or '{}')
+    except (TypeError, ValueError):
+        return {}
+
+
+def parse_inbound(inbound_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a panel inbound to Inbound field values"""
+    stream_settings = _load_json(inbound_data.get('streamSettings'))
+    return {
+        'protocol': inbound_data.get('protocol', ''),
+        'tag': inbound_data.get('remark', ''),
+        'port': inbound_data.get('port', 0),
+        'network': stream_settings.get('network', ''),
+        'enable': inbound_data.get('enable', False),
+        'expiry_time': _from_ms(inbound_data.get('expiryTime', 0)),
+        'listen': inbound_data.get('listen', ''),
+        'total': inbound_data.get('total', 0),
+        'remark': inbound_data.get('remark', ''),
+        'up': inbound_data.get('up', 0),
+        'down': inbound_data.get('down', 0),
+    }
+
+
+def parse_client(traffic_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a panel client traffic entry to Client field values"""
+    return {
+        'client_id': str(traffic_data.get('id', '')),
+        'enable': traffic_data.get('enable', True),
+        'expiry_time': _from_ms(traffic_data.get('expiryTime', 0)),
+        'total': traffic_data.get('total', 0),
+        'up': traffic_data.get('up', 0),
+        'down': traffic_data.get('down', 0),
+    }
+
+
+def _apply(obj, values: Dict[str, Any]) -> bool:
+    """Copy values onto a model instance, returning True if anything changed"""
+    changed = False
+    for field, value in values.items():
+        if getattr(obj, field) != value:
+            setattr(obj, field, value)
+            changed = True
+    return changed
+
+
+def _subscription_changes(subscription, client_values: Dict[str, Any], now) -> bool:
+    """Apply client usage and status to a linked subscription"""
+    used_gb = (client_values['up'] + client_values['down']) / GB
+    status = subscription.status
+
+    # Update status if expired
+    if client_values['expiry_time'] and client_values['expiry_time'] < now:
+        status = 'expired'
+    elif not client_values['enable']:
+        status = 'suspended'
+
+    return _apply(subscription, {'data_usage_gb': used_gb, 'status': status})
+
+
+def write_server_snapshot(server, inbounds: List[Dict[str, Any]],
+                          client_traffic: Dict[int, List[Dict[str, Any]]]) -> Dict[str, int]:
+    """
+    Persist a panel snapshot for a server with bulk queries.
+
+    Rows whose content hash matches the previous sync are skipped without
+    being loaded; the rest are diffed against the database and only real
+    changes are written.
+
+    Args:
+        server: Server the snapshot belongs to
+        inbounds: Inbound list returned by the panel
+        client_traffic: Client traffic entries keyed by panel inbound ID
+
+    Returns:
+        Counts of created, updated and skipped inbounds, clients and
+        subscriptions, plus rows_written / rows_skipped totals
+    """
+    now = timezone.now()
+    batch_size = _batch_size()
+    stats = {
+        'inbounds_created': 0,
+        'inbounds_updated': 0,
+        'inbounds_skipped': 0,
+        'clients_created': 0,
+        'clients_updated': 0,
+        'clients_skipped': 0,
+        'subscriptions_updated': 0,
+    }
+
+    parsed_inbounds = {}
+    for inbound_data in inbounds:
+        inbound_id = inbound_data.get('id')
+        # Skip if inbound doesn't have an ID
+        if inbound_id:
+            parsed_inbounds[str(inbound_id)] = parse_inbound(inbound_data)
+
+    parsed_clients = {}
+    for inbound_id, entries in client_traffic.items():
+        if str(inbound_id) not in parsed_inbounds:
+            continue
+        for traffic_data in entries or []:
+            email = traffic_data.get('email', '')
+            # Skip if email is empty
+            if email:
+                parsed_clients[f"{inbound_id}:{email}"] = parse_client(traffic_data)
+
+    changed_inbound_keys, inbound_hashes = split_changed(parsed_inbounds, load_hashes(server.id, 'inbounds'))
+    changed_client_keys, client_hashes = split_changed(parsed_clients, load_hashes(server.id, 'clients'))
+
+    # Inbound rows are needed for changed inbounds and as parents of changed clients
+    needed_inbound_ids = {int(key) for key in changed_inbound_keys}
+    needed_inbound_ids.update(int(key.split(':', 1)[0]) for key in changed_client_keys)
+
+    with transaction.atomic():
+        # Inbounds
+        existing_inbounds = {
+            inbound.inbound_id: inbound
+            for inbound in Inbound.objects.filter(server=server, inbound_id__in=needed_inbound_ids)
+        }
+        new_inbounds = []
+        changed_inbounds = []
+
+        for key in changed_inbound_keys:
+            inbound_id = int(key)
+            values = parsed_inbounds[key]
+            inbound = existing_inbounds.get(inbound_id)
+            if inbound is None:
+                new_inbounds.append(Inbound(server=server, inbound_id=inbound_id, last_sync=now, **values))
+            elif _apply(inbound, values):
+                inbound.last_sync = now
+                changed_inbounds.append(inbound)
+
+        Inbound.objects.bulk_create(new_inbounds, batch_size=batch_size)
+        Inbound.objects.bulk_update(changed_inbounds, INBOUND_FIELDS + ['last_sync'], batch_size=batch_size)
+        stats['inbounds_created'] = len(new_inbounds)
+        stats['inbounds_updated'] = len(changed_inbounds)
+        stats['inbounds_skipped'] = len(parsed_inbounds) - len(new_inbounds) - len(changed_inbounds)
+
+        inbound_rows = dict(existing_inbounds)
+        if new_inbounds:
+            # bulk_create does not return primary keys on every backend
+            inbound_rows.update({
+                inbound.inbound_id: inbound
+                for inbound in Inbound.objects.filter(
+                    server=server,
+                    inbound_id__in=[inbound.inbound_id for inbound in new_inbounds]
+                )
+            })
+
+        # Clients
+        changed_by_row = {}
+        for key in changed_client_keys:
+            inbound_id, email = key.split(':', 1)
+            inbound = inbound_rows.get(int(inbound_id))
+            if inbound is None:
+                # Not stored, so compare it again next time
+                client_hashes.pop(key, None)
+                continue
+            changed_by_row[(inbound.pk, email)] = parsed_clients[key]
+
+        existing_clients = {
+            (client.inbound_id, client.email): client
+            for client in Client.objects.filter(
+                inbound__in=[inbound.pk for inbound in inbound_rows.values()],
+                email__in={email for _, email in changed_by_row}
+            )
+        }
+        new_clients = []
+        changed_clients = []
+        touched = {}
+        deltas = []
+
+        for (inbound_pk, email), values in changed_by_row.items():
+            client = existing_clients.get((inbound_pk, email))
+            if client is None:
+                # First reading is the baseline for later deltas
+                new_clients.append(Client(inbound_id=inbound_pk, email=email, last_sync=now, **values))
+            else:
+                old_up, old_down = client.up, client.down
+                if not _apply(client, values):
+                    continue
+                client.last_sync = now
+                changed_clients.append(client)
+                deltas.append((email, *traffic_delta(old_up, old_down, client.up, client.down)))
+            touched[email] = values
+
+        Client.objects.bulk_create(new_clients, batch_size=batch_size)
+        Client.objects.bulk_update(changed_clients, CLIENT_FIELDS + ['last_sync'], batch_size=batch_size)
+        stats['clients_created'] = len(new_clients)
+        stats['clients_updated'] = len(changed_clients)
+        stats['clients_skipped'] = len(parsed_clients) - len(new_clients) - len(changed_clients)
+        stats['traffic_samples'] = record_client_deltas(server.id, deltas, now)
+
+        # Subscriptions linked to created or changed clients
+        changed_subscriptions = [
+            subscription
+            for subscription in Subscription.objects.filter(client_email__in=touched.keys())
+            if _subscription_changes(subscription, touched[subscription.client_email], now)
+        ]
+        Subscription.objects.bulk_update(changed_subscriptions, ['data_usage_gb', 'status'], batch_size=batch_size)
+        stats['subscriptions_updated'] = len(changed_subscriptions)
+
+        # Only remember the hashes once the rows they describe are committed
+        transaction.on_commit(lambda: (
+            save_hashes(server.id, 'inbounds', inbound_hashes),
+            save_hashes(server.id, 'clients', client_hashes),
+        ))
+
+    stats['rows_written'] = (
+        stats['inbounds_created'] + stats['inbounds_updated'] +
+        stats['clients_created'] + stats['clients_updated'] +
+        stats['subscriptions_updated']
+    )
+    stats['rows_skipped'] = stats['inbounds_skipped'] + stats['clients_skipped']
+
+    return stats
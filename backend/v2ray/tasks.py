@@ -8,8 +8,10 @@ This module contains Celery tasks for:
 - Notification sending
 """
 
+import asyncio
 import logging
-from typing import Dict, Any, List
+from decimal import Decimal
+from typing import Dict, Any, List, Tuple
 from datetime import datetime, timedelta
 from celery import shared_task
 from django.utils import timezone
@@ -23,17 +25,26 @@ from utils.xui_api import XUIClient
 from utils.notifications import send_telegram_notification
 from utils.server_sync import sync_server, sync_all_servers, check_server_health
 from v2ray.sync_manager import ServerSyncManager
+from v2ray.sync_scheduler import SyncScheduler
+from v2ray.sync_lease import coalesce
+from v2ray.traffic import rollup_traffic
+from v2ray.metrics_retention import apply_retention, update_aggregates
+from v2ray.partitions import maintain_partitions
+from v2ray.async_utils import async_task, db_async, get_aiohttp_session
 
 logger = logging.getLogger(__name__)
 
 @shared_task
-def sync_servers() -> None:
+@async_task
+@coalesce('sync_servers')
+async def sync_servers() -> None:
     """
-    Synchronize all active servers.
-    This task should be run every 5 minutes.
+    Synchronize all active servers at once.
+    Periodic syncs go through dispatch_server_syncs; this task is for
+    forcing a full round.
     """
     try:
-        async with ServerSyncManager() as sync_manager:
+        async with ServerSyncManager(session=get_aiohttp_session()) as sync_manager:
             results = await sync_manager.sync_all_servers()
             
             if results['failed'] > 0:
@@ -47,136 +58,251 @@ def sync_servers() -> None:
             f"❌ Server sync failed: {str(e)}"
         )
 
+async def _sync_scheduled_server(sync_manager: ServerSyncManager, scheduler: SyncScheduler,
+                                 server: Server) -> None:
+    """Sync a server claimed from the schedule and schedule its next sync."""
+    success = False
+    details = {}
+    active_clients = 0
+    try:
+        success = await sync_manager.sync_server(server)
+        details = sync_manager.sync_details.get(server.id, {})
+        active_clients = await db_async(
+            Client.objects.filter(inbound__server=server, enable=True).count
+        )()
+    except Exception as e:
+        logger.error(f"Error in scheduled sync of server {server.name}: {str(e)}")
+    finally:
+        if server.id in sync_manager.skipped_servers:
+            # Another worker held the lease; try again after the usual interval
+            await scheduler.reschedule(server.id)
+            return
+        await scheduler.complete(
+            server.id,
+            success,
+            rows_written=details.get('rows_written', 0),
+            rows_total=details.get('rows_written', 0) + details.get('rows_skipped', 0),
+            active_clients=active_clients
+        )
+
 @shared_task
-def monitor_servers() -> None:
+@async_task
+async def dispatch_server_syncs() -> None:
+    """
+    Sync the servers that are due according to the adaptive schedule.
+    This task should be run every 15 seconds. Runs on several workers may
+    overlap: each one only syncs the servers its claim_due() took.
+    """
+    try:
+        scheduler = SyncScheduler()
+        server_ids = await db_async(list)(
+            Server.objects.filter(is_active=True).values_list('id', flat=True)
+        )
+        await scheduler.ensure_scheduled(server_ids)
+        
+        due = await scheduler.claim_due()
+        if not due:
+            return
+        
+        servers = await db_async(list)(Server.objects.filter(id__in=due))
+        for server_id in set(due) - {server.id for server in servers}:
+            await scheduler.release(server_id)
+        
+        async with ServerSyncManager(session=get_aiohttp_session()) as sync_manager:
+            await asyncio.gather(*(
+                _sync_scheduled_server(sync_manager, scheduler, server) for server in servers
+            ))
+    except Exception as e:
+        logger.error(f"Error in dispatch_server_syncs task: {str(e)}")
+
+def _record_metrics(server: Server, metrics: List[Dict[str, Any]]) -> None:
+    """Store the metrics reported for a server in one insert."""
+    ServerMetrics.objects.bulk_create([
+        ServerMetrics(
+            server=server,
+            cpu_usage=metric['cpu_usage'],
+            memory_usage=metric['memory_usage'],
+            disk_usage=metric['disk_usage'],
+            network_in=metric['network_in'],
+            network_out=metric['network_out'],
+            active_connections=metric['active_connections']
+        )
+        for metric in metrics
+    ], batch_size=getattr(settings, 'V2RAY_SYNC_BATCH_SIZE', 500))
+
+async def _monitor_server(sync_manager: ServerSyncManager, server: Server) -> None:
+    """Record the metrics of a server and alert on high resource usage."""
+    try:
+        async with sync_manager.semaphore:
+            # Get server metrics
+            metrics = await sync_manager.get_server_metrics(server)
+        
+        # Record metrics
+        await db_async(_record_metrics)(server, metrics)
+        
+        # Check for high resource usage
+        latest_metric = metrics[0] if metrics else None
+        if latest_metric:
+            if (
+                latest_metric['cpu_usage'] > 80 or
+                latest_metric['memory_usage'] > 80 or
+                latest_metric['disk_usage'] > 80
+            ):
+                await send_telegram_notification(
+                    f"⚠️ High resource usage on server {server.name}\n"
+                    f"CPU: {latest_metric['cpu_usage']}%\n"
+                    f"Memory: {latest_metric['memory_usage']}%\n"
+                    f"Disk: {latest_metric['disk_usage']}%"
+                )
+    except Exception as e:
+        logger.error(f"Error monitoring server {server.name}: {str(e)}")
+
+@shared_task
+@async_task
+@coalesce('monitor_servers')
+async def monitor_servers() -> None:
     """
     Monitor all active servers and record their status.
     This task should be run every 5 minutes.
     """
     try:
-        async with ServerSyncManager() as sync_manager:
-            servers = Server.objects.filter(is_active=True)
-            
-            for server in servers:
-                try:
-                    # Get server metrics
-                    metrics = await sync_manager.get_server_metrics(server)
-                    
-                    # Record metrics
-                    for metric in metrics:
-                        ServerMetrics.objects.create(
-                            server=server,
-                            cpu_usage=metric['cpu_usage'],
-                            memory_usage=metric['memory_usage'],
-                            disk_usage=metric['disk_usage'],
-                            network_in=metric['network_in'],
-                            network_out=metric['network_out'],
-                            active_connections=metric['active_connections']
-                        )
-                    
-                    # Check for high resource usage
-                    latest_metric = metrics[0] if metrics else None
-                    if latest_metric:
-                        if (
-                            latest_metric['cpu_usage'] > 80 or
-                            latest_metric['memory_usage'] > 80 or
-                            latest_metric['disk_usage'] > 80
-                        ):
-                            await send_telegram_notification(
-                                f"⚠️ High resource usage on server {server.name}\n"
-                                f"CPU: {latest_metric['cpu_usage']}%\n"
-                                f"Memory: {latest_metric['memory_usage']}%\n"
-                                f"Disk: {latest_metric['disk_usage']}%"
-                            )
-                except Exception as e:
-                    logger.error(f"Error monitoring server {server.name}: {str(e)}")
+        async with ServerSyncManager(session=get_aiohttp_session()) as sync_manager:
+            servers = await db_async(list)(Server.objects.filter(is_active=True))
+            await asyncio.gather(*(_monitor_server(sync_manager, server) for server in servers))
     except Exception as e:
         logger.error(f"Error in monitor_servers task: {str(e)}")
 
+async def _check_server(sync_manager: ServerSyncManager, server: Server) -> None:
+    """Record a health check of a server and rotate its subscriptions if it is down."""
+    try:
+        # Check server health
+        async with sync_manager.semaphore:
+            health = await sync_manager.check_server_health(server)
+        
+        # Record health check
+        await db_async(ServerHealthCheck.objects.create)(
+            server=server,
+            status=health['is_healthy'] and 'healthy' or 'offline',
+            cpu_usage=health.get('cpu_usage', 0),
+            memory_usage=health.get('memory_usage', 0),
+            disk_usage=health.get('disk_usage', 0),
+            uptime=health.get('uptime', 0),
+            error_message=health.get('error', '')
+        )
+        
+        # Rotate subscriptions if server is unhealthy
+        if not health['is_healthy']:
+            await sync_manager.rotate_subscriptions(server)
+            
+    except Exception as e:
+        logger.error(f"Error checking health for server {server.name}: {str(e)}")
+
 @shared_task
-def check_server_health() -> None:
+@async_task
+@coalesce('check_server_health')
+async def check_server_health() -> None:
     """
     Check server health and perform automatic rotation if needed.
     This task should be run every 15 minutes.
     """
     try:
-        async with ServerSyncManager() as sync_manager:
-            servers = Server.objects.filter(is_active=True)
-            
-            for server in servers:
-                try:
-                    # Check server health
-                    health = await sync_manager.check_server_health(server)
-                    
-                    # Record health check
-                    ServerHealthCheck.objects.create(
-                        server=server,
-                        status=health['is_healthy'] and 'healthy' or 'offline',
-                        cpu_usage=health['cpu_usage'],
-                        memory_usage=health['memory_usage'],
-                        disk_usage=health['disk_usage'],
-                        uptime=health['uptime'],
-                        error_message=health.get('error', '')
-                    )
-                    
-                    # Rotate subscriptions if server is unhealthy
-                    if not health['is_healthy']:
-                        await sync_manager.rotate_subscriptions(server)
-                        
-                except Exception as e:
-                    logger.error(f"Error checking health for server {server.name}: {str(e)}")
+        async with ServerSyncManager(session=get_aiohttp_session()) as sync_manager:
+            servers = await db_async(list)(Server.objects.filter(is_active=True))
+            await asyncio.gather(*(_check_server(sync_manager, server) for server in servers))
     except Exception as e:
         logger.error(f"Error in check_server_health task: {str(e)}")
 
+@shared_task
+def aggregate_monitoring_data() -> None:
+    """
+    Roll server metrics and health checks up into hourly and daily aggregates.
+    This task should be run every hour.
+    """
+    try:
+        result = update_aggregates()
+        logger.info(f"Monitoring aggregates written: {result}")
+    except Exception as e:
+        logger.error(f"Error in aggregate_monitoring_data task: {str(e)}")
+
 @shared_task
 def cleanup_old_monitoring_data() -> None:
     """
     Clean up old monitoring data to prevent database bloat.
+    Raw samples are summarized into hourly and daily aggregates before
+    they are deleted in small batches.
     This task should be run daily.
     """
     try:
-        # Keep only last 7 days of data
-        cutoff_date = timezone.now() - timedelta(days=7)
-        
-        # Delete old metrics
-        ServerMetrics.objects.filter(timestamp__lt=cutoff_date).delete()
-        
-        # Delete old health checks
-        ServerHealthCheck.objects.filter(timestamp__lt=cutoff_date).delete()
-        
-        # Delete old rotation logs
-        ServerRotationLog.objects.filter(timestamp__lt=cutoff_date).delete()
-        
+        result = apply_retention()
+        logger.info(f"Monitoring data retention applied: {result}")
     except Exception as e:
         logger.error(f"Error in cleanup_old_monitoring_data task: {str(e)}")
 
 @shared_task
-def update_seller_commissions() -> None:
+def maintain_monitoring_partitions() -> None:
+    """
+    Create upcoming monitoring table partitions and drop expired ones.
+    This task should be run daily.
+    """
+    try:
+        result = maintain_partitions()
+        logger.info(f"Monitoring partitions maintained: {result}")
+    except Exception as e:
+        logger.error(f"Error in maintain_monitoring_partitions task: {str(e)}")
+
+@shared_task
+def rollup_client_traffic() -> None:
+    """
+    Roll per-client traffic samples up to hourly and daily buckets.
+    This task should be run every hour.
+    """
+    try:
+        result = rollup_traffic()
+        logger.info(
+            f"Traffic rollup: {result['hourly']} hourly and {result['daily']} daily samples written, "
+            f"{result['deleted']} expired samples deleted"
+        )
+    except Exception as e:
+        logger.error(f"Error in rollup_client_traffic task: {str(e)}")
+
+def _apply_seller_commissions() -> List[Tuple[str, Decimal]]:
+    """Credit seller commissions and return (username, commission) pairs."""
+    credited = []
+    sellers = User.objects.filter(role__name='seller')
+    
+    for seller in sellers:
+        try:
+            # Calculate commission
+            total_sales = seller.total_sales
+            commission_rate = seller.commission_rate
+            commission = total_sales * (commission_rate / 100)
+            
+            # Update seller's wallet
+            seller.wallet_balance = F('wallet_balance') + commission
+            seller.save()
+            
+            credited.append((seller.username, commission))
+        except Exception as e:
+            logger.error(f"Error updating commission for seller {seller.username}: {str(e)}")
+    
+    return credited
+
+@shared_task
+@async_task
+async def update_seller_commissions() -> None:
     """
     Update seller commissions based on sales.
     This task should be run daily.
     """
     try:
-        sellers = User.objects.filter(role__name='seller')
+        credited = await db_async(_apply_seller_commissions)()
         
-        for seller in sellers:
-            try:
-                # Calculate commission
-                total_sales = seller.total_sales
-                commission_rate = seller.commission_rate
-                commission = total_sales * (commission_rate / 100)
-                
-                # Update seller's wallet
-                seller.wallet_balance = F('wallet_balance') + commission
-                seller.save()
-                
-                # Send notification
-                if commission > 0:
-                    await send_telegram_notification(
-                        f"💰 Commission updated for seller {seller.username}\n"
-                        f"Amount: {commission:.2f}"
-                    )
-            except Exception as e:
-                logger.error(f"Error updating commission for seller {seller.username}: {str(e)}")
+        # Send notification
+        for username, commission in credited:
+            if commission > 0:
+                await send_telegram_notification(
+                    f"💰 Commission updated for seller {username}\n"
+                    f"Amount: {commission:.2f}"
+                )
     except Exception as e:
-        logger.error(f"Error in update_seller_commissions task: {str(e)}") 
\ No newline at end of file
+        logger.error(f"Error in update_seller_commissions task: {str(e)}")
@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+from django.test import SimpleTestCase
+
+from v2ray.api_client import IncompleteInboundList, fetch_server_snapshot
+
+
+class FakePanelClient:
+    """Serves an inbound list response in small chunks, optionally cut short"""
+
+    base_url = 'http://panel'
+
+    def __init__(self, body):
+        self.body = body
+        self.traffic_requests = []
+
+    async def iter_inbounds(self, stream):
+        for start in range(0, len(self.body), 7):
+            for inbound in stream.feed(self.body[start:start + 7]):
+                yield inbound
+
+    async def get_client_traffic(self, inbound_id):
+        self.traffic_requests.append(inbound_id)
+        return [{'email': f'{inbound_id}@fallback'}]
+
+
+class FetchServerSnapshotTest(SimpleTestCase):
+    def setUp(self):
+        self.body = json.dumps({'success': True, 'obj': [
+            {'id': 1, 'settings': '{"clients": []}', 'clientStats': [{'email': 'a@b.c'}]},
+            {'id': 2, 'settings': '{"clients": []}'},
+        ]})
+
+    def test_complete_list(self):
+        client = FakePanelClient(self.body)
+        inbounds, client_traffic = asyncio.run(fetch_server_snapshot(client))
+        self.assertEqual([inbound['id'] for inbound in inbounds], [1, 2])
+        self.assertNotIn('settings', inbounds[0])
+        self.assertEqual(client_traffic[1], [{'email': 'a@b.c'}])
+        # Only the inbound without clientStats needs its own request
+        self.assertEqual(client.traffic_requests, [2])
+
+    def test_truncated_list_raises(self):
+        client = FakePanelClient(self.body[:-20])
+        with self.assertRaises(IncompleteInboundList):
+            asyncio.run(fetch_server_snapshot(client))
+
+    def test_missing_list_raises(self):
+        client = FakePanelClient(json.dumps({'success': False, 'msg': 'error'}))
+        with self.assertRaises(IncompleteInboundList):
+            asyncio.run(fetch_server_snapshot(client))
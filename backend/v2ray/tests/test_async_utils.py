@@ -0,0 +1,36 @@
+import asyncio
+
+from django.test import SimpleTestCase
+
+from v2ray.async_utils import async_task, db_async, run_async
+
+
+class AsyncTaskTest(SimpleTestCase):
+    def test_runs_coroutine_and_returns_result(self):
+        @async_task
+        async def add(a, b):
+            await asyncio.sleep(0)
+            return a + b
+
+        self.assertEqual(add(2, 3), 5)
+        self.assertEqual(add.__name__, 'add')
+
+    def test_invocations_share_one_loop(self):
+        @async_task
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        self.assertIs(current_loop(), current_loop())
+
+    def test_db_async_runs_outside_the_loop(self):
+        def in_loop():
+            try:
+                asyncio.get_running_loop()
+                return True
+            except RuntimeError:
+                return False
+
+        async def check():
+            return await db_async(in_loop)()
+
+        self.assertFalse(run_async(check()))
@@ -0,0 +1,132 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from v2ray import circuit_breaker
+from v2ray.circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return queue
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    """Minimal async Redis stand-in; TTLs are stored but never expire on their own"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value).encode()
+        if ex:
+            self.ttls[key] = ex
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.ttls.pop(key, None)
+
+    async def incr(self, key):
+        value = int(self.data.get(key, 0)) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    async def expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return True
+
+    async def ttl(self, key):
+        if key not in self.data:
+            return -2
+        return self.ttls.get(key, -1)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def expire_now(self, key):
+        self.data.pop(key, None)
+        self.ttls.pop(key, None)
+
+
+@override_settings(THREEXUI_CIRCUIT_FAILURE_THRESHOLD=3, THREEXUI_CIRCUIT_RECOVERY_TIMEOUT=30)
+class CircuitBreakerTest(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch.object(circuit_breaker, 'get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('https://Panel.example.com:2053/')
+
+    def run_async(self, coro):
+        return asyncio.run(coro)
+
+    def fail(self, times):
+        for _ in range(times):
+            self.run_async(self.breaker.record_failure())
+
+    def test_closed_until_threshold(self):
+        self.fail(2)
+        self.assertTrue(self.run_async(self.breaker.allow_request()))
+        self.assertEqual(self.run_async(self.breaker.get_state())['state'], STATE_CLOSED)
+
+    def test_opens_at_threshold_and_fails_fast(self):
+        self.fail(3)
+        state = self.run_async(self.breaker.get_state())
+        self.assertEqual(state['state'], STATE_OPEN)
+        self.assertEqual(state['retry_in'], 30)
+        self.assertFalse(self.run_async(self.breaker.allow_request()))
+
+    def test_half_open_allows_single_probe(self):
+        self.fail(3)
+        self.redis.expire_now(f"{self.breaker.key}:open")
+
+        self.assertEqual(self.run_async(self.breaker.get_state())['state'], STATE_HALF_OPEN)
+        self.assertTrue(self.run_async(self.breaker.allow_request()))
+        self.assertFalse(self.run_async(self.breaker.allow_request()))
+
+    def test_successful_probe_closes_circuit(self):
+        self.fail(3)
+        self.redis.expire_now(f"{self.breaker.key}:open")
+        self.run_async(self.breaker.allow_request())
+        self.run_async(self.breaker.record_success())
+
+        self.assertEqual(self.run_async(self.breaker.get_state())['state'], STATE_CLOSED)
+        self.assertTrue(self.run_async(self.breaker.allow_request()))
+
+    def test_failed_probe_reopens_circuit(self):
+        self.fail(3)
+        self.redis.expire_now(f"{self.breaker.key}:open")
+        self.run_async(self.breaker.allow_request())
+        self.fail(1)
+
+        self.assertEqual(self.run_async(self.breaker.get_state())['state'], STATE_OPEN)
+
+    def test_key_is_shared_with_bot(self):
+        self.assertEqual(self.breaker.key, 'threexui:circuit:https://panel.example.com:2053')
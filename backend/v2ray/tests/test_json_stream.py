@@ -0,0 +1,59 @@
+import json
+
+from django.test import SimpleTestCase
+
+from v2ray.json_stream import JSONArrayStream
+
+
+def feed_in_chunks(text, size):
+    stream = JSONArrayStream()
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(stream.feed(text[start:start + size]))
+    return stream, items
+
+
+class JSONArrayStreamTest(SimpleTestCase):
+    def setUp(self):
+        self.inbounds = [
+            {
+                'id': i,
+                'remark': 'quote " bracket ] brace } backslash \\ ü',
+                'settings': json.dumps({'clients': [{'email': f'user{j}@panel'} for j in range(5)]}),
+                'clientStats': [{'email': f'user{j}@panel', 'up': j, 'down': j * 2} for j in range(5)],
+            }
+            for i in range(20)
+        ]
+
+    def test_items_match_json_loads_for_any_chunk_size(self):
+        text = json.dumps({'success': True, 'msg': 'obj: [', 'obj': self.inbounds}, ensure_ascii=False)
+        for size in (1, 7, 64, 4096, len(text)):
+            stream, items = feed_in_chunks(text, size)
+            self.assertEqual(items, self.inbounds)
+            self.assertTrue(stream.found and stream.done)
+
+    def test_only_top_level_key_is_used(self):
+        text = json.dumps({'meta': {'obj': [{'nested': True}]}, 'obj': self.inbounds[:2]})
+        _, items = feed_in_chunks(text, 13)
+        self.assertEqual(items, self.inbounds[:2])
+
+    def test_buffer_holds_at_most_one_item(self):
+        text = json.dumps({'obj': self.inbounds})
+        stream = JSONArrayStream()
+        item_size = len(json.dumps(self.inbounds[0]))
+        for start in range(0, len(text), 256):
+            stream.feed(text[start:start + 256])
+            self.assertLess(len(stream._buffer), item_size + 256)
+
+    def test_null_list(self):
+        stream, items = feed_in_chunks('{"success": false, "msg": "error", "obj": null}', 5)
+        self.assertEqual(items, [])
+        self.assertFalse(stream.found)
+        self.assertTrue(stream.done)
+
+    def test_truncated_response(self):
+        text = json.dumps({'obj': self.inbounds})
+        stream, items = feed_in_chunks(text[:len(text) // 2], 100)
+        self.assertTrue(stream.found)
+        self.assertFalse(stream.done)
+        self.assertLess(len(items), len(self.inbounds))
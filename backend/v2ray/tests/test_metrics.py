@@ -0,0 +1,65 @@
+import asyncio
+
+import httpx
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from main.metrics import InstrumentedTransport, PANEL_REQUEST_ERRORS, endpoint_label, metrics_view
+
+
+class EndpointLabelTest(SimpleTestCase):
+    def test_strips_ids_and_emails(self):
+        self.assertEqual(
+            endpoint_label('/panel/api/inbounds/delClient/5/user@example.com'),
+            '/panel/api/inbounds/delClient'
+        )
+
+    def test_ignores_base_path(self):
+        self.assertEqual(endpoint_label('/secret/panel/api/inbounds/list'), '/panel/api/inbounds/list')
+        self.assertEqual(endpoint_label('/secret/login'), '/login')
+
+
+class InstrumentedTransportTest(SimpleTestCase):
+    def errors(self, reason):
+        return PANEL_REQUEST_ERRORS.labels('panel.test:2053', '/panel/api/inbounds/list', reason)._value.get()
+
+    def request(self, handler):
+        transport = InstrumentedTransport(httpx.MockTransport(handler), 'https://panel.test:2053')
+
+        async def send():
+            async with httpx.AsyncClient(transport=transport, base_url='https://panel.test:2053') as client:
+                return await client.get('/panel/api/inbounds/list')
+
+        return asyncio.run(send())
+
+    def test_counts_server_errors(self):
+        before = self.errors('http_502')
+        self.request(lambda request: httpx.Response(502))
+        self.assertEqual(self.errors('http_502'), before + 1)
+
+    def test_counts_transport_errors(self):
+        def fail(request):
+            raise httpx.ConnectError('refused', request=request)
+
+        before = self.errors('ConnectError')
+        with self.assertRaises(httpx.ConnectError):
+            self.request(fail)
+        self.assertEqual(self.errors('ConnectError'), before + 1)
+
+
+class MetricsViewTest(SimpleTestCase):
+    def get(self, **headers):
+        return metrics_view(RequestFactory().get('/metrics', **headers))
+
+    @override_settings(PROMETHEUS_METRICS_TOKEN='', DEBUG=False)
+    def test_refused_without_token_outside_debug(self):
+        self.assertEqual(self.get().status_code, 403)
+
+    @override_settings(PROMETHEUS_METRICS_TOKEN='', DEBUG=True)
+    def test_served_without_token_in_debug(self):
+        self.assertEqual(self.get().status_code, 200)
+
+    @override_settings(PROMETHEUS_METRICS_TOKEN='secret', DEBUG=False)
+    def test_token_is_required(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
@@ -0,0 +1,127 @@
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from main.models import Server
+from v2ray import metrics_retention
+from v2ray.metrics_retention import SOURCES, _truncate, apply_retention, delete_in_batches, update_aggregates
+from v2ray.models import ServerMetrics, ServerHealthCheck, ServerMetricsAggregate
+
+
+def at(day, hour=0, minute=0):
+    return datetime(2024, 5, day, hour, minute, tzinfo=dt_timezone.utc)
+
+
+class RetentionHelpersTest(SimpleTestCase):
+    def test_truncate(self):
+        at = datetime(2024, 5, 1, 12, 38, 41, tzinfo=dt_timezone.utc)
+        self.assertEqual(_truncate(at, 'hour'), datetime(2024, 5, 1, 12, tzinfo=dt_timezone.utc))
+        self.assertEqual(_truncate(at, 'day'), datetime(2024, 5, 1, tzinfo=dt_timezone.utc))
+
+    def test_source_columns_exist(self):
+        for model, metrics in SOURCES.values():
+            fields = {field.name for field in model._meta.get_fields()}
+            for name, expression in metrics:
+                if expression == name:
+                    self.assertIn(name, fields)
+
+
+class RetentionDatabaseTest(TestCase):
+    def setUp(self):
+        self.server = Server.objects.create(name='test', host='127.0.0.1', port=2053)
+
+    def add_metrics(self, timestamp, cpu_usage):
+        sample = ServerMetrics.objects.create(
+            server=self.server, cpu_usage=cpu_usage, memory_usage=50, disk_usage=20,
+            network_in=1000, network_out=2000, active_connections=5
+        )
+        # timestamp is auto_now_add, so backdate it afterwards
+        ServerMetrics.objects.filter(pk=sample.pk).update(timestamp=timestamp)
+
+    def add_health_check(self, timestamp, status):
+        check = ServerHealthCheck.objects.create(
+            server=self.server, status=status, cpu_usage=10, memory_usage=50, disk_usage=20, uptime=3600
+        )
+        ServerHealthCheck.objects.filter(pk=check.pk).update(timestamp=timestamp)
+
+    def aggregate(self, source, period, bucket, metric):
+        return ServerMetricsAggregate.objects.get(
+            server=self.server, source=source, period=period, bucket=bucket, metric=metric
+        )
+
+    def test_aggregates_min_avg_max_p95(self):
+        for minute, cpu_usage in ((5, 10), (20, 20), (35, 30), (50, 40)):
+            self.add_metrics(at(1, 10, minute), cpu_usage)
+        for minute, status in ((0, 'healthy'), (15, 'healthy'), (30, 'healthy'), (45, 'unhealthy')):
+            self.add_health_check(at(1, 10, minute), status)
+
+        update_aggregates(at(3))
+
+        for period, bucket in (('hour', at(1, 10)), ('day', at(1))):
+            cpu = self.aggregate('metrics', period, bucket, 'cpu_usage')
+            self.assertEqual(cpu.sample_count, 4)
+            self.assertEqual((cpu.min_value, cpu.avg_value, cpu.max_value), (10, 25, 40))
+            # percentile_cont interpolates between the 3rd and 4th samples
+            self.assertAlmostEqual(cpu.p95_value, 38.5)
+        self.assertAlmostEqual(self.aggregate('health', 'day', at(1), 'healthy').avg_value, 0.75)
+
+    def test_rerun_is_idempotent_and_picks_up_late_samples(self):
+        self.add_metrics(at(1, 10, 5), 10)
+        self.add_metrics(at(1, 11, 5), 20)
+
+        update_aggregates(at(3))
+        first = list(ServerMetricsAggregate.objects.order_by('pk').values())
+        update_aggregates(at(3))
+        self.assertEqual(list(ServerMetricsAggregate.objects.order_by('pk').values()), first)
+
+        # A sample for the last aggregated hour arrives after it was aggregated
+        self.add_metrics(at(1, 11, 50), 60)
+        update_aggregates(at(3))
+
+        hour = self.aggregate('metrics', 'hour', at(1, 11), 'cpu_usage')
+        self.assertEqual((hour.sample_count, hour.max_value, hour.avg_value), (2, 60, 40))
+        day = self.aggregate('metrics', 'day', at(1), 'cpu_usage')
+        self.assertEqual((day.sample_count, day.min_value, day.avg_value, day.max_value), (3, 10, 30, 60))
+        self.assertEqual(self.aggregate('metrics', 'hour', at(1, 10), 'cpu_usage').sample_count, 1)
+
+    @override_settings(V2RAY_METRICS_RAW_RETENTION_DAYS=0)
+    def test_retention_keeps_samples_without_a_daily_aggregate(self):
+        self.add_metrics(at(1, 10), 10)
+        self.add_metrics(at(20, 3), 20)
+        self.add_health_check(at(20, 3), 'healthy')
+
+        # A zero-day retention would cut at "now"; it is clamped to the start of the day
+        result = apply_retention(at(20, 12))
+
+        self.assertEqual(result['metrics_deleted'], 1)
+        self.assertEqual(result['health_deleted'], 0)
+        self.assertEqual(list(ServerMetrics.objects.values_list('timestamp', flat=True)), [at(20, 3)])
+        self.assertEqual(ServerHealthCheck.objects.count(), 1)
+        self.assertEqual(self.aggregate('metrics', 'day', at(1), 'cpu_usage').sample_count, 1)
+
+    @override_settings(V2RAY_METRICS_RAW_RETENTION_DAYS=7)
+    def test_retention_skips_partitioned_tables(self):
+        self.add_metrics(at(1, 10), 10)
+        self.add_health_check(at(1, 10), 'healthy')
+
+        with mock.patch.object(metrics_retention, 'is_partitioned', return_value=True):
+            result = apply_retention(at(20))
+
+        self.assertEqual((result['metrics_deleted'], result['health_deleted']), (0, 0))
+        self.assertEqual(ServerMetrics.objects.count(), 1)
+        self.assertEqual(ServerHealthCheck.objects.count(), 1)
+
+    def test_delete_in_batches(self):
+        for minute in range(5):
+            self.add_metrics(at(1, 10, minute), 10)
+        self.add_metrics(at(2, 10), 10)
+
+        expired = ServerMetrics.objects.filter(timestamp__lt=at(2))
+        with mock.patch.object(ServerMetrics.objects, 'filter', wraps=ServerMetrics.objects.filter) as delete_filter:
+            deleted = delete_in_batches(expired, batch_size=2)
+
+        self.assertEqual(deleted, 5)
+        # One filtered delete per batch of two
+        self.assertEqual(delete_filter.call_count, 3)
+        self.assertEqual(list(ServerMetrics.objects.values_list('timestamp', flat=True)), [at(2, 10)])
@@ -0,0 +1,111 @@
+import contextlib
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from v2ray import partitions
+from v2ray.partitions import PARTITION_SUFFIX, PARTITIONED_TABLES, partition_name, period_end, period_start
+
+
+class RecordingCursor:
+    """Cursor stand-in that records SQL; to_regclass finds the names in `existing`"""
+
+    def __init__(self, existing=(), rowcount=0):
+        self.existing = set(existing)
+        self.rowcount = rowcount
+        self.executed = []
+        self._result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        if sql.startswith('SELECT to_regclass'):
+            name = params[0].strip('"')
+            self._result = (name if name in self.existing else None,)
+
+    def fetchone(self):
+        return self._result
+
+
+class PartitionPeriodTest(SimpleTestCase):
+    def test_day_period(self):
+        start = period_start(datetime(2024, 5, 16, 13, 45, tzinfo=timezone.utc), 'day')
+        self.assertEqual(start, datetime(2024, 5, 16, tzinfo=timezone.utc))
+        self.assertEqual(period_end(start, 'day'), datetime(2024, 5, 17, tzinfo=timezone.utc))
+
+    def test_week_period_starts_on_monday(self):
+        start = period_start(datetime(2024, 5, 16, 13, 45, tzinfo=timezone.utc), 'week')
+        self.assertEqual(start, datetime(2024, 5, 13, tzinfo=timezone.utc))
+        self.assertEqual(period_end(start, 'week'), datetime(2024, 5, 20, tzinfo=timezone.utc))
+
+    def test_partition_name_round_trips(self):
+        name = partition_name('v2ray_servermetrics', datetime(2024, 5, 13, tzinfo=timezone.utc))
+        self.assertEqual(name, 'v2ray_servermetrics_p20240513')
+        self.assertEqual(PARTITION_SUFFIX.search(name).group(1), '20240513')
+        self.assertIsNone(PARTITION_SUFFIX.search('v2ray_servermetrics_default'))
+
+
+class PartitionSQLTest(SimpleTestCase):
+    def setUp(self):
+        self.cursor = RecordingCursor(rowcount=3)
+        for patcher in (
+            mock.patch.object(partitions, 'connection', mock.Mock(cursor=lambda: self.cursor)),
+            mock.patch.object(partitions.transaction, 'atomic', contextlib.nullcontext),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def statements(self):
+        return [sql for sql, _ in self.cursor.executed]
+
+    def test_new_partition_takes_its_rows_from_the_default_partition(self):
+        start = datetime(2024, 5, 16, tzinfo=timezone.utc)
+        self.assertTrue(partitions._create_partition(self.cursor, 'monitor', start, 'day'))
+
+        statements = self.statements()
+        self.assertTrue(statements[1].startswith('CREATE TABLE "monitor_p20240516" (LIKE "monitor"'))
+        self.assertIn('DELETE FROM "monitor_default"', statements[2])
+        self.assertIn('INSERT INTO "monitor_p20240516"', statements[2])
+        self.assertEqual(self.cursor.executed[2][1], [start, datetime(2024, 5, 17, tzinfo=timezone.utc)])
+        # Rows are moved before the partition is attached
+        self.assertTrue(statements[3].startswith('ALTER TABLE "monitor" ATTACH PARTITION "monitor_p20240516"'))
+
+    def test_existing_partition_is_left_alone(self):
+        self.cursor.existing.add('monitor_p20240516')
+        start = datetime(2024, 5, 16, tzinfo=timezone.utc)
+        self.assertFalse(partitions._create_partition(self.cursor, 'monitor', start, 'day'))
+        self.assertEqual(len(self.cursor.executed), 1)
+
+    @override_settings(V2RAY_METRICS_RAW_RETENTION_DAYS=7)
+    def test_default_partition_retention(self):
+        entry = PARTITIONED_TABLES[1]
+        now = datetime(2024, 5, 16, tzinfo=timezone.utc)
+        self.assertEqual(partitions.purge_default_partition(entry, now), 3)
+        sql, params = self.cursor.executed[0]
+        self.assertEqual(sql, f'DELETE FROM "{entry.model._meta.db_table}_default" WHERE "timestamp" < %s')
+        self.assertEqual(params, [datetime(2024, 5, 9, tzinfo=timezone.utc)])
+
+    def test_failing_table_does_not_stop_maintenance(self):
+        first, *others = [entry.model._meta.db_table for entry in PARTITIONED_TABLES]
+
+        def ensure(entry, now):
+            if entry.model._meta.db_table == first:
+                raise RuntimeError('lock timeout')
+            return 2
+
+        with mock.patch('v2ray.metrics_retention.update_aggregates'), \
+                mock.patch.object(partitions, 'is_partitioned', return_value=True), \
+                mock.patch.object(partitions, 'ensure_partitions', side_effect=ensure), \
+                mock.patch.object(partitions, 'drop_expired_partitions', return_value=[]), \
+                mock.patch.object(partitions, 'purge_default_partition', return_value=0):
+            result = partitions.maintain_partitions(datetime(2024, 5, 16, tzinfo=timezone.utc))
+
+        self.assertEqual(result[first], {'error': 'lock timeout'})
+        for table in others:
+            self.assertEqual(result[table], {'created': 2, 'dropped': [], 'purged': 0})
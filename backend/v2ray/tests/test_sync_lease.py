@@ -0,0 +1,88 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from v2ray import sync_lease
+from v2ray.sync_lease import Lease, LeaseLost, coalesce, RENEW_SCRIPT, RELEASE_SCRIPT
+
+
+class FakeRedis:
+    """Async Redis stand-in covering the commands leases use; TTLs are ignored"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def set(self, key, value, nx=False, ex=None, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value).encode()
+        return True
+
+    async def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    async def eval(self, script, numkeys, key, token, *args):
+        if self.data.get(key) != str(token).encode():
+            return 0
+        if script == RELEASE_SCRIPT:
+            del self.data[key]
+        return 1
+
+
+@override_settings(V2RAY_SYNC_LEASE_TTL=30)
+class LeaseTest(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch.object(sync_lease, 'get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lease_is_exclusive(self):
+        async def run():
+            async with Lease('lease:1') as first:
+                async with Lease('lease:1') as second:
+                    self.assertTrue(first.acquired)
+                    self.assertFalse(second.acquired)
+            async with Lease('lease:1') as third:
+                self.assertTrue(third.acquired)
+        asyncio.run(run())
+
+    def test_release_keeps_a_lease_taken_over_by_another_worker(self):
+        async def run():
+            lease = Lease('lease:1')
+            await lease.acquire()
+            self.redis.data['lease:1'] = b'other-worker'
+            await lease.release()
+            self.assertEqual(self.redis.data['lease:1'], b'other-worker')
+        asyncio.run(run())
+
+    def test_failed_renewal_marks_the_lease_lost(self):
+        async def run():
+            lease = Lease('lease:1', ttl=0.03)
+            await lease.acquire()
+            lease.check()
+            # The key expired and another worker took it before the renewal
+            self.redis.data['lease:1'] = b'other-worker'
+            await asyncio.sleep(0.05)
+            self.assertTrue(lease.lost)
+            with self.assertRaises(LeaseLost):
+                lease.check()
+            await lease.release()
+            self.assertEqual(self.redis.data['lease:1'], b'other-worker')
+        asyncio.run(run())
+
+    def test_overlapping_ticks_are_coalesced(self):
+        runs = []
+
+        @coalesce('tick')
+        async def tick():
+            runs.append(len(runs))
+            if len(runs) == 1:
+                # Two ticks arrive while the first run is still going
+                self.assertIsNone(await tick())
+                self.assertIsNone(await tick())
+            return 'done'
+
+        self.assertEqual(asyncio.run(tick()), 'done')
+        self.assertEqual(runs, [0, 1])
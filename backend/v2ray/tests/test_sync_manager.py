@@ -0,0 +1,142 @@
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from v2ray.tests.test_sync_lease import FakeRedis
+from v2ray import tasks
+from v2ray.api_client import IncompleteInboundList
+from v2ray.sync_manager import ServerSyncManager
+
+
+class FakeBreaker:
+    async def allow_request(self):
+        return True
+
+    async def record_success(self):
+        pass
+
+    async def record_failure(self):
+        pass
+
+
+class ConcurrentSyncTest(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('v2ray.sync_manager.CircuitBreaker.for_server', return_value=FakeBreaker())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_syncs(self, manager, servers, sync):
+        async def run():
+            with mock.patch.object(manager, '_sync_server', sync), \
+                    mock.patch.object(manager, '_mark_unsynced', mock.AsyncMock()):
+                return await asyncio.gather(*(manager.sync_server(server) for server in servers))
+        return asyncio.run(run())
+
+    def test_concurrency_is_bounded(self):
+        manager = ServerSyncManager(concurrency=3, server_timeout=5)
+        running = {'now': 0, 'max': 0}
+
+        async def sync(server, lease):
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+            await asyncio.sleep(0.01)
+            running['now'] -= 1
+
+        servers = [SimpleNamespace(id=i, name=f"s{i}") for i in range(10)]
+        self.assertEqual(self.run_syncs(manager, servers, sync), [True] * 10)
+        self.assertEqual(running['max'], 3)
+
+    def test_same_server_is_not_synced_twice_at_once(self):
+        manager = ServerSyncManager(concurrency=5, server_timeout=5)
+        running = {'now': 0, 'max': 0}
+
+        async def sync(server, lease):
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+            await asyncio.sleep(0.01)
+            running['now'] -= 1
+
+        server = SimpleNamespace(id=1, name='s1')
+        self.run_syncs(manager, [server, server, server], sync)
+        self.assertEqual(running['max'], 1)
+
+    def test_slow_server_times_out(self):
+        manager = ServerSyncManager(concurrency=2, server_timeout=0.05)
+
+        async def sync(server, lease):
+            if server.id == 1:
+                await asyncio.sleep(1)
+
+        servers = [SimpleNamespace(id=1, name='slow'), SimpleNamespace(id=2, name='fast')]
+        self.assertEqual(self.run_syncs(manager, servers, sync), [False, True])
+
+    @override_settings(V2RAY_SYNC_LEASE_TTL=0.03)
+    def test_sync_stops_when_the_lease_is_lost(self):
+        manager = ServerSyncManager(concurrency=2, server_timeout=5)
+        redis = FakeRedis()
+        written = []
+
+        async def sync(server, lease):
+            # The lease expires and another worker takes it before a renewal
+            redis.data[lease.key] = b'other-worker'
+            await asyncio.sleep(0.05)
+            lease.check()
+            written.append(server.id)
+
+        server = SimpleNamespace(id=1, name='s1')
+        with mock.patch('v2ray.sync_lease.get_redis', return_value=redis):
+            self.assertEqual(self.run_syncs(manager, [server], sync), [False])
+        self.assertEqual(written, [])
+        self.assertIn(server.id, manager.skipped_servers)
+
+
+class ScheduledSyncTest(SimpleTestCase):
+    def setUp(self):
+        self.manager = ServerSyncManager(concurrency=1, server_timeout=5)
+        self.server = SimpleNamespace(id=1, name='s1', save=mock.Mock())
+        self.scheduler = mock.Mock(complete=mock.AsyncMock(), reschedule=mock.AsyncMock())
+        self.sync_log = mock.Mock()
+        for patcher in (
+            mock.patch('v2ray.sync_manager.CircuitBreaker.for_server', return_value=FakeBreaker()),
+            mock.patch('v2ray.sync_lease.get_redis', return_value=FakeRedis()),
+            mock.patch.object(self.manager, '_get_server_status', mock.AsyncMock(return_value={'is_active': True})),
+            mock.patch.object(self.manager, '_record_monitoring_data', mock.Mock()),
+            mock.patch.object(self.manager, '_mark_unsynced', mock.AsyncMock()),
+            mock.patch('v2ray.sync_manager.AsyncThreeXUIClient'),
+            mock.patch('v2ray.sync_manager.SyncLog', self.sync_log),
+            mock.patch('v2ray.tasks.Client'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        tasks.Client.objects.filter.return_value.count.return_value = 4
+
+    def run_scheduled_sync(self):
+        asyncio.run(tasks._sync_scheduled_server(self.manager, self.scheduler, self.server))
+
+    def test_scheduled_sync_writes_snapshot_with_traffic(self):
+        inbounds = [{'id': 7, 'port': 443}]
+        client_traffic = {7: [{'email': 'a@b.c', 'up': 10, 'down': 20}]}
+        stats = {'rows_written': 2, 'rows_skipped': 3, 'traffic_samples': 1}
+
+        with mock.patch('v2ray.sync_manager.fetch_server_snapshot',
+                        mock.AsyncMock(return_value=(inbounds, client_traffic))), \
+                mock.patch('v2ray.sync_manager.write_server_snapshot', return_value=stats) as write:
+            self.run_scheduled_sync()
+
+        write.assert_called_once_with(self.server, inbounds, client_traffic)
+        self.assertEqual(self.sync_log.objects.create.call_args.kwargs['details'], stats)
+        self.scheduler.complete.assert_awaited_once_with(
+            1, True, rows_written=2, rows_total=5, active_clients=4
+        )
+
+    def test_incomplete_inbound_list_fails_the_sync(self):
+        with mock.patch('v2ray.sync_manager.fetch_server_snapshot',
+                        mock.AsyncMock(side_effect=IncompleteInboundList('ended early'))), \
+                mock.patch('v2ray.sync_manager.write_server_snapshot') as write:
+            self.run_scheduled_sync()
+
+        write.assert_not_called()
+        self.assertEqual(self.sync_log.objects.create.call_args.kwargs['status'], 'failed')
+        self.assertFalse(self.scheduler.complete.await_args.args[1])
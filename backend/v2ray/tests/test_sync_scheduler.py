@@ -0,0 +1,83 @@
+import asyncio
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from v2ray import sync_scheduler
+from v2ray.sync_scheduler import SyncScheduler, CLAIM_SCRIPT, SCHEDULE_KEY, RUNNING_KEY
+
+
+class FakeScheduleRedis:
+    """Runs the claim script against in-memory sorted sets, atomically like Redis would"""
+
+    def __init__(self):
+        self.zsets = {SCHEDULE_KEY: {}, RUNNING_KEY: {}}
+
+    async def eval(self, script, numkeys, schedule_key, running_key, now, stale_before, max_concurrent):
+        assert script == CLAIM_SCRIPT
+        # Let concurrent callers reach this point before either one runs
+        await asyncio.sleep(0)
+        schedule, running = self.zsets[schedule_key], self.zsets[running_key]
+        for member, started in list(running.items()):
+            if started <= stale_before:
+                del running[member]
+        free = max_concurrent - len(running)
+        if free <= 0:
+            return []
+        due = sorted((score, member) for member, score in schedule.items() if score <= now)[:free]
+        for _, member in due:
+            del schedule[member]
+            running[member] = now
+        return [member for _, member in due]
+
+
+@override_settings(V2RAY_SYNC_BASE_INTERVAL=300, V2RAY_SYNC_MIN_INTERVAL=60, V2RAY_SYNC_MAX_INTERVAL=1800)
+class NextIntervalTest(SimpleTestCase):
+    def setUp(self):
+        self.scheduler = SyncScheduler()
+
+    def test_idle_server_backs_off(self):
+        self.assertEqual(self.scheduler.next_interval(300, 0, 100, 10), 450)
+
+    def test_backoff_is_capped(self):
+        self.assertEqual(self.scheduler.next_interval(1500, 0, 100, 10), 1800)
+
+    def test_busy_server_syncs_sooner(self):
+        quiet = self.scheduler.next_interval(300, 1, 1000, 10)
+        busy = self.scheduler.next_interval(300, 100, 1000, 10)
+        crowded = self.scheduler.next_interval(300, 1, 1000, 5000)
+        self.assertLess(busy, quiet)
+        self.assertLess(crowded, quiet)
+        self.assertLess(quiet, 300)
+
+    def test_interval_has_a_floor(self):
+        self.assertEqual(self.scheduler.next_interval(300, 1000, 1000, 100000), 60)
+
+
+@override_settings(V2RAY_SYNC_CONCURRENCY=3, V2RAY_SYNC_SERVER_TIMEOUT=60)
+class ClaimDueTest(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeScheduleRedis()
+        patcher = mock.patch.object(sync_scheduler, 'get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scheduler = SyncScheduler()
+        now = time.time()
+        self.redis.zsets[SCHEDULE_KEY] = {str(server_id).encode(): now - server_id for server_id in range(1, 6)}
+
+    def test_concurrent_claims_respect_the_cap(self):
+        async def run():
+            return await asyncio.gather(self.scheduler.claim_due(), self.scheduler.claim_due())
+        first, second = asyncio.run(run())
+        self.assertEqual(len(first) + len(second), 3)
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(len(self.redis.zsets[RUNNING_KEY]), 3)
+        # Unclaimed servers stay scheduled
+        self.assertEqual(len(self.redis.zsets[SCHEDULE_KEY]), 2)
+
+    def test_stale_claims_free_their_slots(self):
+        self.redis.zsets[RUNNING_KEY] = {b'7': time.time() - 300, b'8': time.time()}
+        claimed = asyncio.run(self.scheduler.claim_due())
+        self.assertEqual(claimed, [5, 4])
+        self.assertEqual(set(self.redis.zsets[RUNNING_KEY]), {b'8', b'5', b'4'})
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone as dt_timezone
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from v2ray.sync_writer import (
+    parse_inbound, parse_client, content_hash, split_changed, _apply, _subscription_changes, GB
+)
+
+
+class ParsePayloadTest(SimpleTestCase):
+    def test_parse_inbound(self):
+        values = parse_inbound({
+            'id': 3,
+            'protocol': 'vless',
+            'remark': 'main',
+            'port': 443,
+            'enable': True,
+            'expiryTime': 1700000000000,
+            'streamSettings': '{"network": "ws"}',
+            'up': 10,
+            'down': 20,
+        })
+        self.assertEqual(values['network'], 'ws')
+        self.assertEqual(values['tag'], 'main')
+        self.assertEqual(values['expiry_time'], datetime(2023, 11, 14, 22, 13, 20, tzinfo=dt_timezone.utc))
+        self.assertEqual((values['up'], values['down']), (10, 20))
+
+    def test_parse_inbound_with_invalid_stream_settings(self):
+        values = parse_inbound({'id': 1, 'streamSettings': 'not json', 'expiryTime': 0})
+        self.assertEqual(values['network'], '')
+        self.assertIsNone(values['expiry_time'])
+
+    def test_parse_client(self):
+        values = parse_client({'id': 7, 'email': 'a@b.c', 'enable': False, 'total': 5, 'up': 1, 'down': 2})
+        self.assertEqual(values['client_id'], '7')
+        self.assertFalse(values['enable'])
+        self.assertIsNone(values['expiry_time'])
+
+
+class DiffTest(SimpleTestCase):
+    def test_apply_reports_changes_only(self):
+        obj = SimpleNamespace(up=1, down=2)
+        self.assertFalse(_apply(obj, {'up': 1, 'down': 2}))
+        self.assertTrue(_apply(obj, {'up': 1, 'down': 3}))
+        self.assertEqual(obj.down, 3)
+
+    def test_subscription_suspended_when_client_disabled(self):
+        subscription = SimpleNamespace(data_usage_gb=0, status='active')
+        now = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        changed = _subscription_changes(
+            subscription,
+            {'up': GB, 'down': GB, 'enable': False, 'expiry_time': None},
+            now
+        )
+        self.assertTrue(changed)
+        self.assertEqual(subscription.status, 'suspended')
+        self.assertEqual(subscription.data_usage_gb, 2)
+
+
+class ContentHashTest(SimpleTestCase):
+    def test_split_changed(self):
+        parsed = {'1': {'up': 1}, '2': {'up': 2}}
+        changed, hashes = split_changed(parsed, {})
+        self.assertEqual(changed, {'1', '2'})
+
+        parsed['2'] = {'up': 3}
+        changed, _ = split_changed(parsed, hashes)
+        self.assertEqual(changed, {'2'})
+
+    def test_hash_ignores_key_order(self):
+        self.assertEqual(content_hash({'a': 1, 'b': 2}), content_hash({'b': 2, 'a': 1}))
@@ -0,0 +1,102 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from main.models import Server
+from v2ray.models import ClientTrafficSample
+from v2ray.traffic import bucket_start, record_client_deltas, rollup_traffic, traffic_delta
+
+FIVE_MIN = ClientTrafficSample.GRANULARITY_5MIN
+HOUR = ClientTrafficSample.GRANULARITY_HOUR
+DAY = ClientTrafficSample.GRANULARITY_DAY
+
+
+def at(day, hour=0, minute=0):
+    return datetime(2024, 5, day, hour, minute, tzinfo=dt_timezone.utc)
+
+
+class TrafficDeltaTest(SimpleTestCase):
+    def test_delta_between_readings(self):
+        self.assertEqual(traffic_delta(100, 200, 150, 260), (50, 60))
+
+    def test_counter_reset_counts_new_reading(self):
+        self.assertEqual(traffic_delta(1000, 2000, 30, 2100), (30, 100))
+
+    def test_bucket_start(self):
+        at = datetime(2024, 5, 1, 12, 38, 41, 500, tzinfo=dt_timezone.utc)
+        self.assertEqual(bucket_start(at), datetime(2024, 5, 1, 12, 35, tzinfo=dt_timezone.utc))
+        self.assertEqual(bucket_start(bucket_start(at)), bucket_start(at))
+
+
+@override_settings(V2RAY_TRAFFIC_HOURLY_AFTER=6, V2RAY_TRAFFIC_DAILY_AFTER=7, V2RAY_TRAFFIC_RETENTION_DAYS=365)
+class TrafficDatabaseTest(TestCase):
+    def setUp(self):
+        self.server = Server.objects.create(name='test', host='127.0.0.1', port=2053)
+
+    def samples(self):
+        return list(
+            ClientTrafficSample.objects.order_by('email', 'granularity', 'bucket')
+            .values_list('email', 'granularity', 'bucket', 'up', 'down')
+        )
+
+    def totals(self):
+        return {
+            row['email']: (row['up'], row['down'])
+            for row in ClientTrafficSample.objects.values('email').annotate(up=Sum('up'), down=Sum('down'))
+        }
+
+    def test_deltas_add_to_the_current_bucket(self):
+        written = record_client_deltas(self.server.id, [('a', 10, 20), ('a', 5, 5), ('b', 0, 0)], at(1, 12, 31))
+        self.assertEqual(written, 1)
+        record_client_deltas(self.server.id, [('a', 15, 25)], at(1, 12, 34))
+        record_client_deltas(self.server.id, [('a', 1, 1)], at(1, 12, 35))
+
+        self.assertEqual(self.samples(), [
+            ('a', FIVE_MIN, at(1, 12, 30), 30, 50),
+            ('a', FIVE_MIN, at(1, 12, 35), 1, 1),
+        ])
+
+    def test_rollup_preserves_totals(self):
+        readings = [
+            # Either side of midnight, old enough to end up daily
+            (at(10, 23, 58), 'a', 100, 1000),
+            (at(10, 23, 59), 'a', 50, 500),
+            (at(11, 0, 2), 'a', 10, 100),
+            # Two 5-minute buckets of one hour, old enough to end up hourly
+            (at(15, 10, 3), 'a', 1, 2),
+            (at(15, 10, 33), 'a', 3, 4),
+            (at(15, 10, 33), 'b', 7, 7),
+            # Either side of the hourly cutoff (06:00)
+            (at(20, 5, 57), 'a', 5, 5),
+            (at(20, 6, 1), 'a', 6, 6),
+        ]
+        for timestamp, email, up, down in readings:
+            record_client_deltas(self.server.id, [(email, up, down)], timestamp)
+        totals = self.totals()
+        self.assertEqual(totals, {'a': (175, 1617), 'b': (7, 7)})
+
+        first = rollup_traffic(at(20, 12))
+        self.assertEqual(self.totals(), totals)
+        self.assertEqual(self.samples(), [
+            ('a', DAY, at(10), 150, 1500),
+            ('a', DAY, at(11), 10, 100),
+            ('a', HOUR, at(15, 10), 4, 6),
+            ('a', HOUR, at(20, 5), 5, 5),
+            ('a', FIVE_MIN, at(20, 6), 6, 6),
+            ('b', HOUR, at(15, 10), 7, 7),
+        ])
+        self.assertEqual(first['deleted'], 0)
+
+        rolled_up = self.samples()
+        second = rollup_traffic(at(20, 12))
+        self.assertEqual((second['hourly'], second['daily']), (0, 0))
+        self.assertEqual(self.samples(), rolled_up)
+        self.assertEqual(self.totals(), totals)
+
+        # A late sample for an hour that was already rolled up adds to it
+        record_client_deltas(self.server.id, [('a', 2, 2)], at(20, 5, 59))
+        rollup_traffic(at(20, 12))
+        self.assertEqual(self.totals(), {'a': (177, 1619), 'b': (7, 7)})
+        self.assertIn(('a', HOUR, at(20, 5), 7, 7), self.samples())
+        self.assertFalse(ClientTrafficSample.objects.filter(granularity=FIVE_MIN, bucket__lt=at(20, 6)).exists())
@@ -0,0 +1,26 @@
+from django.test import SimpleTestCase
+from django.urls import Resolver404, resolve
+
+from v2ray.views import ServerMonitorViewSet
+
+# Paths the bot requests under its API_BASE_URL (see bot/utils/api.py and
+# bot/tests/test_api_paths.py), with the monitoring action each must reach
+BOT_MONITORING_PATHS = {
+    '/api/v1/v2ray/monitoring/1/health/': 'health',
+    '/api/v1/v2ray/monitoring/1/stats/': 'stats',
+    '/api/v1/v2ray/monitoring/1/history/': 'history',
+    '/api/v1/v2ray/monitoring/all_health/': 'all_health',
+}
+
+
+class MonitoringRoutesTest(SimpleTestCase):
+    def test_bot_paths_resolve_to_monitoring_actions(self):
+        for path, action in BOT_MONITORING_PATHS.items():
+            with self.subTest(path=path):
+                match = resolve(path)
+                self.assertIs(match.func.cls, ServerMonitorViewSet)
+                self.assertEqual(match.func.actions, {'get': action})
+
+    def test_server_has_no_plain_detail_route(self):
+        with self.assertRaises(Resolver404):
+            resolve('/api/v1/v2ray/monitoring/1/')
@@ -0,0 +1,214 @@
+"""
+Per-client traffic time series.
+
+This module provides:
+- Recording of per-client usage deltas into 5-minute buckets during sync
+- Rollups from 5-minute to hourly and from hourly to daily buckets
+- Query helpers for usage over the last N hours or days
+
+Every sample lives at exactly one granularity, so usage over a period is the
+sum of all samples in it regardless of how far they have been rolled up.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import ClientTrafficSample
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 300
+GB = 1024 * 1024 * 1024
+
+TABLE = ClientTrafficSample._meta.db_table
+
+# Samples landing in an existing bucket add to it
+UPSERT_SQL = f"""
+INSERT INTO {TABLE} (server_id, email, granularity, bucket, up, down)
+VALUES {{values}}
+ON CONFLICT (server_id, email, granularity, bucket)
+DO UPDATE SET up = {TABLE}.up + EXCLUDED.up, down = {TABLE}.down + EXCLUDED.down
+"""
+
+# Move samples older than a cutoff into the next granularity in one statement
+ROLLUP_SQL = f"""
+WITH moved AS (
+    DELETE FROM {TABLE}
+    WHERE granularity = %s AND bucket < %s
+    RETURNING server_id, email, bucket, up, down
+)
+INSERT INTO {TABLE} (server_id, email, granularity, bucket, up, down)
+SELECT server_id, email, %s, date_trunc(%s, bucket), SUM(up), SUM(down)
+FROM moved
+GROUP BY server_id, email, date_trunc(%s, bucket)
+ON CONFLICT (server_id, email, granularity, bucket)
+DO UPDATE SET up = {TABLE}.up + EXCLUDED.up, down = {TABLE}.down + EXCLUDED.down
+"""
+
+
+def bucket_start(at: datetime) -> datetime:
+    """Start of the 5-minute bucket containing a timestamp"""
+    return at - timedelta(
+        minutes=at.minute % (BUCKET_SECONDS // 60),
+        seconds=at.second,
+        microseconds=at.microsecond
+    )
+
+
+def traffic_delta(old_up: int, old_down: int, new_up: int, new_down: int) -> Tuple[int, int]:
+    """
+    Usage between two cumulative readings.
+
+    A counter that went down was reset on the panel, so the new reading is
+    all usage since the reset.
+    """
+    up = new_up - old_up if new_up >= old_up else new_up
+    down = new_down - old_down if new_down >= old_down else new_down
+    return up, down
+
+
+def record_client_deltas(server_id: int, deltas: Iterable[Tuple[str, int, int]],
+                         at: Optional[datetime] = None) -> int:
+    """
+    Add per-client usage deltas to the current 5-minute bucket.
+
+    Args:
+        server_id: Server the clients belong to
+        deltas: (email, up bytes, down bytes) tuples
+        at: Time of the reading, defaults to now
+
+    Returns:
+        Number of samples written
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for email, up, down in deltas:
+        if up or down:
+            totals[email][0] += up
+            totals[email][1] += down
+
+    if not totals:
+        return 0
+
+    bucket = bucket_start(at or timezone.now())
+    rows = [
+        (server_id, email, ClientTrafficSample.GRANULARITY_5MIN, bucket, up, down)
+        for email, (up, down) in totals.items()
+    ]
+    batch_size = getattr(settings, 'V2RAY_SYNC_BATCH_SIZE', 500)
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            sql = UPSERT_SQL.format(values=', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(batch)))
+            cursor.execute(sql, [value for row in batch for value in row])
+
+    return len(rows)
+
+
+def rollup_traffic(now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Roll old samples up to coarser buckets and drop expired daily samples.
+
+    5-minute samples older than V2RAY_TRAFFIC_HOURLY_AFTER hours become
+    hourly, and hourly samples older than V2RAY_TRAFFIC_DAILY_AFTER days
+    become daily. Cutoffs are aligned to whole hours/days so no target
+    bucket is split. Running it again is harmless.
+
+    Returns:
+        Rows written at each level and daily rows deleted
+    """
+    now = now or timezone.now()
+    hourly_cutoff = (now - timedelta(hours=getattr(settings, 'V2RAY_TRAFFIC_HOURLY_AFTER', 6))).replace(
+        minute=0, second=0, microsecond=0
+    )
+    daily_cutoff = (now - timedelta(days=getattr(settings, 'V2RAY_TRAFFIC_DAILY_AFTER', 7))).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    retention_cutoff = now - timedelta(days=getattr(settings, 'V2RAY_TRAFFIC_RETENTION_DAYS', 365))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(ROLLUP_SQL, [
+            ClientTrafficSample.GRANULARITY_5MIN, hourly_cutoff,
+            ClientTrafficSample.GRANULARITY_HOUR, 'hour', 'hour'
+        ])
+        hourly = cursor.rowcount
+
+        cursor.execute(ROLLUP_SQL, [
+            ClientTrafficSample.GRANULARITY_HOUR, daily_cutoff,
+            ClientTrafficSample.GRANULARITY_DAY, 'day', 'day'
+        ])
+        daily = cursor.rowcount
+
+    deleted, _ = ClientTrafficSample.objects.filter(
+        granularity=ClientTrafficSample.GRANULARITY_DAY,
+        bucket__lt=retention_cutoff
+    ).delete()
+
+    return {'hourly': hourly, 'daily': daily, 'deleted': deleted}
+
+
+def _samples(emails: Union[str, Iterable[str]], since: datetime):
+    if isinstance(emails, str):
+        emails = [emails]
+    return ClientTrafficSample.objects.filter(email__in=list(emails), bucket__gte=since)
+
+
+def _since(hours: int = 0, days: int = 0) -> datetime:
+    return timezone.now() - timedelta(hours=hours, days=days)
+
+
+def get_usage(emails: Union[str, Iterable[str]], hours: int = 0, days: int = 0) -> Dict[str, int]:
+    """
+    Get traffic used by one or more clients over the last N hours/days.
+
+    Precision is that of the coarsest samples in the period: a bucket counts
+    only if it starts inside the period.
+
+    Returns:
+        Dictionary with up, down and total bytes
+    """
+    totals = _samples(emails, _since(hours, days)).aggregate(up=Sum('up'), down=Sum('down'))
+    up = totals['up'] or 0
+    down = totals['down'] or 0
+    return {'up': up, 'down': down, 'total': up + down}
+
+
+def get_usage_series(emails: Union[str, Iterable[str]], days: int = 7, period: str = 'day') -> List[Dict]:
+    """
+    Get usage per hour or per day over the last N days.
+
+    Args:
+        emails: Client email or emails
+        days: Number of days to cover
+        period: 'hour' or 'day'
+
+    Returns:
+        List of {'bucket', 'up', 'down', 'total'} dicts, oldest first
+    """
+    trunc = TruncHour('bucket') if period == 'hour' else TruncDay('bucket')
+    rows = (
+        _samples(emails, _since(days=days))
+        .annotate(period=trunc)
+        .values('period')
+        .annotate(up=Sum('up'), down=Sum('down'))
+        .order_by('period')
+    )
+    return [
+        {'bucket': row['period'], 'up': row['up'], 'down': row['down'], 'total': row['up'] + row['down']}
+        for row in rows
+    ]
+
+
+def get_average_daily_usage_gb(emails: Union[str, Iterable[str]], days: int = 30) -> float:
+    """Get the average daily usage in GB over the last N days"""
+    if days <= 0:
+        return 0.0
+    return get_usage(emails, days=days)['total'] / GB / days
@@ -17,7 +17,7 @@ import logging
 from typing import Dict, Any, List, Optional
 
 from utils.i18n import get_text, get_available_languages
-from utils.database import get_user_language, update_user_language
+from utils.async_database import get_user_language, update_user_language
 
 # Configure logging
 logger = logging.getLogger("telegram_bot")
@@ -32,7 +32,7 @@ async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     user_id = user.id
     
     # Get user's current language preference
-    current_language = get_user_language(user_id)
+    current_language = await get_user_language(user_id)
     
     # Show language selection menu
     await show_language_menu(update, context, current_language)
@@ -49,7 +49,7 @@ async def language_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = user.id
     
     # Show language selection menu
-    await show_language_menu(update, context, get_user_language(user_id))
+    await show_language_menu(update, context, await get_user_language(user_id))
     
     return SELECTING_LANGUAGE
 
@@ -68,7 +68,7 @@ async def select_language_callback(update: Update, context: ContextTypes.DEFAULT
     selected_language = callback_data.split(":")[1]
     
     # Update user's language preference
-    update_user_language(user_id, selected_language)
+    await update_user_language(user_id, selected_language)
     
     # Log language change
     logger.info(f"User {user_id} ({user.username}) changed language to {selected_language}")
@@ -8,8 +8,9 @@ This module implements handlers for server monitoring operations including:
 - Server status updates
 """
 
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -21,10 +22,16 @@ from telegram.ext import (
 from telegram.constants import ParseMode
 
 from utils.i18n import get_text, format_number, format_date
-from utils.database import get_user, get_all_servers, get_server_health
+from utils.database import get_user, get_all_servers
 from utils.xui_api import XUIClient
 from utils.decorators import require_admin
-from utils.api import get_server_stats, get_server_history
+from utils.api import (
+    APIError,
+    fetch_server_status,
+    fetch_server_stats,
+    fetch_server_history,
+    fetch_for_servers,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -96,262 +103,207 @@ async def monitoring_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     return SELECTING_ACTION
 
-@require_admin
-async def server_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Show server status information."""
-    query = update.callback_query
-    await query.answer()
-    
-    language_code = context.user_data.get("language", "en")
-    
-    # Get all servers
-    servers = get_all_servers()
+def _status_text(servers: List[Dict[str, Any]], results: Dict[int, Any], language_code: str) -> str:
+    """Build the server status view."""
+    text = get_text("server_status_header", language_code) + "\n\n"
     
-    if not servers:
-        text = get_text("no_servers", language_code)
-    else:
-        text = get_text("server_status_header", language_code) + "\n\n"
+    for server in servers:
+        health = results.get(server["id"])
         
-        for server in servers:
-            # Get server health
-            health = get_server_health(server["id"])
+        if not health or isinstance(health, Exception):
+            text += get_text("server_status_error", language_code).format(
+                name=server["name"],
+                error=str(health) if health else "No data available"
+            )
+            continue
+        
+        # Get health status emoji
+        status_emoji = {
+            "healthy": "🟢",
+            "warning": "🟡",
+            "critical": "🔴",
+            "offline": "⚫"
+        }.get(health.get("health_status"), "⚫")
+        uptime_days = health.get("uptime_days", (health.get("uptime_seconds") or 0) / 86400)
+        
+        text += get_text("server_status_item", language_code).format(
+            name=server["name"],
+            status=status_emoji,
+            cpu=format_number(health.get("cpu_usage") or 0, language_code),
+            memory=format_number(health.get("memory_usage") or 0, language_code),
+            disk=format_number(health.get("disk_usage") or 0, language_code),
+            connections=health.get("active_connections") or 0,
+            uptime=format_number(uptime_days, language_code)
+        )
+    
+    return text
+
+def _traffic_text(servers: List[Dict[str, Any]], results: Dict[int, Any], language_code: str) -> str:
+    """Build the traffic statistics view."""
+    text = get_text("traffic_stats_header", language_code) + "\n\n"
+    total_up = 0
+    total_down = 0
+    
+    for server in servers:
+        stats = results.get(server["id"])
+        try:
+            if isinstance(stats, Exception):
+                raise stats
             
-            if not health:
-                text += get_text("server_status_error", language_code).format(
+            if not stats:
+                text += get_text("server_traffic_error", language_code).format(
                     name=server["name"],
                     error="No data available"
                 )
                 continue
             
-            # Get health status emoji
-            status_emoji = {
-                "healthy": "🟢",
-                "warning": "🟡",
-                "critical": "🔴",
-                "offline": "⚫"
-            }.get(health["health_status"], "⚫")
+            network = stats["network"]
+            total_up += network["total_usage_gb"]
+            total_down += network["total_usage_gb"]
             
-            text += get_text("server_status_item", language_code).format(
+            text += get_text("server_traffic_item", language_code).format(
                 name=server["name"],
-                status=status_emoji,
-                cpu=format_number(health["cpu_usage"], language_code),
-                memory=format_number(health["memory_usage"], language_code),
-                disk=format_number(health["disk_usage"], language_code),
-                connections=health["active_connections"],
-                uptime=format_number(health["uptime_days"], language_code)
-            )
-    
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                get_text("refresh", language_code),
-                callback_data=REFRESH_STATS
+                up=format_number(network["total_usage_gb"], language_code),
+                down=format_number(network["total_usage_gb"], language_code),
+                speed=format_number(network["current_speed_mbps"][1], language_code)
             )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("back_to_monitoring", language_code),
-                callback_data=BACK_TO_MONITORING
+        except Exception as e:
+            logger.error(f"Error getting traffic stats for server {server['name']}: {e}")
+            text += get_text("server_traffic_error", language_code).format(
+                name=server["name"],
+                error=str(e)
             )
-        ],
-    ]
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(text=text, reply_markup=reply_markup)
+    # Add total traffic stats
+    text += "\n" + get_text("total_traffic_stats", language_code).format(
+        up=format_number(total_up, language_code),
+        down=format_number(total_down, language_code),
+        total=format_number(total_up + total_down, language_code)
+    )
     
-    return SELECTING_ACTION
+    return text
 
-@require_admin
-async def traffic_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Show traffic statistics."""
-    query = update.callback_query
-    await query.answer()
-    
-    language_code = context.user_data.get("language", "en")
-    
-    # Get all servers
-    servers = get_all_servers()
-    
-    if not servers:
-        text = get_text("no_servers", language_code)
-    else:
-        text = get_text("traffic_stats_header", language_code) + "\n\n"
-        total_up = 0
-        total_down = 0
-        
-        for server in servers:
-            try:
-                stats = get_server_stats(server["id"])
-                
-                if not stats:
-                    text += get_text("server_traffic_error", language_code).format(
-                        name=server["name"],
-                        error="No data available"
-                    )
-                    continue
-                
-                network = stats["network"]
-                total_up += network["total_usage_gb"]
-                total_down += network["total_usage_gb"]
-                
-                text += get_text("server_traffic_item", language_code).format(
-                    name=server["name"],
-                    up=format_number(network["total_usage_gb"], language_code),
-                    down=format_number(network["total_usage_gb"], language_code),
-                    speed=format_number(network["current_speed_mbps"][1], language_code)
-                )
-            except Exception as e:
-                logger.error(f"Error getting traffic stats for server {server['name']}: {e}")
-                text += get_text("server_traffic_error", language_code).format(
+def _system_text(servers: List[Dict[str, Any]], results: Dict[int, Any], language_code: str) -> str:
+    """Build the system statistics view."""
+    text = get_text("system_stats_header", language_code) + "\n\n"
+    
+    for server in servers:
+        stats = results.get(server["id"])
+        try:
+            if isinstance(stats, Exception):
+                raise stats
+            
+            if not stats:
+                text += get_text("system_stats_error", language_code).format(
                     name=server["name"],
-                    error=str(e)
+                    error="No data available"
                 )
-        
-        # Add total traffic stats
-        text += "\n" + get_text("total_traffic_stats", language_code).format(
-            up=format_number(total_up, language_code),
-            down=format_number(total_down, language_code),
-            total=format_number(total_up + total_down, language_code)
-        )
-    
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                get_text("refresh", language_code),
-                callback_data=REFRESH_STATS
+                continue
+            
+            text += get_text("system_stats_item", language_code).format(
+                name=server["name"],
+                cpu_avg=format_number(stats["cpu"]["avg"], language_code),
+                cpu_max=format_number(stats["cpu"]["max"], language_code),
+                memory_avg=format_number(stats["memory"]["avg"], language_code),
+                memory_max=format_number(stats["memory"]["max"], language_code),
+                disk_avg=format_number(stats["disk"]["avg"], language_code),
+                disk_max=format_number(stats["disk"]["max"], language_code),
+                connections_avg=format_number(stats["connections"]["avg"], language_code),
+                connections_max=format_number(stats["connections"]["max"], language_code),
+                load_1min=format_number(stats["load"]["1min"], language_code),
+                load_5min=format_number(stats["load"]["5min"], language_code),
+                load_15min=format_number(stats["load"]["15min"], language_code)
             )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("back_to_monitoring", language_code),
-                callback_data=BACK_TO_MONITORING
+        except Exception as e:
+            logger.error(f"Error getting system stats for server {server['name']}: {e}")
+            text += get_text("system_stats_error", language_code).format(
+                name=server["name"],
+                error=str(e)
             )
-        ],
-    ]
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(text=text, reply_markup=reply_markup)
-    
-    return SELECTING_ACTION
+    return text
 
-@require_admin
-async def system_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Show system statistics."""
-    query = update.callback_query
-    await query.answer()
-    
-    language_code = context.user_data.get("language", "en")
-    
-    # Get all servers
-    servers = get_all_servers()
-    
-    if not servers:
-        text = get_text("no_servers", language_code)
-    else:
-        text = get_text("system_stats_header", language_code) + "\n\n"
-        
-        for server in servers:
-            try:
-                stats = get_server_stats(server["id"])
-                
-                if not stats:
-                    text += get_text("system_stats_error", language_code).format(
-                        name=server["name"],
-                        error="No data available"
-                    )
-                    continue
-                
-                text += get_text("system_stats_item", language_code).format(
-                    name=server["name"],
-                    cpu_avg=format_number(stats["cpu"]["avg"], language_code),
-                    cpu_max=format_number(stats["cpu"]["max"], language_code),
-                    memory_avg=format_number(stats["memory"]["avg"], language_code),
-                    memory_max=format_number(stats["memory"]["max"], language_code),
-                    disk_avg=format_number(stats["disk"]["avg"], language_code),
-                    disk_max=format_number(stats["disk"]["max"], language_code),
-                    connections_avg=format_number(stats["connections"]["avg"], language_code),
-                    connections_max=format_number(stats["connections"]["max"], language_code),
-                    load_1min=format_number(stats["load"]["1min"], language_code),
-                    load_5min=format_number(stats["load"]["5min"], language_code),
-                    load_15min=format_number(stats["load"]["15min"], language_code)
-                )
-            except Exception as e:
-                logger.error(f"Error getting system stats for server {server['name']}: {e}")
-                text += get_text("system_stats_error", language_code).format(
+def _network_text(servers: List[Dict[str, Any]], results: Dict[int, Any], language_code: str) -> str:
+    """Build the network statistics view."""
+    text = get_text("network_stats_header", language_code) + "\n\n"
+    
+    for server in servers:
+        stats = results.get(server["id"])
+        try:
+            if isinstance(stats, Exception):
+                raise stats
+            
+            if not stats:
+                text += get_text("network_stats_error", language_code).format(
                     name=server["name"],
-                    error=str(e)
+                    error="No data available"
                 )
-    
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                get_text("refresh", language_code),
-                callback_data=REFRESH_STATS
+                continue
+            
+            network = stats["network"]
+            io = stats["io"]
+            
+            text += get_text("network_stats_item", language_code).format(
+                name=server["name"],
+                usage=format_number(network["total_usage_gb"], language_code),
+                speed_in=format_number(network["current_speed_mbps"][0], language_code),
+                speed_out=format_number(network["current_speed_mbps"][1], language_code),
+                io_read=format_number(io["current_speed_mbps"][0], language_code),
+                io_write=format_number(io["current_speed_mbps"][1], language_code)
             )
-        ],
-        [
-            InlineKeyboardButton(
-                get_text("back_to_monitoring", language_code),
-                callback_data=BACK_TO_MONITORING
+        except Exception as e:
+            logger.error(f"Error getting network stats for server {server['name']}: {e}")
+            text += get_text("network_stats_error", language_code).format(
+                name=server["name"],
+                error=str(e)
             )
-        ],
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(text=text, reply_markup=reply_markup)
     
-    return SELECTING_ACTION
+    return text
 
-@require_admin
-async def network_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Show network statistics."""
+# View name -> (per-server fetch, text builder)
+STATS_VIEWS = {
+    "status": (fetch_server_status, _status_text),
+    "traffic": (fetch_server_stats, _traffic_text),
+    "system": (fetch_server_stats, _system_text),
+    "network": (fetch_server_stats, _network_text),
+}
+
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE, view: str, refresh: bool = False) -> int:
+    """
+    Show a statistics view for all servers.
+    
+    Stats for every server are fetched concurrently and served from the
+    shared cache unless refresh is set.
+    
+    Args:
+        update: The update
+        context: The callback context
+        view: View name (status, traffic, system or network)
+        refresh: Bypass the stats cache
+        
+    Returns:
+        Next conversation state
+    """
     query = update.callback_query
     await query.answer()
     
     language_code = context.user_data.get("language", "en")
     
-    # Get all servers
-    servers = get_all_servers()
+    # Get all servers without blocking the event loop
+    servers = await asyncio.to_thread(get_all_servers)
     
     if not servers:
         text = get_text("no_servers", language_code)
     else:
-        text = get_text("network_stats_header", language_code) + "\n\n"
-        
-        for server in servers:
-            try:
-                stats = get_server_stats(server["id"])
-                
-                if not stats:
-                    text += get_text("network_stats_error", language_code).format(
-                        name=server["name"],
-                        error="No data available"
-                    )
-                    continue
-                
-                network = stats["network"]
-                io = stats["io"]
-                
-                text += get_text("network_stats_item", language_code).format(
-                    name=server["name"],
-                    usage=format_number(network["total_usage_gb"], language_code),
-                    speed_in=format_number(network["current_speed_mbps"][0], language_code),
-                    speed_out=format_number(network["current_speed_mbps"][1], language_code),
-                    io_read=format_number(io["current_speed_mbps"][0], language_code),
-                    io_write=format_number(io["current_speed_mbps"][1], language_code)
-                )
-            except Exception as e:
-                logger.error(f"Error getting network stats for server {server['name']}: {e}")
-                text += get_text("network_stats_error", language_code).format(
-                    name=server["name"],
-                    error=str(e)
-                )
+        fetch, build_text = STATS_VIEWS[view]
+        results = await fetch_for_servers([server["id"] for server in servers], fetch, refresh=refresh)
+        text = build_text(servers, results, language_code)
     
     keyboard = [
         [
             InlineKeyboardButton(
                 get_text("refresh", language_code),
-                callback_data=REFRESH_STATS
+                callback_data=f"{REFRESH_STATS}_{view}"
             )
         ],
         [
@@ -367,6 +319,26 @@ async def network_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     
     return SELECTING_ACTION
 
+@require_admin
+async def server_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show server status information."""
+    return await show_stats(update, context, "status")
+
+@require_admin
+async def traffic_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show traffic statistics."""
+    return await show_stats(update, context, "traffic")
+
+@require_admin
+async def system_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show system statistics."""
+    return await show_stats(update, context, "system")
+
+@require_admin
+async def network_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show network statistics."""
+    return await show_stats(update, context, "network")
+
 @require_admin
 async def history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Show server selection for history."""
@@ -376,7 +348,7 @@ async def history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     language_code = context.user_data.get("language", "en")
     
     # Get all servers
-    servers = get_all_servers()
+    servers = await asyncio.to_thread(get_all_servers)
     
     if not servers:
         text = get_text("no_servers", language_code)
@@ -422,7 +394,11 @@ async def show_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     server_id = int(query.data.split("_")[1])
     
     # Get server history
-    history = get_server_history(server_id)
+    try:
+        history = await fetch_server_history(server_id)
+    except APIError as e:
+        logger.error(f"Error getting history for server {server_id}: {e}")
+        history = None
     
     if not history:
         text = get_text("no_history_data", language_code)
@@ -462,24 +438,13 @@ async def show_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
 @require_admin
 async def refresh_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Refresh monitoring statistics."""
-    query = update.callback_query
-    await query.answer()
+    """Refresh monitoring statistics, bypassing the stats cache."""
+    # Callback data is monitoring_refresh_<view>
+    current_view = update.callback_query.data[len(REFRESH_STATS) + 1:]
     
-    # Get the current view from the callback data
-    current_view = query.data.split("_")[0]
-    
-    # Call the appropriate handler
-    if current_view == "status":
-        return await server_status(update, context)
-    elif current_view == "traffic":
-        return await traffic_stats(update, context)
-    elif current_view == "system":
-        return await system_stats(update, context)
-    elif current_view == "network":
-        return await network_stats(update, context)
-    else:
-        return await monitoring_menu(update, context)
+    if current_view in STATS_VIEWS:
+        return await show_stats(update, context, current_view, refresh=True)
+    return await monitoring_menu(update, context)
 
 def get_monitoring_handler() -> ConversationHandler:
     """Get the monitoring conversation handler."""
@@ -12,7 +12,7 @@ import logging
 from typing import Dict, Any, List, Optional
 
 from utils.i18n import get_text
-from utils.database import get_user_language
+from utils.async_database import get_user_language
 
 # Import handlers
 from handlers import start
@@ -35,7 +35,7 @@ async def handle_navigation(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user_id = user.id
     
     # Get user's language preference
-    language_code = get_user_language(user_id)
+    language_code = await get_user_language(user_id)
     
     # Get the target section from callback data
     # Expected format: "back:SECTION"
@@ -96,8 +96,8 @@ async def navigate_to_start(update: Update, context: ContextTypes.DEFAULT_TYPE,
     ]
     
     # Add admin button if user is admin
-    from utils.database import get_user
-    user_data = get_user(user.id)
+    from utils.async_database import get_user
+    user_data = await get_user(user.id)
     if user_data and user_data.get("is_admin", False):
         keyboard.append([
             InlineKeyboardButton(
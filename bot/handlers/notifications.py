@@ -56,6 +56,7 @@ from bot.constants import (
     BACK_CB,
 )
 from bot.handlers.start import start, back_to_main
+from utils.metrics import count_notification
 
 logger = logging.getLogger(__name__)
 
@@ -241,6 +242,7 @@ async def send_notification(
         
         if not settings.get(notification_type, True):
             logger.info(f"User {user_id} has {notification_type} notifications disabled")
+            count_notification(notification_type, "disabled")
             return False
         
         # Create reply markup if keyboard is provided
@@ -256,12 +258,15 @@ async def send_notification(
             parse_mode=ParseMode.MARKDOWN
         )
         
+        count_notification(notification_type, "sent")
         return True
     except TelegramError as e:
         logger.error(f"Telegram error sending notification to {user_id}: {e}")
+        count_notification(notification_type, "failed")
         return False
     except Exception as e:
         logger.error(f"Error sending notification to {user_id}: {e}")
+        count_notification(notification_type, "failed")
         return False
 
 async def send_admin_notification(
@@ -12,7 +12,7 @@ import logging
 from typing import Dict, Any, List, Optional
 
 from utils.i18n import get_text
-from utils.database import get_user_language, get_user, create_user_if_not_exists
+from utils.async_database import get_user_language, get_user, create_user_if_not_exists
 
 # Configure logging
 logger = logging.getLogger("telegram_bot")
@@ -24,7 +24,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     user_id = user.id
     
     # Create user if not exists
-    create_user_if_not_exists(
+    await create_user_if_not_exists(
         user_id=user_id,
         username=user.username,
         first_name=user.first_name,
@@ -33,7 +33,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     )
     
     # Get user's language preference
-    language_code = get_user_language(user_id)
+    language_code = await get_user_language(user_id)
     
     # Log the start command
     logger.info(f"User {user_id} ({user.username}) started the bot")
@@ -80,7 +80,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     ]
     
     # Add admin button if user is admin
-    user_data = get_user(user_id)
+    user_data = await get_user(user_id)
     if user_data and user_data.get("is_admin", False):
         keyboard.append([
             InlineKeyboardButton(
@@ -105,7 +105,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     user_id = user.id
     
     # Get user's language preference
-    language_code = get_user_language(user_id)
+    language_code = await get_user_language(user_id)
     
     # Create help message
     help_message = get_text("help", language_code)
@@ -150,7 +150,7 @@ async def unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = user.id
     
     # Get user's language preference
-    language_code = get_user_language(user_id)
+    language_code = await get_user_language(user_id)
     
     # Send unknown command message
     await update.message.reply_text(
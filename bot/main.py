@@ -52,8 +52,10 @@ from handlers import (
 
 # Import utilities
 from utils.i18n import setup_i18n, get_text
-from utils.database import setup_database
+from utils.database import setup_database, start_settings_cache
 from utils.config import load_config
+from utils.metrics import instrument_application, start_metrics_server
+from utils.user_context import install_user_middleware
 
 def main() -> None:
     """Start the bot."""
@@ -63,6 +65,9 @@ def main() -> None:
     # Set up database
     setup_database()
     
+    # Keep settings in memory, invalidated by database notifications
+    start_settings_cache()
+    
     # Set up internationalization
     setup_i18n()
     
@@ -73,7 +78,10 @@ def main() -> None:
         sys.exit(1)
     
     # Create the Application
-    application = Application.builder().token(token).build()
+    application = Application.builder().token(token).post_shutdown(shutdown).build()
+    
+    # Load the sender's user row once per update, before the handlers run
+    install_user_middleware(application)
     
     # Add handlers
     
@@ -117,11 +125,41 @@ def main() -> None:
     # Error handler
     application.add_error_handler(error_handler)
     
+    # Metrics: time every handler registered above and count updates
+    metrics_config = config["metrics"]
+    if metrics_config["enabled"]:
+        instrument_application(application)
+        start_metrics_server(metrics_config["port"])
+    
+    # Periodic traffic refresh for all panels
+    if application.job_queue:
+        interval = int(os.getenv("TRAFFIC_REFRESH_INTERVAL", "300"))
+        application.job_queue.run_repeating(traffic_refresh_job, interval=interval, first=interval)
+    else:
+        logger.warning("Job queue not available, periodic traffic refresh disabled")
+    
     # Start the Bot
     # Always use polling for now
     application.run_polling()
 
 
+async def traffic_refresh_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Refresh account traffic usage from all 3X-UI panels."""
+    from services.threexui_api import refresh_all_panels_traffic
+    results = await refresh_all_panels_traffic()
+    logger.info(f"Traffic refresh updated {sum(results.values())} accounts across {len(results)} panels")
+
+
+async def shutdown(application: Application) -> None:
+    """Release long-lived resources when the bot stops."""
+    from services.threexui_api import close_all_panels
+    from utils.api import close_async_client
+    from utils.async_database import close_database
+    await close_all_panels()
+    await close_async_client()
+    await close_database()
+
+
 async def error_handler(update: Optional[Update], context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle errors in the telegram bot."""
     logger.error(f"Exception while handling an update: {context.error}")
@@ -133,8 +171,8 @@ async def error_handler(update: Optional[Update], context: ContextTypes.DEFAULT_
         
         # Try to get user's language preference
         try:
-            from utils.database import get_user_language
-            language_code = get_user_language(user_id) or language_code
+            from utils.async_database import get_user_language
+            language_code = await get_user_language(user_id) or language_code
         except Exception as e:
             logger.error(f"Error getting user language: {e}")
         
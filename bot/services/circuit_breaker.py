@@ -0,0 +1,193 @@
+"""
+Circuit breaker for 3X-UI panels.
+
+This module keeps a closed / open / half-open state per panel in Redis so the
+bot and the Django/Celery processes see the same panel health. The key layout
+is shared with backend/v2ray/circuit_breaker.py:
+
+    threexui:circuit:<panel url>:failures  consecutive failures (with TTL)
+    threexui:circuit:<panel url>:open      present while the circuit is open
+    threexui:circuit:<panel url>:probe     held by the single half-open probe
+"""
+
+import os
+import logging
+from typing import Dict, Any, Optional
+
+import httpx
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+# Configure logging
+logger = logging.getLogger("telegram_bot")
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+# Circuit states
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+_redis: Optional[aioredis.Redis] = None
+
+
+def get_redis() -> aioredis.Redis:
+    """Get the shared async Redis client."""
+    global _redis
+    if _redis is None:
+        _redis = aioredis.Redis.from_url(
+            REDIS_URL,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5
+        )
+    return _redis
+
+
+def circuit_key(base_url: str) -> str:
+    """
+    Build the Redis key prefix for a panel.
+
+    Args:
+        base_url: Base URL of the panel
+
+    Returns:
+        Key prefix shared by the bot and the backend
+    """
+    return f"threexui:circuit:{base_url.rstrip('/').lower()}"
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of sending a request while a panel's circuit is open."""
+
+
+class CircuitBreaker:
+    """Redis-backed circuit breaker for a single panel."""
+
+    def __init__(self, base_url: str, failure_threshold: int = 5, recovery_timeout: int = 30):
+        """
+        Initialize the circuit breaker.
+
+        Args:
+            base_url: Base URL of the panel
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_timeout: Seconds the circuit stays open before a probe is allowed
+        """
+        self.base_url = base_url
+        self.key = circuit_key(base_url)
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+    async def allow_request(self) -> bool:
+        """
+        Check whether a request to the panel may be sent.
+
+        While the circuit is half-open only one caller across all processes
+        gets through as a probe. If Redis is unreachable requests are allowed.
+
+        Returns:
+            True if the request may proceed, False to fail fast
+        """
+        try:
+            redis_client = get_redis()
+            is_open, failures = await redis_client.mget(f"{self.key}:open", f"{self.key}:failures")
+
+            if is_open:
+                return False
+
+            if failures and int(failures) >= self.failure_threshold:
+                # Half-open: let a single probe through
+                return bool(await redis_client.set(
+                    f"{self.key}:probe", 1, nx=True, ex=self.recovery_timeout
+                ))
+
+            return True
+        except RedisError as e:
+            logger.warning(f"Circuit breaker unavailable for {self.base_url}: {e}")
+            return True
+
+    async def record_success(self) -> None:
+        """Close the circuit after a successful request."""
+        try:
+            await get_redis().delete(f"{self.key}:failures", f"{self.key}:probe")
+        except RedisError as e:
+            logger.warning(f"Circuit breaker unavailable for {self.base_url}: {e}")
+
+    async def record_failure(self) -> None:
+        """Count a failed request and open the circuit past the threshold."""
+        try:
+            redis_client = get_redis()
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.incr(f"{self.key}:failures")
+                # Keep the counter long enough to survive the open period
+                pipe.expire(f"{self.key}:failures", self.recovery_timeout * 10)
+                failures, _ = await pipe.execute()
+
+            if failures >= self.failure_threshold:
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    pipe.set(f"{self.key}:open", 1, ex=self.recovery_timeout)
+                    pipe.delete(f"{self.key}:probe")
+                    await pipe.execute()
+                logger.warning(f"Circuit opened for panel {self.base_url} after {failures} failures")
+        except RedisError as e:
+            logger.warning(f"Circuit breaker unavailable for {self.base_url}: {e}")
+
+    async def get_state(self) -> Dict[str, Any]:
+        """
+        Get the current circuit state.
+
+        Returns:
+            Dictionary with state, failures and retry_in (seconds until a probe)
+        """
+        try:
+            redis_client = get_redis()
+            failures = int(await redis_client.get(f"{self.key}:failures") or 0)
+            retry_in = await redis_client.ttl(f"{self.key}:open")
+        except RedisError as e:
+            logger.warning(f"Circuit breaker unavailable for {self.base_url}: {e}")
+            return {'state': STATE_CLOSED, 'failures': 0, 'retry_in': 0}
+
+        if retry_in > 0:
+            state = STATE_OPEN
+        elif failures >= self.failure_threshold:
+            state = STATE_HALF_OPEN
+        else:
+            state = STATE_CLOSED
+
+        return {'state': state, 'failures': failures, 'retry_in': max(retry_in, 0)}
+
+
+class CircuitBreakerTransport(httpx.AsyncBaseTransport):
+    """httpx transport that routes every request through a circuit breaker."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker):
+        """
+        Initialize the transport.
+
+        Args:
+            transport: Transport that actually sends the requests
+            breaker: Circuit breaker of the target panel
+        """
+        self.transport = transport
+        self.breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        """Send a request unless the circuit is open, and record the outcome."""
+        if not await self.breaker.allow_request():
+            raise CircuitOpenError(f"Panel {self.breaker.base_url} is marked down", request=request)
+
+        try:
+            response = await self.transport.handle_async_request(request)
+        except httpx.TransportError:
+            await self.breaker.record_failure()
+            raise
+
+        if response.status_code >= 500:
+            await self.breaker.record_failure()
+        else:
+            await self.breaker.record_success()
+
+        return response
+
+    async def aclose(self) -> None:
+        """Close the underlying transport."""
+        await self.transport.aclose()
@@ -12,10 +12,18 @@ import logging
 import httpx
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional, Tuple, Union
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple, Union
 
 from utils.config import get_threexui_config
-from utils.database import get_setting, update_setting
+from utils.json_stream import JSONArrayStream
+from utils.metrics import InstrumentedTransport
+from services.circuit_breaker import CircuitBreaker, CircuitBreakerTransport, CircuitOpenError
+from utils.database import (
+    get_setting,
+    update_setting,
+    get_server_accounts,
+    bulk_update_account_traffic,
+)
 
 # Configure logging
 logger = logging.getLogger("telegram_bot")
@@ -38,13 +46,38 @@ class ThreeXUIClient:
         self.base_url = base_url.rstrip('/')
         self.username = username
         self.password = password
+        threexui_config = get_threexui_config()
+        self.breaker = CircuitBreaker(
+            self.base_url,
+            failure_threshold=threexui_config["circuit_failure_threshold"],
+            recovery_timeout=threexui_config["circuit_recovery_timeout"]
+        )
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=threexui_config["max_connections"],
+                max_keepalive_connections=threexui_config["max_connections"],
+                keepalive_expiry=threexui_config["keepalive_expiry"]
+            ),
+            verify=False  # Disable SSL verification (not recommended for production)
+        )
         self.session = httpx.AsyncClient(
             base_url=self.base_url,
-            timeout=get_threexui_config()["api_timeout"],
-            verify=False  # Disable SSL verification (not recommended for production)
+            timeout=httpx.Timeout(
+                threexui_config["api_timeout"],
+                connect=threexui_config["connect_timeout"]
+            ),
+            transport=InstrumentedTransport(CircuitBreakerTransport(transport, self.breaker), self.base_url)
         )
         self.cookie = None
         self.cookie_expiry = datetime.now()
+        self._login_lock = asyncio.Lock()
+        # Snapshot of the inbound list with an email -> (inbound_id, client stats) index
+        self.snapshot_ttl = threexui_config["inbound_cache_ttl"]
+        self._inbounds: List[Dict[str, Any]] = []
+        self._inbounds_by_id: Dict[int, Dict[str, Any]] = {}
+        self._client_index: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._snapshot_at: Optional[float] = None
+        self._snapshot_lock = asyncio.Lock()
 
     async def login(self) -> bool:
         """
@@ -55,9 +88,16 @@ class ThreeXUIClient:
         """
         # Check if cookie exists and is still valid
         if self.cookie and datetime.now() < self.cookie_expiry:
-            self.session.headers.update({'Cookie': self.cookie})
             return True
         
+        # Serialize logins so concurrent callers share a single new session
+        async with self._login_lock:
+            if self.cookie and datetime.now() < self.cookie_expiry:
+                return True
+            return await self._login()
+
+    async def _login(self) -> bool:
+        """Load the session cookie from the database or log in for a new one."""
         # Check if cookie exists in the database
         cookie_key = f"threexui_cookie_{self.panel_id}"
         cookie_data = get_setting(cookie_key)
@@ -104,33 +144,165 @@ class ThreeXUIClient:
             
             logger.error(f"Login failed: {response.text}")
             return False
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping login: {e}")
+            return False
         except Exception as e:
             logger.error(f"Error logging in to 3X-UI panel: {e}")
             return False
 
-    async def get_inbounds(self) -> List[Dict[str, Any]]:
+    def _snapshot_is_fresh(self) -> bool:
+        """Check whether the inbound snapshot is younger than its TTL."""
+        return (
+            self._snapshot_at is not None
+            and time.monotonic() - self._snapshot_at < self.snapshot_ttl
+        )
+
+    def _set_snapshot(self, inbounds: List[Dict[str, Any]]) -> None:
+        """
+        Replace the inbound snapshot and rebuild the client index.
+        
+        Args:
+            inbounds: Inbound list as returned by the panel
+        """
+        inbounds_by_id = {}
+        client_index = {}
+        
+        for inbound in inbounds:
+            inbound_id = inbound.get('id')
+            inbounds_by_id[inbound_id] = inbound
+            for client in inbound.get('clientStats') or []:
+                email = client.get('email')
+                if email:
+                    client_index[email] = (inbound_id, client)
+        
+        self._inbounds = inbounds
+        self._inbounds_by_id = inbounds_by_id
+        self._client_index = client_index
+        self._snapshot_at = time.monotonic()
+
+    def _patch_snapshot(self, inbound: Dict[str, Any]) -> None:
+        """
+        Replace one inbound in the snapshot and reindex its clients.
+        
+        The snapshot's age is left alone, so the rest of the list is still
+        refreshed on schedule.
+        
+        Args:
+            inbound: Inbound as returned by the panel, with its clientStats
+        """
+        inbound_id = inbound.get('id')
+        previous = self._inbounds_by_id.get(inbound_id)
+        if previous is not None:
+            for client in previous.get('clientStats') or []:
+                email = client.get('email')
+                if email and self._client_index.get(email, (None,))[0] == inbound_id:
+                    del self._client_index[email]
+        
+        # Callers may hold the current list, so build a new one
+        self._inbounds = [item for item in self._inbounds if item.get('id') != inbound_id] + [inbound]
+        self._inbounds_by_id[inbound_id] = inbound
+        for client in inbound.get('clientStats') or []:
+            email = client.get('email')
+            if email:
+                self._client_index[email] = (inbound_id, client)
+
+    def invalidate_snapshot(self) -> None:
+        """Mark the inbound snapshot as stale so the next read refetches it."""
+        self._snapshot_at = None
+
+    async def iter_inbounds(self, stream: Optional[JSONArrayStream] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the inbound list from the panel one inbound at a time.
+        
+        Only the inbound being parsed is held in memory instead of the whole
+        response. Errors are logged and end the iteration.
+        
+        Args:
+            stream: Parser to use; pass one to check afterwards whether the
+                full list was received (`stream.found and stream.done`)
+        
+        Yields:
+            Inbound configurations
+        """
+        stream = stream or JSONArrayStream()
+        if not await self.login():
+            return
+        
+        try:
+            async with self.session.stream('GET', '/panel/api/inbounds/list') as response:
+                if response.status_code != 200:
+                    logger.error(f"Failed to get inbounds: HTTP {response.status_code}")
+                    return
+                
+                async for chunk in response.aiter_text():
+                    for inbound in stream.feed(chunk):
+                        yield inbound
+                
+                if not stream.found:
+                    logger.error("Failed to get inbounds: no inbound list in response")
+                elif not stream.done:
+                    logger.error("Failed to get inbounds: response ended early")
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping inbound list: {e}")
+        except Exception as e:
+            logger.error(f"Error getting inbounds: {e}")
+
+    async def _fetch_inbounds(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Fetch the inbound list from the panel.
+        
+        Returns:
+            List of inbound configurations or None if the request failed
+        """
+        stream = JSONArrayStream()
+        inbounds = [inbound async for inbound in self.iter_inbounds(stream)]
+        if not (stream.found and stream.done):
+            return None
+        return inbounds
+
+    async def get_inbounds(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
         """
         Get all inbounds from the 3X-UI panel.
         
+        The list is served from the in-memory snapshot while it is younger than
+        `inbound_cache_ttl` seconds. The returned list is shared and must not be
+        modified by callers.
+        
+        Args:
+            force_refresh: Fetch from the panel even if the snapshot is fresh
+        
         Returns:
             List of inbound configurations
         """
-        if not await self.login():
-            return []
+        if not force_refresh and self._snapshot_is_fresh():
+            return self._inbounds
         
-        try:
-            response = await self.session.get('/panel/api/inbounds/list')
+        async with self._snapshot_lock:
+            # Another caller may have refreshed the snapshot while we waited
+            if not force_refresh and self._snapshot_is_fresh():
+                return self._inbounds
             
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success', False):
-                    return data.get('obj', [])
+            inbounds = await self._fetch_inbounds()
+            if inbounds is None:
+                return []
             
-            logger.error(f"Failed to get inbounds: {response.text}")
-            return []
-        except Exception as e:
-            logger.error(f"Error getting inbounds: {e}")
-            return []
+            self._set_snapshot(inbounds)
+            return inbounds
+
+    async def find_client(self, email: str, force_refresh: bool = False) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        Look up a client by email in the inbound snapshot.
+        
+        Args:
+            email: Client email
+            force_refresh: Refresh the snapshot before the lookup
+            
+        Returns:
+            Tuple of (inbound ID, client stats) or None if not found
+        """
+        await self.get_inbounds(force_refresh=force_refresh)
+        return self._client_index.get(email)
 
     async def get_inbound(self, inbound_id: int) -> Optional[Dict[str, Any]]:
         """
@@ -159,6 +331,29 @@ class ThreeXUIClient:
             logger.error(f"Error getting inbound {inbound_id}: {e}")
             return None
 
+    async def get_cached_inbound(self, inbound_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Get a specific inbound from the snapshot, falling back to the panel.
+        
+        Only that inbound is fetched when the snapshot is stale or lacks it,
+        and it is patched into the snapshot.
+        
+        Args:
+            inbound_id: Inbound ID
+            
+        Returns:
+            Inbound configuration or None if not found
+        """
+        if self._snapshot_is_fresh():
+            inbound = self._inbounds_by_id.get(inbound_id)
+            if inbound:
+                return inbound
+        
+        inbound = await self.get_inbound(inbound_id)
+        if inbound:
+            self._patch_snapshot(inbound)
+        return inbound
+
     async def add_client(self, inbound_id: int, email: str, uuid: Optional[str] = None,
                          flow: Optional[str] = "", alter_id: int = 0, subid: str = "") -> Optional[Dict[str, Any]]:
         """
@@ -180,7 +375,7 @@ class ThreeXUIClient:
         
         try:
             # Get inbound to determine protocol
-            inbound = await self.get_inbound(inbound_id)
+            inbound = await self.get_cached_inbound(inbound_id)
             if not inbound:
                 logger.error(f"Inbound {inbound_id} not found")
                 return None
@@ -222,13 +417,13 @@ class ThreeXUIClient:
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success', False):
-                    # Get updated inbound to retrieve the added client
+                    # Refresh just this inbound to retrieve the added client
                     updated_inbound = await self.get_inbound(inbound_id)
                     if updated_inbound:
-                        clients = updated_inbound.get('clientStats', [])
-                        for client in clients:
-                            if client.get('email') == email:
-                                return client
+                        self._patch_snapshot(updated_inbound)
+                        entry = self._client_index.get(email)
+                        if entry and entry[0] == inbound_id:
+                            return entry[1]
             
             logger.error(f"Failed to add client to inbound {inbound_id}: {response.text}")
             return None
@@ -255,20 +450,12 @@ class ThreeXUIClient:
             return False
         
         try:
-            # Get inbound to find client
-            inbound = await self.get_inbound(inbound_id)
-            if not inbound:
-                logger.error(f"Inbound {inbound_id} not found")
-                return False
-            
-            # Find client
-            client_found = False
-            for client in inbound.get('clientStats', []):
-                if client.get('email') == email:
-                    client_found = True
-                    break
+            # Find client, refreshing once in case the snapshot predates it
+            entry = await self.find_client(email)
+            if not entry or entry[0] != inbound_id:
+                entry = await self.find_client(email, force_refresh=True)
             
-            if not client_found:
+            if not entry or entry[0] != inbound_id:
                 logger.error(f"Client {email} not found in inbound {inbound_id}")
                 return False
             
@@ -289,6 +476,11 @@ class ThreeXUIClient:
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success', False):
+                    # Apply the change to the snapshot
+                    client = entry[1]
+                    client['enable'] = enable
+                    client['expiryTime'] = expiry_time
+                    client['total'] = update_data['totalGB']
                     return True
             
             logger.error(f"Failed to update client {email} in inbound {inbound_id}: {response.text}")
@@ -319,6 +511,13 @@ class ThreeXUIClient:
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success', False):
+                    # Drop the client from the snapshot
+                    entry = self._client_index.pop(email, None)
+                    inbound = self._inbounds_by_id.get(inbound_id)
+                    if entry and inbound and inbound.get('clientStats'):
+                        inbound['clientStats'] = [
+                            client for client in inbound['clientStats'] if client.get('email') != email
+                        ]
                     return True
             
             logger.error(f"Failed to remove client {email} from inbound {inbound_id}: {response.text}")
@@ -337,25 +536,18 @@ class ThreeXUIClient:
         Returns:
             Client traffic statistics or None if not found
         """
-        if not await self.login():
-            return None
-        
         try:
-            # Get all inbounds
-            inbounds = await self.get_inbounds()
-            
-            # Search for client in all inbounds
-            for inbound in inbounds:
-                for client in inbound.get('clientStats', []):
-                    if client.get('email') == email:
-                        return {
-                            'up': client.get('up', 0),
-                            'down': client.get('down', 0),
-                            'total': client.get('total', 0),
-                            'expiry_time': client.get('expiryTime', 0),
-                            'enable': client.get('enable', False),
-                            'inbound_id': inbound.get('id')
-                        }
+            entry = await self.find_client(email)
+            if entry:
+                inbound_id, client = entry
+                return {
+                    'up': client.get('up', 0),
+                    'down': client.get('down', 0),
+                    'total': client.get('total', 0),
+                    'expiry_time': client.get('expiryTime', 0),
+                    'enable': client.get('enable', False),
+                    'inbound_id': inbound_id
+                }
             
             logger.warning(f"Client {email} not found in any inbound")
             return None
@@ -385,6 +577,11 @@ class ThreeXUIClient:
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success', False):
+                    # Zero the counters in the snapshot
+                    entry = self._client_index.get(email)
+                    if entry:
+                        entry[1]['up'] = 0
+                        entry[1]['down'] = 0
                     return True
             
             logger.error(f"Failed to reset traffic for client {email} in inbound {inbound_id}: {response.text}")
@@ -418,12 +615,52 @@ class ThreeXUIClient:
         await self.session.aclose()
 
 
+# Panel client registry
+#
+# Clients are kept alive for the lifetime of the process so that the HTTP
+# connection pool and the session cookie are reused between calls. Each entry
+# remembers the panel configuration it was built from and is rebuilt only when
+# that configuration changes.
+
+_panel_clients: Dict[int, ThreeXUIClient] = {}
+_panel_fingerprints: Dict[int, Tuple[str, str, str]] = {}
+_panel_lock = asyncio.Lock()
+
+
+async def _evict_panel(panel_id: int) -> None:
+    """
+    Drop a cached panel client and close its HTTP session.
+    
+    Args:
+        panel_id: Panel ID
+    """
+    client = _panel_clients.pop(panel_id, None)
+    _panel_fingerprints.pop(panel_id, None)
+    
+    if client:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.error(f"Error closing client for panel {panel_id}: {e}")
+
+
+async def close_all_panels() -> None:
+    """Close every cached panel client. Call this on bot shutdown."""
+    async with _panel_lock:
+        for panel_id in list(_panel_clients.keys()):
+            await _evict_panel(panel_id)
+
+
 # Panel management functions
 
 async def get_panel(panel_id: int) -> Optional[ThreeXUIClient]:
     """
     Get a 3X-UI panel client by ID.
     
+    The returned client is shared by all callers and must not be closed by
+    them. It is created on first use and rebuilt when the panel's URL or
+    credentials change.
+    
     Args:
         panel_id: Panel ID
         
@@ -439,6 +676,7 @@ async def get_panel(panel_id: int) -> Optional[ThreeXUIClient]:
         
         if not panel_data:
             logger.error(f"Panel {panel_id} not found in database")
+            await _evict_panel(panel_id)
             return None
         
         try:
@@ -455,10 +693,19 @@ async def get_panel(panel_id: int) -> Optional[ThreeXUIClient]:
             logger.error(f"Missing required panel information for panel {panel_id}")
             return None
         
-        # Create client instance
-        client = ThreeXUIClient(panel_id, base_url, username, password)
+        fingerprint = (base_url, username, password)
         
-        # Test connection
+        async with _panel_lock:
+            client = _panel_clients.get(panel_id)
+            
+            if client is None or _panel_fingerprints.get(panel_id) != fingerprint:
+                # Panel is new or its configuration changed, rebuild the client
+                await _evict_panel(panel_id)
+                client = ThreeXUIClient(panel_id, base_url, username, password)
+                _panel_clients[panel_id] = client
+                _panel_fingerprints[panel_id] = fingerprint
+        
+        # Test connection (served from the in-memory cookie when still valid)
         if not await client.login():
             logger.error(f"Could not connect to panel {panel_id}")
             return None
@@ -608,6 +855,10 @@ async def remove_panel(panel_id: int) -> bool:
         cookie_key = f"threexui_cookie_{panel_id}"
         update_setting(cookie_key, "")
         
+        # Drop the cached client
+        async with _panel_lock:
+            await _evict_panel(panel_id)
+        
         # Update panel IDs
         panel_ids.remove(panel_id)
         update_setting("threexui_panel_ids", json.dumps(panel_ids))
@@ -650,7 +901,6 @@ async def create_v2ray_account(panel_id: int, inbound_id: int, email: str, expir
         client = await panel.add_client(inbound_id, email, uuid)
         if not client:
             logger.error(f"Failed to add client {email}")
-            await panel.close()
             return None
         
         # Update client settings
@@ -658,22 +908,18 @@ async def create_v2ray_account(panel_id: int, inbound_id: int, email: str, expir
             logger.error(f"Failed to update client {email} settings")
             # Try to remove the client since update failed
             await panel.remove_client(inbound_id, email)
-            await panel.close()
             return None
         
         # Get subscription URL
         subscription_url = await panel.get_client_subscription_url(email)
         
         # Get inbound details for config
-        inbound = await panel.get_inbound(inbound_id)
+        inbound = await panel.get_cached_inbound(inbound_id)
         protocol = inbound.get('protocol', '').lower() if inbound else ''
         
         # Get client details
         client_traffic = await panel.get_client_traffic(email)
         
-        # Close panel connection
-        await panel.close()
-        
         # Return account information
         return {
             'panel_id': panel_id,
@@ -719,7 +965,6 @@ async def update_v2ray_account(panel_id: int, inbound_id: int, email: str, expir
         client_traffic = await panel.get_client_traffic(email)
         if not client_traffic:
             logger.error(f"Client {email} not found in panel {panel_id}")
-            await panel.close()
             return False
         
         # Calculate new expiry time if provided
@@ -736,9 +981,6 @@ async def update_v2ray_account(panel_id: int, inbound_id: int, email: str, expir
         # Update client settings
         result = await panel.update_client(inbound_id, email, expiry_time, traffic, enable)
         
-        # Close panel connection
-        await panel.close()
-        
         return result
     except Exception as e:
         logger.error(f"Error updating V2Ray account: {e}")
@@ -767,9 +1009,6 @@ async def delete_v2ray_account(panel_id: int, inbound_id: int, email: str) -> bo
         # Remove client
         result = await panel.remove_client(inbound_id, email)
         
-        # Close panel connection
-        await panel.close()
-        
         return result
     except Exception as e:
         logger.error(f"Error deleting V2Ray account: {e}")
@@ -797,9 +1036,6 @@ async def get_v2ray_account_traffic(panel_id: int, email: str) -> Optional[Dict[
         # Get client traffic
         client_traffic = await panel.get_client_traffic(email)
         
-        # Close panel connection
-        await panel.close()
-        
         return client_traffic
     except Exception as e:
         logger.error(f"Error getting V2Ray account traffic: {e}")
@@ -828,10 +1064,64 @@ async def reset_v2ray_account_traffic(panel_id: int, inbound_id: int, email: str
         # Reset client traffic
         result = await panel.reset_client_traffic(inbound_id, email)
         
-        # Close panel connection
-        await panel.close()
-        
         return result
     except Exception as e:
         logger.error(f"Error resetting V2Ray account traffic: {e}")
-        return False 
\ No newline at end of file
+        return False 
+
+
+async def refresh_panel_traffic(panel_id: int) -> int:
+    """
+    Refresh traffic usage for every account on a panel.
+    
+    The panel's inbound list is streamed once, accounts are matched to their
+    client stats by email in memory, and all changed rows are written in one
+    batched statement.
+    
+    Args:
+        panel_id: Panel ID
+        
+    Returns:
+        Number of updated accounts
+    """
+    try:
+        panel = await get_panel(panel_id)
+        if not panel:
+            logger.error(f"Panel {panel_id} not found or not accessible")
+            return 0
+        
+        # Stream the inbound list and keep only the traffic counters, so
+        # large panels are never held in memory as a whole
+        traffic = {}
+        stream = JSONArrayStream()
+        async for inbound in panel.iter_inbounds(stream):
+            for client in inbound.get('clientStats') or []:
+                email = client.get('email')
+                if email:
+                    traffic[email] = client.get('up', 0) + client.get('down', 0)
+        
+        if not (stream.found and stream.done):
+            return 0
+        
+        updates = []
+        for account in get_server_accounts(panel_id):
+            traffic_used = traffic.get(account['email'])
+            if traffic_used is not None and traffic_used != account['traffic_used']:
+                updates.append((account['id'], traffic_used))
+        
+        return bulk_update_account_traffic(updates)
+    except Exception as e:
+        logger.error(f"Error refreshing traffic for panel {panel_id}: {e}")
+        return 0
+
+
+async def refresh_all_panels_traffic() -> Dict[int, int]:
+    """
+    Refresh traffic usage for the accounts on every panel.
+    
+    Returns:
+        Dictionary mapping panel ID to the number of updated accounts
+    """
+    panels = await get_all_panels()
+    results = await asyncio.gather(*(refresh_panel_traffic(panel['id']) for panel in panels))
+    return {panel['id']: updated for panel, updated in zip(panels, results)}
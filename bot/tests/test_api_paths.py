@@ -0,0 +1,24 @@
+import unittest
+from unittest import mock
+
+from utils import api
+
+# Must match the monitoring routes checked in backend/v2ray/tests/test_urls.py
+EXPECTED_PATHS = [
+    (api.fetch_server_status, "/v2ray/monitoring/1/health/"),
+    (api.fetch_server_stats, "/v2ray/monitoring/1/stats/"),
+    (api.fetch_server_history, "/v2ray/monitoring/1/history/"),
+]
+
+
+class MonitoringPathsTest(unittest.IsolatedAsyncioTestCase):
+    async def test_fetch_helpers_request_backend_routes(self):
+        for fetch, path in EXPECTED_PATHS:
+            with self.subTest(fetch=fetch.__name__):
+                with mock.patch.object(api, "_make_async_request", mock.AsyncMock(return_value={})) as request:
+                    await fetch(1, refresh=True)
+                self.assertEqual(request.await_args.args, ("GET", path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import asyncio
+import unittest
+
+from utils.api import StatsCache
+
+
+class StatsCacheTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.calls = 0
+
+    async def fetch(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return self.calls
+
+    async def test_concurrent_requests_share_one_fetch(self):
+        cache = StatsCache(ttl=60)
+        results = await asyncio.gather(*(cache.get("key", self.fetch) for _ in range(5)))
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(self.calls, 1)
+
+    async def test_value_is_served_until_the_ttl_expires(self):
+        cache = StatsCache(ttl=0.05)
+        self.assertEqual(await cache.get("key", self.fetch), 1)
+        self.assertEqual(await cache.get("key", self.fetch), 1)
+        await asyncio.sleep(0.06)
+        self.assertEqual(await cache.get("key", self.fetch), 2)
+
+    async def test_refresh_bypasses_the_cache(self):
+        cache = StatsCache(ttl=60)
+        self.assertEqual(await cache.get("key", self.fetch), 1)
+        self.assertEqual(await cache.get("key", self.fetch, refresh=True), 2)
+        self.assertEqual(await cache.get("key", self.fetch), 2)
+
+    async def test_failed_fetch_is_not_cached(self):
+        cache = StatsCache(ttl=60)
+
+        async def fail():
+            raise RuntimeError("backend down")
+
+        with self.assertRaises(RuntimeError):
+            await cache.get("key", fail)
+        self.assertEqual(await cache.get("key", self.fetch), 1)
+
+    async def test_cancelled_caller_does_not_cancel_the_shared_fetch(self):
+        cache = StatsCache(ttl=60)
+        first = asyncio.ensure_future(cache.get("key", self.fetch))
+        second = asyncio.ensure_future(cache.get("key", self.fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, 1)
+        self.assertEqual(self.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
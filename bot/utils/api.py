@@ -6,20 +6,31 @@ This module provides utility functions for:
 - Traffic usage tracking
 - System metrics collection
 - Data formatting and caching
+
+Async variants (fetch_*) share one pooled httpx client and a short-TTL
+cache, so handlers can query many servers concurrently without blocking
+the bot's event loop.
 """
 
+import os
+import asyncio
 import logging
-from typing import Dict, List, Optional, Union, Tuple
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Union, Tuple
 from datetime import datetime, timedelta
 import time
 from functools import lru_cache
+import httpx
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+API_BASE_URL = os.getenv("API_BASE_URL", "http://backend:8000/api/v1")
+API_TIMEOUT = int(os.getenv("API_TIMEOUT", "30"))
+API_MAX_CONNECTIONS = int(os.getenv("API_MAX_CONNECTIONS", "20"))
+MONITORING_CACHE_TTL = int(os.getenv("MONITORING_CACHE_TTL", "15"))
+
 class APIError(Exception):
     """Base exception for API errors."""
     pass
@@ -76,7 +87,7 @@ def _make_request(
         APIRequestError: If request fails
         APITimeoutError: If request times out
     """
-    url = f"{settings.API_BASE_URL}{endpoint}"
+    url = f"{API_BASE_URL}{endpoint}"
     
     try:
         session = _create_session()
@@ -110,7 +121,7 @@ def get_server_status(server_id: int) -> Dict:
     Returns:
         Server status data
     """
-    return _make_request('GET', f'/v2ray/monitoring/{server_id}/')
+    return _make_request('GET', f'/v2ray/monitoring/{server_id}/health/')
 
 @lru_cache(maxsize=100)
 def get_server_stats(server_id: int) -> Dict:
@@ -191,6 +202,211 @@ def get_server_network(server_id: int) -> Dict:
     """
     return _make_request('GET', f'/v2ray/monitoring/{server_id}/network/')
 
+# Async client
+
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """
+    Get the shared async client for backend requests.
+    
+    Returns:
+        httpx client whose connection pool is reused by every request
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            base_url=API_BASE_URL,
+            timeout=httpx.Timeout(API_TIMEOUT, connect=5),
+            transport=httpx.AsyncHTTPTransport(
+                retries=2,
+                limits=httpx.Limits(
+                    max_connections=API_MAX_CONNECTIONS,
+                    max_keepalive_connections=API_MAX_CONNECTIONS
+                )
+            )
+        )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """Close the shared async client."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def _make_async_request(
+    method: str,
+    endpoint: str,
+    data: Optional[Dict] = None,
+    params: Optional[Dict] = None
+) -> Dict:
+    """
+    Make an API request to the backend without blocking the event loop.
+    
+    Args:
+        method: HTTP method (GET, POST, etc.)
+        endpoint: API endpoint path
+        data: Request body data
+        params: Query parameters
+        
+    Returns:
+        Response data as dict
+        
+    Raises:
+        APIRequestError: If request fails
+        APITimeoutError: If request times out
+    """
+    try:
+        response = await _get_async_client().request(method, endpoint, json=data, params=params)
+        response.raise_for_status()
+        return response.json()
+    except httpx.TimeoutException:
+        logger.error(f"API request timed out: {endpoint}")
+        raise APITimeoutError(f"Request to {endpoint} timed out")
+    except (httpx.HTTPError, ValueError) as e:
+        logger.error(f"API request failed: {str(e)}")
+        raise APIRequestError(f"Request to {endpoint} failed: {str(e)}")
+
+
+class StatsCache:
+    """
+    Short-lived cache of API results shared by all handlers.
+    
+    Concurrent requests for the same key share a single fetch.
+    """
+
+    def __init__(self, ttl: int):
+        """
+        Initialize the cache.
+        
+        Args:
+            ttl: Seconds a result is served from the cache
+        """
+        self.ttl = ttl
+        self._values: Dict[Hashable, Tuple[float, Any]] = {}
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+
+    async def get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], refresh: bool = False) -> Any:
+        """
+        Get a cached value or fetch it.
+        
+        Args:
+            key: Cache key
+            fetch: Coroutine function producing the value
+            refresh: Ignore a cached value and fetch again
+            
+        Returns:
+            The cached or freshly fetched value
+        """
+        if not refresh:
+            cached = self._values.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(fetch())
+            self._pending[key] = pending
+            pending.add_done_callback(lambda future: self._store(key, future))
+
+        # A cancelled caller must not cancel the fetch other callers wait for
+        return await asyncio.shield(pending)
+
+    def _store(self, key: Hashable, future: asyncio.Future) -> None:
+        """Cache the result of a finished fetch."""
+        self._pending.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            self._values[key] = (time.monotonic() + self.ttl, future.result())
+
+    def clear(self) -> None:
+        """Drop every cached value."""
+        self._values.clear()
+
+
+stats_cache = StatsCache(MONITORING_CACHE_TTL)
+
+
+async def fetch_server_status(server_id: int, refresh: bool = False) -> Dict:
+    """
+    Get server status and monitoring data.
+    
+    Args:
+        server_id: Server ID
+        refresh: Bypass the cache
+        
+    Returns:
+        Server status data
+    """
+    return await stats_cache.get(
+        ("status", server_id),
+        lambda: _make_async_request('GET', f'/v2ray/monitoring/{server_id}/health/'),
+        refresh
+    )
+
+
+async def fetch_server_stats(server_id: int, refresh: bool = False) -> Dict:
+    """
+    Get server statistics.
+    
+    Args:
+        server_id: Server ID
+        refresh: Bypass the cache
+        
+    Returns:
+        Server statistics data
+    """
+    return await stats_cache.get(
+        ("stats", server_id),
+        lambda: _make_async_request('GET', f'/v2ray/monitoring/{server_id}/stats/'),
+        refresh
+    )
+
+
+async def fetch_server_history(server_id: int, hours: int = 24, refresh: bool = False) -> List[Dict]:
+    """
+    Get server monitoring history.
+    
+    Args:
+        server_id: Server ID
+        hours: Number of hours of history to retrieve
+        refresh: Bypass the cache
+        
+    Returns:
+        List of monitoring data points
+    """
+    return await stats_cache.get(
+        ("history", server_id, hours),
+        lambda: _make_async_request('GET', f'/v2ray/monitoring/{server_id}/history/', params={'hours': hours}),
+        refresh
+    )
+
+
+async def fetch_for_servers(
+    server_ids: List[int],
+    fetch: Callable[..., Awaitable[Dict]],
+    refresh: bool = False
+) -> Dict[int, Union[Dict, Exception]]:
+    """
+    Fetch data for many servers concurrently.
+    
+    Args:
+        server_ids: Server IDs
+        fetch: One of the fetch_* functions
+        refresh: Bypass the cache
+        
+    Returns:
+        Result or raised exception per server ID
+    """
+    results = await asyncio.gather(
+        *[fetch(server_id, refresh=refresh) for server_id in server_ids],
+        return_exceptions=True
+    )
+    return dict(zip(server_ids, results))
+
 def format_bytes(bytes_value: Union[int, float]) -> str:
     """
     Format bytes to human readable string.
@@ -0,0 +1,1397 @@
+"""
+Async database utilities for the Telegram bot.
+
+This module mirrors the functions of utils/database.py as awaitables on an
+asyncpg connection pool, so handlers can query the database without
+blocking the event loop:
+
+    from utils.async_database import get_user
+    user = await get_user(user_id)
+
+The pool uses the same DB_* environment variables as the synchronous pool.
+asyncpg prepares every statement on first use and keeps it in a per-connection
+cache, so the hot queries below are module constants: their text never
+changes and each connection parses and plans them only once. Set
+DB_STATEMENT_CACHE_SIZE=0 when connecting through a transaction-mode pooler
+such as PgBouncer, which cannot keep prepared statements.
+"""
+
+import os
+import json
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+import asyncpg
+
+from utils.database import DB_CONFIG, format_setting
+from utils.settings_cache import settings_cache
+from utils.user_cache import user_cache
+
+# Configure logging
+logger = logging.getLogger("telegram_bot")
+
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "10"))
+
+# Hot queries, run on nearly every update
+GET_USER_SQL = 'SELECT * FROM users WHERE id = $1'
+GET_USER_LANGUAGE_SQL = 'SELECT language_code FROM users WHERE id = $1'
+USER_EXISTS_SQL = 'SELECT id FROM users WHERE id = $1'
+GET_USER_PREFERENCES_SQL = 'SELECT preferences FROM user_preferences WHERE user_id = $1'
+GET_SETTING_SQL = 'SELECT value FROM settings WHERE key = $1'
+GET_USER_ACCOUNTS_SQL = 'SELECT * FROM accounts WHERE user_id = $1 ORDER BY created_at DESC'
+GET_ACCOUNT_SQL = 'SELECT * FROM accounts WHERE id = $1'
+UPSERT_USER_SQL = '''
+INSERT INTO users (id, username, first_name, last_name, language_code)
+VALUES ($1, $2, $3, $4, $5)
+ON CONFLICT (id) DO UPDATE
+SET username = EXCLUDED.username, first_name = EXCLUDED.first_name,
+    last_name = EXCLUDED.last_name, updated_at = CURRENT_TIMESTAMP
+RETURNING *, (xmax = 0) AS created
+'''
+
+pool: Optional[asyncpg.Pool] = None
+_pool_lock = asyncio.Lock()
+
+
+def _encode_json(value: Any) -> str:
+    # Strings are passed through as JSON text, as psycopg2 does
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    """Decode JSON and JSONB columns to Python objects, like psycopg2."""
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(
+            type_name,
+            encoder=_encode_json,
+            decoder=json.loads,
+            schema="pg_catalog"
+        )
+
+
+async def get_pool() -> asyncpg.Pool:
+    """
+    Get the connection pool, creating it on first use.
+
+    Returns:
+        The asyncpg connection pool
+    """
+    global pool
+    if pool is None:
+        async with _pool_lock:
+            if pool is None:
+                pool = await asyncpg.create_pool(
+                    database=DB_CONFIG["dbname"],
+                    user=DB_CONFIG["user"],
+                    password=DB_CONFIG["password"],
+                    host=DB_CONFIG["host"],
+                    port=int(DB_CONFIG["port"]),
+                    min_size=DB_CONFIG["minconn"],
+                    max_size=DB_CONFIG["maxconn"],
+                    statement_cache_size=STATEMENT_CACHE_SIZE,
+                    command_timeout=COMMAND_TIMEOUT,
+                    init=_init_connection
+                )
+    return pool
+
+
+async def close_database() -> None:
+    """Close the connection pool."""
+    global pool
+    if pool is not None:
+        await pool.close()
+        pool = None
+
+
+def _row_id(value: Any) -> Any:
+    # Callback data hands IDs over as strings; asyncpg does not cast them
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+
+def _timestamp(value: Any) -> Any:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _rowcount(status: str) -> int:
+    # Command status, e.g. "UPDATE 3"
+    try:
+        return int(status.rsplit(" ", 1)[-1])
+    except (ValueError, AttributeError):
+        return 0
+
+
+async def _update_row(table: str, label: str, row_id: Any, fields: Dict[str, Any]) -> bool:
+    """Update the given columns of one row, matched by ID."""
+    if not fields:
+        logger.error(f"No fields provided for update_{label}")
+        return False
+
+    db = await get_pool()
+
+    try:
+        set_clause = ", ".join(f"{key} = ${i}" for i, key in enumerate(fields, start=1))
+        set_clause += ", updated_at = CURRENT_TIMESTAMP"
+        query = f"UPDATE {table} SET {set_clause} WHERE id = ${len(fields) + 1}"
+
+        status = await db.execute(query, *fields.values(), _row_id(row_id))
+
+        if _rowcount(status) > 0:
+            logger.info(f"Updated {label} {row_id} with {fields}")
+            return True
+        else:
+            logger.warning(f"No {label} found with ID {row_id}")
+            return False
+    except Exception as e:
+        logger.error(f"Error updating {label}: {e}")
+        return False
+
+# User functions
+
+async def create_user_if_not_exists(user_id: int, username: Optional[str], first_name: str,
+                                    last_name: Optional[str], language_code: str) -> None:
+    """
+    Create a user if they don't exist in the database.
+
+    Existing users get their name and username refreshed, unless the cached
+    row already has them.
+
+    Args:
+        user_id: Telegram user ID
+        username: Telegram username
+        first_name: User's first name
+        last_name: User's last name
+        language_code: User's language code
+    """
+    if user_cache.matches(user_id, {"username": username, "first_name": first_name, "last_name": last_name}):
+        return
+
+    db = await get_pool()
+
+    try:
+        user = dict(await db.fetchrow(UPSERT_USER_SQL, user_id, username, first_name, last_name, language_code))
+        if user.pop("created"):
+            logger.info(f"Created new user: {user_id} ({username})")
+        user_cache.set_user(user_id, user)
+    except Exception as e:
+        logger.error(f"Error creating/updating user: {e}")
+
+
+async def get_user(user_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Get user information, from the user cache when possible.
+
+    Args:
+        user_id: Telegram user ID
+
+    Returns:
+        User information as a dictionary or None if not found
+    """
+    hit, user = user_cache.get_user(user_id)
+    if hit:
+        return user
+
+    db = await get_pool()
+
+    try:
+        user = await db.fetchrow(GET_USER_SQL, user_id)
+        if user:
+            user_cache.set_user(user_id, dict(user))
+            return dict(user)
+        return None
+    except Exception as e:
+        logger.error(f"Error getting user {user_id}: {e}")
+        return None
+
+
+async def get_user_preferences(user_id: int) -> Dict[str, Any]:
+    """
+    Get user preferences.
+
+    Args:
+        user_id: Telegram user ID
+
+    Returns:
+        User preferences as dictionary
+    """
+    hit, preferences = user_cache.get_preferences(user_id)
+    if hit:
+        return preferences
+
+    db = await get_pool()
+
+    try:
+        async with db.acquire() as conn:
+            if not user_cache.get_user(user_id)[0] and not await conn.fetchval(USER_EXISTS_SQL, user_id):
+                return {"language": "en"}
+
+            row = await conn.fetchrow(GET_USER_PREFERENCES_SQL, user_id)
+            if row:
+                preferences = row[0] if row[0] else {"language": "en"}
+            else:
+                # Create default preferences
+                preferences = {"language": "en"}
+                await conn.execute(
+                    'INSERT INTO user_preferences (user_id, preferences) VALUES ($1, $2)',
+                    user_id, preferences
+                )
+
+        user_cache.set_preferences(user_id, preferences)
+        return preferences
+    except Exception as e:
+        logger.error(f"Error getting user preferences: {e}")
+        return {"language": "en"}
+
+
+async def update_user_preferences(user_id: int, preferences: Dict[str, Any]) -> bool:
+    """
+    Update user preferences.
+
+    Args:
+        user_id: Telegram user ID
+        preferences: Dictionary of preferences
+
+    Returns:
+        True if successful, False otherwise
+    """
+    db = await get_pool()
+
+    try:
+        async with db.acquire() as conn:
+            if not await conn.fetchval(USER_EXISTS_SQL, user_id):
+                logger.error(f"Cannot update preferences for non-existent user: {user_id}")
+                return False
+
+            await conn.execute(
+                '''
+                INSERT INTO user_preferences (user_id, preferences)
+                VALUES ($1, $2)
+                ON CONFLICT (user_id)
+                DO UPDATE SET preferences = EXCLUDED.preferences, updated_at = CURRENT_TIMESTAMP
+                ''',
+                user_id, preferences
+            )
+        user_cache.set_preferences(user_id, preferences)
+        return True
+    except Exception as e:
+        logger.error(f"Error updating user preferences: {e}")
+        return False
+
+
+async def get_user_language(user_id: int) -> str:
+    """
+    Get user language code.
+
+    Args:
+        user_id: Telegram user ID
+
+    Returns:
+        Language code (defaults to 'en')
+    """
+    hit, user = user_cache.get_user(user_id)
+    if hit:
+        return user.get('language_code') or 'en'
+
+    db = await get_pool()
+
+    try:
+        language_code = await db.fetchval(GET_USER_LANGUAGE_SQL, user_id)
+        return language_code or 'en'
+    except Exception as e:
+        logger.error(f"Error getting user language: {e}")
+        return 'en'
+
+
+async def update_user(user_id: int, **kwargs) -> bool:
+    """
+    Update user information.
+
+    Args:
+        user_id: Telegram user ID
+        **kwargs: Fields to update (e.g., balance=100, language_code='en')
+
+    Returns:
+        True if successful, False otherwise
+    """
+    updated = await _update_row("users", "user", user_id, kwargs)
+    if updated:
+        user_cache.update_user(user_id, kwargs)
+    return updated
+
+
+async def update_user_language(user_id: int, language_code: str) -> bool:
+    """
+    Update user's language preference.
+
+    Args:
+        user_id: Telegram user ID
+        language_code: Language code
+
+    Returns:
+        True if successful, False otherwise
+    """
+    return await update_user(user_id, language_code=language_code)
+
+# Settings functions
+
+async def get_setting(key: str) -> Any:
+    """
+    Get a setting, from the settings cache when possible.
+
+    Args:
+        key: Setting key
+
+    Returns:
+        Setting value or None if not found
+    """
+    hit, value = settings_cache.lookup(key)
+    if hit:
+        return format_setting(value)
+
+    generation = settings_cache.generation
+    db = await get_pool()
+
+    try:
+        result = await db.fetchrow(GET_SETTING_SQL, key)
+
+        value = result['value'] if result else None
+        settings_cache.store(key, value, generation)
+        return format_setting(value)
+    except Exception as e:
+        logger.error(f"Error getting setting: {e}")
+        return None
+
+
+async def update_setting(key: str, value: str) -> bool:
+    """
+    Update a setting value.
+
+    Args:
+        key: Setting key
+        value: Setting value
+
+    Returns:
+        True if successful, False otherwise
+    """
+    db = await get_pool()
+
+    try:
+        await db.execute('UPDATE settings SET value = $1 WHERE key = $2', value, key)
+        # Other processes are notified by the settings trigger
+        settings_cache.invalidate(key)
+        return True
+    except Exception as e:
+        logger.error(f"Error updating setting: {e}")
+        return False
+
+
+async def get_system_settings() -> Dict[str, Any]:
+    """
+    Get system settings.
+
+    Returns:
+        Dictionary of system settings
+    """
+    db = await get_pool()
+
+    try:
+        rows = await db.fetch('SELECT key, value, description FROM settings')
+        return {
+            row['key']: {'value': row['value'], 'description': row['description']}
+            for row in rows
+        }
+    except Exception as e:
+        logger.error(f"Error getting system settings: {e}")
+        return {}
+
+
+async def get_all_settings() -> Dict[str, Any]:
+    """Get all settings from the database."""
+    return await get_system_settings()
+
+
+async def update_system_settings(settings: Dict[str, Any]) -> bool:
+    """
+    Update system settings.
+
+    Args:
+        settings: Dictionary of settings to update
+
+    Returns:
+        True if successful, False otherwise
+    """
+    if not settings:
+        logger.error("No settings provided for update_system_settings")
+        return False
+
+    db = await get_pool()
+
+    try:
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany(
+                    '''
+                    INSERT INTO settings (key, value, updated_at)
+                    VALUES ($1, $2, CURRENT_TIMESTAMP)
+                    ON CONFLICT (key) DO UPDATE
+                    SET value = EXCLUDED.value, updated_at = CURRENT_TIMESTAMP
+                    ''',
+                    list(settings.items())
+                )
+        for key in settings:
+            settings_cache.invalidate(key)
+        logger.info(f"Updated system settings: {settings}")
+        return True
+    except Exception as e:
+        logger.error(f"Error updating system settings: {e}")
+        return False
+
+# Order and payment functions
+
+async def create_order(user_id: int, service_id: int, amount: int) -> Optional[Dict[str, Any]]:
+    """
+    Create a new order.
+
+    Args:
+        user_id: Telegram user ID
+        service_id: Service ID
+        amount: Order amount
+
+    Returns:
+        Order data as dictionary or None if failed
+    """
+    db = await get_pool()
+
+    try:
+        order = await db.fetchrow(
+            'INSERT INTO orders (user_id, service_id, amount) VALUES ($1, $2, $3) RETURNING *',
+            user_id, service_id, amount
+        )
+        return dict(order) if order else None
+    except Exception as e:
+        logger.error(f"Error creating order: {e}")
+        return None
+
+
+async def get_order(order_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Get order information by ID.
+
+    Args:
+        order_id: Order ID
+
+    Returns:
+        Order information as a dictionary or None if not found
+    """
+    db = await get_pool()
+
+    try:
+        order = await db.fetchrow('SELECT * FROM orders WHERE id = $1', _row_id(order_id))
+        return dict(order) if order else None
+    except Exception as e:
+        logger.error(f"Error getting order {order_id}: {e}")
+        return None
+
+
+async def create_payment(user_id: int, order_id: int, amount: int, payment_method: str, details: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+    """
+    Create a new payment.
+
+    Args:
+        user_id: Telegram user ID
+        order_id: Order ID
+        amount: Payment amount
+        payment_method: Payment method (e.g., 'card', 'zarinpal', 'wallet')
+        details: Optional payment details
+
+    Returns:
+        Payment data as dictionary or None if failed
+    """
+    db = await get_pool()
+
+    try:
+        current_time = datetime.now()
+        payment = await db.fetchrow(
+            'INSERT INTO payments (user_id, order_id, amount, payment_method, details, status, created_at, updated_at) VALUES ($1, $2, $3, $4, $5, $6, $7, $8) RETURNING *',
+            user_id, order_id, amount, payment_method, details or None, 'pending', current_time, current_time
+        )
+        return dict(payment) if payment else None
+    except Exception as e:
+        logger.error(f"Error creating payment: {e}")
+        return None
+
+
+async def get_payment(payment_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Get payment information by ID.
+
+    Args:
+        payment_id: Payment ID
+
+    Returns:
+        Payment information as a dictionary or None if not found
+    """
+    db = await get_pool()
+
+    try:
+        payment = await db.fetchrow('SELECT * FROM payments WHERE id = $1', _row_id(payment_id))
+        return dict(payment) if payment else None
+    except Exception as e:
+        logger.error(f"Error getting payment {payment_id}: {e}")
+        return None
+
+
+async def update_payment_status(payment_id: int, status: str, transaction_id: Optional[str] = None, details: Optional[str] = None) -> bool:
+    """
+    Update payment status.
+
+    A completed payment also completes its order, in the same transaction.
+
+    Args:
+        payment_id: Payment ID
+        status: Payment status ('pending', 'completed', 'failed')
+        transaction_id: Optional transaction ID
+        details: Optional payment details
+
+    Returns:
+        True if successful, False otherwise
+    """
+    db = await get_pool()
+
+    try:
+        fields = {'status': status}
+        if transaction_id:
+            fields['transaction_id'] = transaction_id
+        if details:
+            fields['details'] = details
+        set_clause = ", ".join(f"{key} = ${i}" for i, key in enumerate(fields, start=1))
+
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                order_id = await conn.fetchval(
+                    f'UPDATE payments SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE id = ${len(fields) + 1} RETURNING order_id',
+                    *fields.values(), payment_id
+                )
+
+                if status == 'completed' and order_id is not None:
+                    await conn.execute(
+                        'UPDATE orders SET status = $1, updated_at = CURRENT_TIMESTAMP WHERE id = $2',
+                        'completed', order_id
+                    )
+
+        return True
+    except Exception as e:
+        logger.error(f"Error updating payment status: {e}")
+        return False
+
+# Account functions
+
+async def create_account(user_id: int, service_id: int, server_id: int, name: str, config: Dict[str, Any], expiry_date: str, traffic_limit: int) -> Optional[Dict[str, Any]]:
+    """
+    Create a new account.
+
+    Args:
+        user_id: Telegram user ID
+        service_id: Service ID
+        server_id: Server ID
+        name: Account name
+        config: Account configuration
+        expiry_date: Account expiry date
+        traffic_limit: Traffic limit in bytes
+
+    Returns:
+        Account data as dictionary or None if failed
+    """
+    db = await get_pool()
+
+    try:
+        current_time = datetime.now()
+        account = await db.fetchrow(
+            'INSERT INTO accounts (user_id, service_id, server_id, name, config, expiry_date, traffic_limit, created_at, updated_at) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9) RETURNING *',
+            user_id, service_id, server_id, name, config, _timestamp(expiry_date), traffic_limit, current_time, current_time
+        )
+        return dict(account) if account else None
+    except Exception as e:
+        logger.error(f"Error creating account: {e}")
+        return None
+
+
+async def get_account(account_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Get account information by ID.
+
+    Args:
+        account_id: Account ID
+
+    Returns:
+        Account information as a dictionary or None if not found
+    """
+    db = await get_pool()
+
+    try:
+        account = await db.fetchrow(GET_ACCOUNT_SQL, _row_id(account_id))
+        return dict(account) if account else None
+    except Exception as e:
+        logger.error(f"Error getting account {account_id}: {e}")
+        return None
+
+
+async def get_user_accounts(user_id: int) -> List[Dict[str, Any]]:
+    """
+    Get all accounts for a user.
+
+    Args:
+        user_id: Telegram user ID
+
+    Returns:
+        List of account dictionaries
+    """
+    db = await get_pool()
+
+    try:
+        accounts = await db.fetch(GET_USER_ACCOUNTS_SQL, user_id)
+        return [dict(account) for account in accounts]
+    except Exception as e:
+        logger.error(f"Error getting user accounts: {e}")
+        return []
+
+
+async def update_account(account_id: str, **kwargs) -> bool:
+    """
+    Update account information.
+
+    Args:
+        account_id: ID of the account
+        **kwargs: Fields to update (e.g., status='active', traffic_used=100)
+
+    Returns:
+        True if successful, False otherwise
+    """
+    return await _update_row("accounts", "account", account_id, kwargs)
+
+
+async def update_account_status(account_id: int, status: str) -> bool:
+    """
+    Update account status.
+
+    Args:
+        account_id: Account ID
+        status: Account status ('active', 'expired', 'suspended')
+
+    Returns:
+        True if successful, False otherwise
+    """
+    db = await get_pool()
+
+    try:
+        await db.execute(
+            'UPDATE accounts SET status = $1, updated_at = CURRENT_TIMESTAMP WHERE id = $2',
+            status, _row_id(account_id)
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Error updating account status: {e}")
+        return False
+
+
+async def update_account_traffic(account_id: int, traffic_used: int) -> bool:
+    """
+    Update account traffic usage.
+
+    Args:
+        account_id: Account ID
+        traffic_used: Traffic used in bytes
+
+    Returns:
+        True if successful, False otherwise
+    """
+    db = await get_pool()
+
+    try:
+        await db.execute(
+            'UPDATE accounts SET traffic_used = $1, updated_at = CURRENT_TIMESTAMP WHERE id = $2',
+            traffic_used, _row_id(account_id)
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Error updating account traffic: {e}")
+        return False
+
+
+async def get_server_accounts(server_id: int) -> List[Dict[str, Any]]:
+    """
+    Get the traffic-relevant fields of all accounts on a server.
+
+    Args:
+        server_id: Server (3X-UI panel) ID
+
+    Returns:
+        List of dictionaries with id, email and traffic_used
+    """
+    db = await get_pool()
+
+    try:
+        accounts = await db.fetch(
+            '''
+            SELECT id, config->>'email' AS email, traffic_used
+            FROM accounts
+            WHERE server_id = $1 AND status != 'deleted'
+            ''',
+            _row_id(server_id)
+        )
+        return [dict(account) for account in accounts]
+    except Exception as e:
+        logger.error(f"Error getting accounts for server {server_id}: {e}")
+        return []
+
+
+async def bulk_update_account_traffic(updates: List[Tuple[int, int]]) -> int:
+    """
+    Update traffic usage for many accounts in a single statement.
+
+    Args:
+        updates: List of (account_id, traffic_used) tuples, traffic in bytes
+
+    Returns:
+        Number of updated rows
+    """
+    if not updates:
+        return 0
+
+    db = await get_pool()
+
+    try:
+        account_ids, traffic = zip(*updates)
+        status = await db.execute(
+            '''
+            UPDATE accounts AS a
+            SET traffic_used = v.traffic_used, updated_at = CURRENT_TIMESTAMP
+            FROM unnest($1::integer[], $2::bigint[]) AS v (id, traffic_used)
+            WHERE a.id = v.id
+            ''',
+            list(account_ids), list(traffic)
+        )
+        return _rowcount(status)
+    except Exception as e:
+        logger.error(f"Error bulk updating account traffic: {e}")
+        return 0
+
+# Support ticket functions
+
+async def create_ticket(user_id: int, subject: str, message: str) -> Optional[str]:
+    """
+    Create a new support ticket.
+
+    Args:
+        user_id: Telegram user ID
+        subject: Ticket subject
+        message: Ticket message
+
+    Returns:
+        Ticket ID if successful, None otherwise
+    """
+    db = await get_pool()
+
+    try:
+        ticket_id = str(uuid.uuid4())
+
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    '''
+                    INSERT INTO tickets (
+                        id, user_id, subject, status, created_at, updated_at
+                    ) VALUES ($1, $2, $3, $4, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                    ''',
+                    ticket_id, user_id, subject, 'open'
+                )
+
+                # Add the first message
+                await conn.execute(
+                    '''
+                    INSERT INTO ticket_messages (
+                        id, ticket_id, user_id, message, created_at
+                    ) VALUES ($1, $2, $3, $4, CURRENT_TIMESTAMP)
+                    ''',
+                    str(uuid.uuid4()), ticket_id, user_id, message
+                )
+
+        logger.info(f"Created ticket {ticket_id} for user {user_id}")
+        return ticket_id
+    except Exception as e:
+        logger.error(f"Error creating ticket: {e}")
+        return None
+
+
+async def get_ticket(ticket_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Get ticket information by ID.
+
+    Args:
+        ticket_id: Ticket ID
+
+    Returns:
+        Ticket information as a dictionary or None if not found
+    """
+    db = await get_pool()
+
+    try:
+        ticket = await db.fetchrow('SELECT * FROM tickets WHERE id = $1', _row_id(ticket_id))
+        return dict(ticket) if ticket else None
+    except Exception as e:
+        logger.error(f"Error getting ticket {ticket_id}: {e}")
+        return None
+
+
+async def update_ticket(ticket_id: str, **kwargs) -> bool:
+    """
+    Update ticket information.
+
+    Args:
+        ticket_id: Ticket ID
+        **kwargs: Fields to update (e.g., status='closed')
+
+    Returns:
+        True if successful, False otherwise
+    """
+    return await _update_row("tickets", "ticket", ticket_id, kwargs)
+
+
+async def add_ticket_message(ticket_id: str, user_id: int, message: str) -> Optional[str]:
+    """
+    Add a message to a ticket.
+
+    Args:
+        ticket_id: Ticket ID
+        user_id: Telegram user ID
+        message: Message text
+
+    Returns:
+        Message ID if successful, None otherwise
+    """
+    db = await get_pool()
+
+    try:
+        message_id = str(uuid.uuid4())
+
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    '''
+                    INSERT INTO ticket_messages (
+                        id, ticket_id, user_id, message, created_at
+                    ) VALUES ($1, $2, $3, $4, CURRENT_TIMESTAMP)
+                    ''',
+                    message_id, _row_id(ticket_id), user_id, message
+                )
+
+                # Update ticket updated_at
+                await conn.execute(
+                    'UPDATE tickets SET updated_at = CURRENT_TIMESTAMP WHERE id = $1',
+                    _row_id(ticket_id)
+                )
+
+        logger.info(f"Added message {message_id} to ticket {ticket_id}")
+        return message_id
+    except Exception as e:
+        logger.error(f"Error adding ticket message: {e}")
+        return None
+
+
+async def get_user_tickets(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Get user tickets.
+
+    Args:
+        user_id: Telegram user ID
+        limit: Maximum number of tickets to return
+
+    Returns:
+        List of ticket data
+    """
+    db = await get_pool()
+
+    try:
+        rows = await db.fetch(
+            '''
+            SELECT id, subject, status, created_at, updated_at
+            FROM tickets
+            WHERE user_id = $1
+            ORDER BY updated_at DESC
+            LIMIT $2
+            ''',
+            user_id, limit
+        )
+        return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error getting user tickets: {e}")
+        return []
+
+
+async def get_all_tickets(status: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+    """
+    Get all tickets.
+
+    Args:
+        status: Filter by status (optional)
+        limit: Maximum number of tickets to return
+        offset: Offset for pagination
+
+    Returns:
+        List of ticket data
+    """
+    db = await get_pool()
+
+    try:
+        rows = await db.fetch(
+            '''
+            SELECT t.id, t.user_id, u.username, t.subject, t.status, t.created_at, t.updated_at
+            FROM tickets t
+            JOIN users u ON t.user_id = u.id
+            WHERE $1::text IS NULL OR t.status = $1
+            ORDER BY t.updated_at DESC
+            LIMIT $2 OFFSET $3
+            ''',
+            status or None, limit, offset
+        )
+        return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error getting all tickets: {e}")
+        return []
+
+# Transaction functions
+
+async def create_transaction(user_id: int, amount: int, payment_method: str, description: str = None, reference_id: str = None) -> Optional[str]:
+    """
+    Create a new transaction.
+
+    Args:
+        user_id: Telegram user ID
+        amount: Transaction amount in Toman
+        payment_method: Payment method (card, zarinpal)
+        description: Transaction description
+        reference_id: External reference ID (e.g., Zarinpal Authority)
+
+    Returns:
+        Transaction ID if successful, None otherwise
+    """
+    db = await get_pool()
+
+    try:
+        transaction_id = str(uuid.uuid4())
+
+        await db.execute(
+            '''
+            INSERT INTO transactions (
+                id, user_id, amount, payment_method, status, description, reference_id, created_at, updated_at
+            ) VALUES ($1, $2, $3, $4, $5, $6, $7, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            ''',
+            transaction_id, user_id, amount, payment_method, 'pending', description, reference_id
+        )
+
+        logger.info(f"Created transaction {transaction_id} for user {user_id}")
+        return transaction_id
+    except Exception as e:
+        logger.error(f"Error creating transaction: {e}")
+        return None
+
+
+async def get_transaction(transaction_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get transaction by ID.
+
+    Args:
+        transaction_id: Transaction ID
+
+    Returns:
+        Transaction data if found, None otherwise
+    """
+    db = await get_pool()
+
+    try:
+        row = await db.fetchrow(
+            '''
+            SELECT id, user_id, amount, payment_method, status, description, reference_id,
+                   receipt_image, created_at, updated_at
+            FROM transactions
+            WHERE id = $1
+            ''',
+            transaction_id
+        )
+        return dict(row) if row else None
+    except Exception as e:
+        logger.error(f"Error getting transaction: {e}")
+        return None
+
+
+async def update_transaction(transaction_id: str, **kwargs) -> bool:
+    """
+    Update transaction information.
+
+    Args:
+        transaction_id: Transaction ID
+        **kwargs: Fields to update (e.g., status='completed', reference_id='123')
+
+    Returns:
+        True if successful, False otherwise
+    """
+    return await _update_row("transactions", "transaction", transaction_id, kwargs)
+
+
+async def get_user_transactions(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Get user transactions.
+
+    Args:
+        user_id: Telegram user ID
+        limit: Maximum number of transactions to return
+
+    Returns:
+        List of transaction data
+    """
+    db = await get_pool()
+
+    try:
+        rows = await db.fetch(
+            '''
+            SELECT id, amount, payment_method, status, description, created_at
+            FROM transactions
+            WHERE user_id = $1
+            ORDER BY created_at DESC
+            LIMIT $2
+            ''',
+            user_id, limit
+        )
+        return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error getting user transactions: {e}")
+        return []
+
+
+async def get_pending_payments(limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+    """
+    Get pending payments.
+
+    Args:
+        limit: Maximum number of payments to return
+        offset: Offset for pagination
+
+    Returns:
+        List of payment data
+    """
+    db = await get_pool()
+
+    try:
+        rows = await db.fetch(
+            '''
+            SELECT t.id, t.user_id, u.username, t.amount, t.payment_method, t.created_at
+            FROM transactions t
+            JOIN users u ON t.user_id = u.id
+            WHERE t.status = 'pending'
+            ORDER BY t.created_at DESC
+            LIMIT $1 OFFSET $2
+            ''',
+            limit, offset
+        )
+        return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error getting pending payments: {e}")
+        return []
+
+
+async def verify_payment(transaction_id: str) -> bool:
+    """
+    Verify a payment and credit its amount to the user's balance.
+
+    Args:
+        transaction_id: Transaction ID
+
+    Returns:
+        True if successful, False otherwise
+    """
+    db = await get_pool()
+
+    try:
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                # Claiming the pending row locks it, so a payment is credited once
+                result = await conn.fetchrow(
+                    '''
+                    UPDATE transactions SET status = 'completed', updated_at = CURRENT_TIMESTAMP
+                    WHERE id = $1 AND status = 'pending'
+                    RETURNING user_id, amount
+                    ''',
+                    transaction_id
+                )
+
+                if not result:
+                    logger.warning(f"No pending transaction found with ID {transaction_id}")
+                    return False
+
+                await conn.execute(
+                    'UPDATE users SET balance = balance + $1, updated_at = CURRENT_TIMESTAMP WHERE id = $2',
+                    result['amount'], result['user_id']
+                )
+
+        user_cache.invalidate(result['user_id'])
+
+        logger.info(f"Verified payment {transaction_id} for user {result['user_id']}")
+        return True
+    except Exception as e:
+        logger.error(f"Error verifying payment: {e}")
+        return False
+
+
+async def reject_payment(transaction_id: str) -> bool:
+    """
+    Reject a payment.
+
+    Args:
+        transaction_id: Transaction ID
+
+    Returns:
+        True if successful, False otherwise
+    """
+    db = await get_pool()
+
+    try:
+        status = await db.execute(
+            'UPDATE transactions SET status = $1, updated_at = CURRENT_TIMESTAMP WHERE id = $2',
+            'rejected', transaction_id
+        )
+
+        if _rowcount(status) > 0:
+            logger.info(f"Rejected payment {transaction_id}")
+            return True
+        else:
+            logger.warning(f"No transaction found with ID {transaction_id}")
+            return False
+    except Exception as e:
+        logger.error(f"Error rejecting payment: {e}")
+        return False
+
+
+async def get_payment_details(transaction_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get payment details.
+
+    Args:
+        transaction_id: Transaction ID
+
+    Returns:
+        Payment data if found, None otherwise
+    """
+    db = await get_pool()
+
+    try:
+        row = await db.fetchrow(
+            '''
+            SELECT t.id, t.user_id, u.username, t.amount, t.payment_method, t.status,
+                   t.description, t.reference_id, t.receipt_image, t.created_at, t.updated_at
+            FROM transactions t
+            JOIN users u ON t.user_id = u.id
+            WHERE t.id = $1
+            ''',
+            transaction_id
+        )
+        return dict(row) if row else None
+    except Exception as e:
+        logger.error(f"Error getting payment details: {e}")
+        return None
+
+# Admin functions
+
+async def get_all_users(limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+    """
+    Get all users.
+
+    Args:
+        limit: Maximum number of users to return
+        offset: Offset for pagination
+
+    Returns:
+        List of user data
+    """
+    db = await get_pool()
+
+    try:
+        rows = await db.fetch(
+            '''
+            SELECT id, username, first_name, last_name, language_code, status, balance, created_at
+            FROM users
+            ORDER BY created_at DESC
+            LIMIT $1 OFFSET $2
+            ''',
+            limit, offset
+        )
+        return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error getting all users: {e}")
+        return []
+
+
+async def delete_user(user_id: int) -> bool:
+    """
+    Delete a user and their accounts, transactions and tickets.
+
+    Args:
+        user_id: Telegram user ID
+
+    Returns:
+        True if successful, False otherwise
+    """
+    db = await get_pool()
+
+    try:
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute('DELETE FROM accounts WHERE user_id = $1', user_id)
+                await conn.execute('DELETE FROM transactions WHERE user_id = $1', user_id)
+                await conn.execute('DELETE FROM tickets WHERE user_id = $1', user_id)
+                status = await conn.execute('DELETE FROM users WHERE id = $1', user_id)
+        user_cache.invalidate(user_id)
+
+        if _rowcount(status) > 0:
+            logger.info(f"Deleted user {user_id}")
+            return True
+        else:
+            logger.warning(f"No user found with ID {user_id}")
+            return False
+    except Exception as e:
+        logger.error(f"Error deleting user: {e}")
+        return False
+
+
+async def reset_user_password(user_id: int) -> Optional[str]:
+    """
+    Reset user password.
+
+    Args:
+        user_id: Telegram user ID
+
+    Returns:
+        New password if successful, None otherwise
+    """
+    db = await get_pool()
+
+    try:
+        new_password = str(uuid.uuid4())[:8]
+
+        status = await db.execute(
+            'UPDATE users SET password = $1, updated_at = CURRENT_TIMESTAMP WHERE id = $2',
+            new_password, user_id
+        )
+        user_cache.invalidate(user_id)
+
+        if _rowcount(status) > 0:
+            logger.info(f"Reset password for user {user_id}")
+            return new_password
+        else:
+            logger.warning(f"No user found with ID {user_id}")
+            return None
+    except Exception as e:
+        logger.error(f"Error resetting user password: {e}")
+        return None
+
+
+async def get_all_servers(limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+    """
+    Get all servers.
+
+    Args:
+        limit: Maximum number of servers to return
+        offset: Offset for pagination
+
+    Returns:
+        List of server data
+    """
+    db = await get_pool()
+
+    try:
+        rows = await db.fetch(
+            '''
+            SELECT id, name, url, username, status, created_at
+            FROM servers
+            ORDER BY created_at DESC
+            LIMIT $1 OFFSET $2
+            ''',
+            limit, offset
+        )
+        return [dict(row) for row in rows]
+    except Exception as e:
+        logger.error(f"Error getting all servers: {e}")
+        return []
+
+
+async def get_server_details(server_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get server details.
+
+    Args:
+        server_id: Server ID
+
+    Returns:
+        Server data if found, None otherwise
+    """
+    db = await get_pool()
+
+    try:
+        row = await db.fetchrow(
+            '''
+            SELECT id, name, url, username, password, api_key, status, created_at, updated_at
+            FROM servers
+            WHERE id = $1
+            ''',
+            _row_id(server_id)
+        )
+        return dict(row) if row else None
+    except Exception as e:
+        logger.error(f"Error getting server details: {e}")
+        return None
+
+
+async def update_server(server_id: str, **kwargs) -> bool:
+    """
+    Update server information.
+
+    Args:
+        server_id: Server ID
+        **kwargs: Fields to update (e.g., name='New Name', status='active')
+
+    Returns:
+        True if successful, False otherwise
+    """
+    return await _update_row("servers", "server", server_id, kwargs)
+
+
+async def delete_server(server_id: str) -> bool:
+    """
+    Delete a server.
+
+    Args:
+        server_id: Server ID
+
+    Returns:
+        True if successful, False otherwise
+    """
+    db = await get_pool()
+
+    try:
+        status = await db.execute('DELETE FROM servers WHERE id = $1', _row_id(server_id))
+
+        if _rowcount(status) > 0:
+            logger.info(f"Deleted server {server_id}")
+            return True
+        else:
+            logger.warning(f"No server found with ID {server_id}")
+            return False
+    except Exception as e:
+        logger.error(f"Error deleting server: {e}")
+        return False
@@ -2,12 +2,24 @@
 Configuration utilities for the Telegram bot.
 
 This module provides functions for loading and managing configuration settings.
+
+The configuration is built once into a snapshot, together with the set of
+admin user IDs, and rebuilt when one of the settings it reads or an admin
+flag changes (see utils/settings_cache.py), or after CONFIG_SNAPSHOT_TTL
+seconds in case a notification was missed. If the database cannot be read
+the previous snapshot is kept and the rebuild retried after
+CONFIG_RETRY_DELAY seconds.
 """
 
 import os
+import copy
 import json
+import time
 import logging
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, FrozenSet, Optional
+
+from utils.settings_cache import ADMIN_USERS_KEY, settings_cache
 
 # Configure logging
 logger = logging.getLogger("telegram_bot")
@@ -28,19 +40,39 @@ DEFAULT_CONFIG = {
     },
     "threexui": {
         "api_timeout": 30,
-        "session_expiry": 3600
+        "session_expiry": 3600,
+        "max_connections": 20,
+        "keepalive_expiry": 60,
+        "inbound_cache_ttl": 30,
+        "connect_timeout": 5,
+        "circuit_failure_threshold": 5,
+        "circuit_recovery_timeout": 30
+    },
+    "metrics": {
+        "enabled": True,
+        "port": 9100
     }
 }
 
+# Settings read by build_config()
+CONFIG_SETTING_KEYS = ("card_payment_details", "zarinpal_payment_details", "admin_user_ids")
 
-def load_config() -> Dict[str, Any]:
+CONFIG_SNAPSHOT_TTL = int(os.getenv("CONFIG_SNAPSHOT_TTL", "300"))
+CONFIG_RETRY_DELAY = int(os.getenv("CONFIG_RETRY_DELAY", "5"))
+
+
+def build_config(from_database: bool = True) -> Dict[str, Any]:
     """
-    Load configuration from environment variables and return as a dictionary.
+    Build the configuration from environment variables and the database.
+    
+    Args:
+        from_database: Apply the settings stored in the database; errors
+            reading them are raised
     
     Returns:
         Dictionary containing configuration settings
     """
-    config = DEFAULT_CONFIG.copy()
+    config = copy.deepcopy(DEFAULT_CONFIG)
     
     # Load admin user IDs
     admin_ids_str = os.getenv("ADMIN_USER_IDS", "[]")
@@ -63,48 +95,23 @@ def load_config() -> Dict[str, Any]:
     # Load 3X-UI configuration
     config["threexui"]["api_timeout"] = int(os.getenv("THREEXUI_API_TIMEOUT", "30"))
     config["threexui"]["session_expiry"] = int(os.getenv("THREEXUI_SESSION_EXPIRY", "3600"))
+    config["threexui"]["max_connections"] = int(os.getenv("THREEXUI_MAX_CONNECTIONS", "20"))
+    config["threexui"]["keepalive_expiry"] = int(os.getenv("THREEXUI_KEEPALIVE_EXPIRY", "60"))
+    config["threexui"]["inbound_cache_ttl"] = int(os.getenv("THREEXUI_INBOUND_CACHE_TTL", "30"))
+    config["threexui"]["connect_timeout"] = int(os.getenv("THREEXUI_CONNECT_TIMEOUT", "5"))
+    config["threexui"]["circuit_failure_threshold"] = int(os.getenv("THREEXUI_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    config["threexui"]["circuit_recovery_timeout"] = int(os.getenv("THREEXUI_CIRCUIT_RECOVERY_TIMEOUT", "30"))
+    
+    # Load metrics configuration
+    config["metrics"]["enabled"] = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    config["metrics"]["port"] = int(os.getenv("METRICS_PORT", "9100"))
     
     # Load from database if available
     try:
-        from utils.database import get_setting
-        
-        # Card payment details
-        card_payment_details = get_setting("card_payment_details")
-        if card_payment_details:
-            try:
-                card_details = json.loads(card_payment_details)
-                if "card_number" in card_details:
-                    config["card_payment"]["card_number"] = card_details["card_number"]
-                if "card_holder" in card_details:
-                    config["card_payment"]["card_holder"] = card_details["card_holder"]
-            except json.JSONDecodeError:
-                logger.error(f"Invalid card_payment_details format in database: {card_payment_details}")
-        
-        # Zarinpal details
-        zarinpal_details = get_setting("zarinpal_payment_details")
-        if zarinpal_details:
-            try:
-                zarinpal = json.loads(zarinpal_details)
-                if "merchant_id" in zarinpal:
-                    config["zarinpal"]["merchant_id"] = zarinpal["merchant_id"]
-                    config["zarinpal"]["enabled"] = bool(zarinpal["merchant_id"])
-            except json.JSONDecodeError:
-                logger.error(f"Invalid zarinpal_payment_details format in database: {zarinpal_details}")
-        
-        # Admin user IDs
-        admin_user_ids = get_setting("admin_user_ids")
-        if admin_user_ids:
-            try:
-                admin_ids = json.loads(admin_user_ids)
-                if isinstance(admin_ids, list):
-                    config["admin_ids"] = admin_ids
-            except json.JSONDecodeError:
-                logger.error(f"Invalid admin_user_ids format in database: {admin_user_ids}")
-        
+        if from_database:
+            _apply_database_settings(config)
     except ImportError:
         logger.warning("Database module not available, using configuration from environment variables only")
-    except Exception as e:
-        logger.error(f"Error loading configuration from database: {e}")
     
     # Validate configuration
     if not config["card_payment"]["card_number"] or not config["card_payment"]["card_holder"]:
@@ -119,10 +126,167 @@ def load_config() -> Dict[str, Any]:
     return config
 
 
+def _apply_database_settings(config: Dict[str, Any]) -> None:
+    from utils.database import load_setting
+    
+    # Card payment details
+    card_payment_details = load_setting("card_payment_details")
+    if card_payment_details:
+        try:
+            card_details = json.loads(card_payment_details)
+            if "card_number" in card_details:
+                config["card_payment"]["card_number"] = card_details["card_number"]
+            if "card_holder" in card_details:
+                config["card_payment"]["card_holder"] = card_details["card_holder"]
+        except json.JSONDecodeError:
+            logger.error(f"Invalid card_payment_details format in database: {card_payment_details}")
+    
+    # Zarinpal details
+    zarinpal_details = load_setting("zarinpal_payment_details")
+    if zarinpal_details:
+        try:
+            zarinpal = json.loads(zarinpal_details)
+            if "merchant_id" in zarinpal:
+                config["zarinpal"]["merchant_id"] = zarinpal["merchant_id"]
+                config["zarinpal"]["enabled"] = bool(zarinpal["merchant_id"])
+        except json.JSONDecodeError:
+            logger.error(f"Invalid zarinpal_payment_details format in database: {zarinpal_details}")
+    
+    # Admin user IDs
+    admin_user_ids = load_setting("admin_user_ids")
+    if admin_user_ids:
+        try:
+            admin_ids = json.loads(admin_user_ids)
+            if isinstance(admin_ids, list):
+                config["admin_ids"] = admin_ids
+        except json.JSONDecodeError:
+            logger.error(f"Invalid admin_user_ids format in database: {admin_user_ids}")
+
+
+class ConfigSnapshot:
+    """Configuration and admin user IDs as of one point in time."""
+    
+    def __init__(self, config: Dict[str, Any], admin_ids: FrozenSet[int], generation: int = 0):
+        """
+        Initialize the snapshot.
+        
+        Args:
+            config: Configuration built by build_config()
+            admin_ids: IDs of the configured admins and of users flagged as admins
+            generation: Value of the invalidation counter the snapshot was built at
+        """
+        self.config = config
+        self.admin_ids = admin_ids
+        self.generation = generation
+        self.built_at = time.monotonic()
+    
+    @property
+    def expired(self) -> bool:
+        """Whether the snapshot is older than CONFIG_SNAPSHOT_TTL."""
+        return time.monotonic() - self.built_at > CONFIG_SNAPSHOT_TTL
+
+
+_snapshot: Optional[ConfigSnapshot] = None
+_snapshot_lock = threading.Lock()
+# Bumped on every invalidation; snapshots built at an older value are stale
+_snapshot_generation = 0
+# No rebuild is attempted before this time after a failed one
+_retry_at = 0.0
+
+
+def _is_current(snapshot: Optional[ConfigSnapshot]) -> bool:
+    return snapshot is not None and snapshot.generation == _snapshot_generation and not snapshot.expired
+
+
+def _build_snapshot(generation: int, from_database: bool = True) -> ConfigSnapshot:
+    config = build_config(from_database)
+    
+    admin_ids = set()
+    for admin_id in config["admin_ids"]:
+        try:
+            admin_ids.add(int(admin_id))
+        except (TypeError, ValueError):
+            logger.error(f"Invalid admin user ID: {admin_id}")
+    
+    if from_database:
+        from utils.database import get_admin_user_ids
+        admin_ids.update(get_admin_user_ids())
+    
+    return ConfigSnapshot(config, frozenset(admin_ids), generation)
+
+
+def get_config_snapshot() -> ConfigSnapshot:
+    """
+    Get the current configuration snapshot, building it if needed.
+    
+    A snapshot is only cached when the database could be read. Otherwise the
+    previous snapshot is served, or, if there is none yet, one built from
+    the environment alone, until a rebuild succeeds.
+    
+    Returns:
+        The configuration snapshot; treat it as read-only
+    """
+    global _snapshot, _retry_at
+    snapshot = _snapshot
+    if _is_current(snapshot):
+        return snapshot
+    
+    with _snapshot_lock:
+        snapshot = _snapshot
+        if _is_current(snapshot):
+            return snapshot
+        
+        generation = _snapshot_generation
+        if time.monotonic() < _retry_at:
+            return snapshot or _build_snapshot(generation, from_database=False)
+        
+        try:
+            fresh = _build_snapshot(generation)
+        except Exception as e:
+            logger.error(f"Error loading configuration from database: {e}")
+            _retry_at = time.monotonic() + CONFIG_RETRY_DELAY
+            return snapshot or _build_snapshot(generation, from_database=False)
+        
+        _snapshot = fresh
+    return fresh
+
+
+def invalidate_config(key: Optional[str] = None) -> None:
+    """
+    Mark the configuration snapshot stale if it depends on a changed key.
+    
+    The stale snapshot is still served if the database cannot be read when
+    it is rebuilt.
+    
+    Args:
+        key: Changed setting key, ADMIN_USERS_KEY, or None if anything may
+            have changed
+    """
+    global _snapshot_generation
+    if key is None or key in CONFIG_SETTING_KEYS or key == ADMIN_USERS_KEY:
+        _snapshot_generation += 1
+
+
+settings_cache.add_listener(invalidate_config)
+
+
+def load_config() -> Dict[str, Any]:
+    """
+    Get the configuration.
+    
+    Returns:
+        Dictionary containing configuration settings, a copy of the snapshot
+    """
+    return copy.deepcopy(get_config_snapshot().config)
+
+
 def is_admin(user_id: int) -> bool:
     """
     Check if the user is an admin.
     
+    Admins are the users flagged as admins in the database and the IDs in
+    ADMIN_USER_IDS or the admin_user_ids setting.
+    
     Args:
         user_id: Telegram user ID
         
@@ -130,15 +294,7 @@ def is_admin(user_id: int) -> bool:
         True if the user is an admin, False otherwise
     """
     try:
-        # First, check in the database
-        from utils.database import get_user
-        user = get_user(user_id)
-        if user and user.get("is_admin", False):
-            return True
-        
-        # Then, check in the config
-        config = load_config()
-        return str(user_id) in map(str, config["admin_ids"])
+        return int(user_id) in get_config_snapshot().admin_ids
     except Exception as e:
         logger.error(f"Error checking admin status: {e}")
         return False
@@ -151,8 +307,7 @@ def get_card_payment_details() -> Dict[str, Any]:
     Returns:
         Dictionary containing card payment details
     """
-    config = load_config()
-    return config["card_payment"]
+    return copy.deepcopy(get_config_snapshot().config["card_payment"])
 
 
 def get_zarinpal_details() -> Dict[str, Any]:
@@ -162,8 +317,7 @@ def get_zarinpal_details() -> Dict[str, Any]:
     Returns:
         Dictionary containing Zarinpal payment details
     """
-    config = load_config()
-    return config["zarinpal"]
+    return copy.deepcopy(get_config_snapshot().config["zarinpal"])
 
 
 def get_threexui_config() -> Dict[str, Any]:
@@ -173,5 +327,14 @@ def get_threexui_config() -> Dict[str, Any]:
     Returns:
         Dictionary containing 3X-UI API configuration
     """
-    config = load_config()
-    return config["threexui"] 
\ No newline at end of file
+    return copy.deepcopy(get_config_snapshot().config["threexui"]) 
+
+
+def get_metrics_config() -> Dict[str, Any]:
+    """
+    Get Prometheus metrics configuration.
+    
+    Returns:
+        Dictionary containing metrics configuration
+    """
+    return copy.deepcopy(get_config_snapshot().config["metrics"])
@@ -11,8 +11,10 @@ import logging
 from datetime import datetime
 from typing import Dict, List, Any, Optional, Tuple
 import psycopg2
-from psycopg2.extras import DictCursor
-from psycopg2.pool import SimpleConnectionPool
+from psycopg2.extras import DictCursor, execute_values
+from utils.db_pool import ConnectionPool
+from utils.settings_cache import NOTIFY_TRIGGER_SQL, settings_cache
+from utils.user_cache import user_cache
 import uuid
 
 # Configure logging
@@ -25,10 +27,15 @@ DB_CONFIG = {
     "password": os.getenv("DB_PASSWORD", ""),
     "host": os.getenv("DB_HOST", "localhost"),
     "port": os.getenv("DB_PORT", "5432"),
-    "minconn": 1,
-    "maxconn": 10
+    "minconn": int(os.getenv("DB_POOL_MIN", "1")),
+    "maxconn": int(os.getenv("DB_POOL_MAX", "10"))
 }
 
+# Seconds to wait for a free connection, and idle seconds after which a
+# connection is checked before use
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_VALIDATE_AFTER = float(os.getenv("DB_POOL_VALIDATE_AFTER", "30"))
+
 # Create connection pool
 pool = None
 
@@ -41,7 +48,12 @@ def setup_database() -> None:
     
     try:
         # Create connection pool
-        pool = SimpleConnectionPool(**DB_CONFIG)
+        if pool is None:
+            pool = ConnectionPool(
+                timeout=DB_POOL_TIMEOUT,
+                validate_after=DB_POOL_VALIDATE_AFTER,
+                **DB_CONFIG
+            )
         conn = pool.getconn()
         cursor = conn.cursor()
         
@@ -158,6 +170,9 @@ def setup_database() -> None:
         )
         ''')
         
+        # Notify every bot process when a setting or the admin flag changes
+        cursor.execute(NOTIFY_TRIGGER_SQL)
+        
         # Insert default settings if they don't exist
         default_settings = [
             ('card_payment_details', json.dumps({
@@ -204,6 +219,19 @@ def release_db_connection(conn):
     if conn and pool:
         pool.putconn(conn)
 
+def pool_stats() -> Dict[str, Any]:
+    """
+    Get the connection pool's current usage.
+    
+    Returns:
+        Dictionary with in_use, idle, max and waiting connection counts and
+        the pool's checkout, timeout and wait time counters
+    """
+    if not pool:
+        return {"in_use": 0, "idle": 0, "max": DB_CONFIG["maxconn"], "waiting": 0,
+                "checkouts": 0, "timeouts": 0, "replaced": 0, "wait_seconds": 0.0}
+    return pool.stats()
+
 # User functions
 
 def create_user_if_not_exists(user_id: int, username: Optional[str], first_name: str,
@@ -211,6 +239,9 @@ def create_user_if_not_exists(user_id: int, username: Optional[str], first_name:
     """
     Create a user if they don't exist in the database.
     
+    Existing users get their name and username refreshed, unless the cached
+    row already has them.
+    
     Args:
         user_id: Telegram user ID
         username: Telegram username
@@ -218,29 +249,30 @@ def create_user_if_not_exists(user_id: int, username: Optional[str], first_name:
         last_name: User's last name
         language_code: User's language code
     """
+    if user_cache.matches(user_id, {"username": username, "first_name": first_name, "last_name": last_name}):
+        return
+    
     conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor = conn.cursor(cursor_factory=DictCursor)
     
     try:
-        # Check if user exists
-        cursor.execute('SELECT id FROM users WHERE id = %s', (user_id,))
-        user = cursor.fetchone()
+        cursor.execute(
+            '''
+            INSERT INTO users (id, username, first_name, last_name, language_code)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (id) DO UPDATE
+            SET username = EXCLUDED.username, first_name = EXCLUDED.first_name,
+                last_name = EXCLUDED.last_name, updated_at = CURRENT_TIMESTAMP
+            RETURNING *, (xmax = 0) AS created
+            ''',
+            (user_id, username, first_name, last_name, language_code)
+        )
+        user = dict(cursor.fetchone())
+        conn.commit()
         
-        if not user:
-            # Create user
-            cursor.execute(
-                'INSERT INTO users (id, username, first_name, last_name, language_code) VALUES (%s, %s, %s, %s, %s)',
-                (user_id, username, first_name, last_name, language_code)
-            )
-            conn.commit()
+        if user.pop("created"):
             logger.info(f"Created new user: {user_id} ({username})")
-        else:
-            # Update user information
-            cursor.execute(
-                'UPDATE users SET username = %s, first_name = %s, last_name = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s',
-                (username, first_name, last_name, user_id)
-            )
-            conn.commit()
+        user_cache.set_user(user_id, user)
     except Exception as e:
         logger.error(f"Error creating/updating user: {e}")
         conn.rollback()
@@ -251,7 +283,7 @@ def create_user_if_not_exists(user_id: int, username: Optional[str], first_name:
 
 def get_user(user_id: int) -> Optional[Dict[str, Any]]:
     """
-    Get user information from the database.
+    Get user information, from the user cache when possible.
     
     Args:
         user_id: Telegram user ID
@@ -259,6 +291,10 @@ def get_user(user_id: int) -> Optional[Dict[str, Any]]:
     Returns:
         User information as a dictionary or None if not found
     """
+    hit, user = user_cache.get_user(user_id)
+    if hit:
+        return user
+    
     conn = get_db_connection()
     cursor = conn.cursor(cursor_factory=DictCursor)
     
@@ -269,6 +305,7 @@ def get_user(user_id: int) -> Optional[Dict[str, Any]]:
         
         user = cursor.fetchone()
         if user:
+            user_cache.set_user(user_id, dict(user))
             return dict(user)
         return None
     except Exception as e:
@@ -288,33 +325,40 @@ def get_user_preferences(user_id: int) -> Dict[str, Any]:
     Returns:
         User preferences as dictionary
     """
+    hit, preferences = user_cache.get_preferences(user_id)
+    if hit:
+        return preferences
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
         # Check if user exists
-        cursor.execute('SELECT id FROM users WHERE id = %s', (user_id,))
-        user = cursor.fetchone()
-        
-        if not user:
-            # Create user with default preferences
-            return {"language": "en"}
+        if not user_cache.get_user(user_id)[0]:
+            cursor.execute('SELECT id FROM users WHERE id = %s', (user_id,))
+            user = cursor.fetchone()
+            
+            if not user:
+                # Create user with default preferences
+                return {"language": "en"}
         
         # Check if preferences exist
         cursor.execute('SELECT preferences FROM user_preferences WHERE user_id = %s', (user_id,))
         preferences = cursor.fetchone()
         
         if preferences:
-            return preferences[0] if preferences[0] else {"language": "en"}
+            preferences = preferences[0] if preferences[0] else {"language": "en"}
         else:
             # Create default preferences
-            default_prefs = {"language": "en"}
+            preferences = {"language": "en"}
             cursor.execute(
                 'INSERT INTO user_preferences (user_id, preferences) VALUES (%s, %s)',
-                (user_id, json.dumps(default_prefs))
+                (user_id, json.dumps(preferences))
             )
             conn.commit()
-            return default_prefs
+        
+        user_cache.set_preferences(user_id, preferences)
+        return preferences
     except Exception as e:
         logger.error(f"Error getting user preferences: {e}")
         return {"language": "en"}
@@ -356,6 +400,7 @@ def update_user_preferences(user_id: int, preferences: Dict[str, Any]) -> bool:
             (user_id, json.dumps(preferences), json.dumps(preferences))
         )
         conn.commit()
+        user_cache.set_preferences(user_id, preferences)
         return True
     except Exception as e:
         logger.error(f"Error updating user preferences: {e}")
@@ -375,6 +420,10 @@ def get_user_language(user_id: int) -> str:
     Returns:
         Language code (defaults to 'en')
     """
+    hit, user = user_cache.get_user(user_id)
+    if hit:
+        return user.get('language_code') or 'en'
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -427,6 +476,7 @@ def update_user(user_id: int, **kwargs) -> bool:
         conn.commit()
         
         if cursor.rowcount > 0:
+            user_cache.update_user(user_id, kwargs)
             logger.info(f"Updated user {user_id} with {kwargs}")
             return True
         else:
@@ -440,6 +490,26 @@ def update_user(user_id: int, **kwargs) -> bool:
         cursor.close()
         release_db_connection(conn)
 
+def get_admin_user_ids() -> List[int]:
+    """
+    Get the IDs of users flagged as admins.
+    
+    Database errors are raised, so a failed read is not taken for an empty
+    list.
+    
+    Returns:
+        List of Telegram user IDs
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('SELECT id FROM users WHERE is_admin')
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
 def update_user_language(user_id: int, language_code: str) -> bool:
     """
     Update user's language preference.
@@ -455,9 +525,27 @@ def update_user_language(user_id: int, language_code: str) -> bool:
 
 # Settings functions
 
-def get_setting(key: str) -> Any:
+def format_setting(value: Any) -> Any:
     """
-    Get a setting from the database.
+    Format a stored setting value for get_setting().
+    
+    Args:
+        value: Setting value as decoded from the database
+        
+    Returns:
+        The value, with dictionaries as JSON strings
+    """
+    # Return the value as a string to ensure it can be properly parsed by json.loads()
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return value
+
+
+def load_setting(key: str) -> Any:
+    """
+    Get a setting, from the settings cache when possible.
+    
+    Unlike get_setting(), database errors are raised.
     
     Args:
         key: Setting key
@@ -465,6 +553,11 @@ def get_setting(key: str) -> Any:
     Returns:
         Setting value or None if not found
     """
+    hit, value = settings_cache.lookup(key)
+    if hit:
+        return format_setting(value)
+    
+    generation = settings_cache.generation
     conn = get_db_connection()
     cursor = conn.cursor(cursor_factory=DictCursor)
     
@@ -472,20 +565,60 @@ def get_setting(key: str) -> Any:
         cursor.execute('SELECT value FROM settings WHERE key = %s', (key,))
         result = cursor.fetchone()
         
-        if result:
-            # Return the value as a string to ensure it can be properly parsed by json.loads()
-            if isinstance(result['value'], dict):
-                return json.dumps(result['value'])
-            return result['value']
-        return None
+        value = result['value'] if result else None
+        settings_cache.store(key, value, generation)
+        return format_setting(value)
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
+
+def get_setting(key: str) -> Any:
+    """
+    Get a setting, from the settings cache when possible.
+    
+    Args:
+        key: Setting key
+        
+    Returns:
+        Setting value or None if not found
+    """
+    try:
+        return load_setting(key)
     except Exception as e:
         logger.error(f"Error getting setting: {e}")
         return None
+
+
+def load_all_settings() -> Dict[str, Any]:
+    """
+    Load every setting's value.
+    
+    Returns:
+        Setting values by key
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('SELECT key, value FROM settings')
+        return dict(cursor.fetchall())
     finally:
         cursor.close()
         release_db_connection(conn)
 
 
+def start_settings_cache(wait: float = 5) -> None:
+    """
+    Load the settings into the in-process cache and keep them up to date.
+    
+    Args:
+        wait: Seconds to wait for the first load
+    """
+    dsn = {key: value for key, value in DB_CONFIG.items() if key not in ("minconn", "maxconn")}
+    settings_cache.start(lambda: psycopg2.connect(**dsn), load_all_settings, wait=wait)
+
+
 def update_setting(key: str, value: str) -> bool:
     """
     Update a setting value.
@@ -503,6 +636,8 @@ def update_setting(key: str, value: str) -> bool:
     try:
         cursor.execute('UPDATE settings SET value = %s WHERE key = %s', (value, key))
         conn.commit()
+        # Other processes are notified by the settings trigger
+        settings_cache.invalidate(key)
         return True
     except Exception as e:
         logger.error(f"Error updating setting: {e}")
@@ -826,6 +961,76 @@ def update_account_traffic(account_id: int, traffic_used: int) -> bool:
         release_db_connection(conn)
 
 
+def get_server_accounts(server_id: int) -> List[Dict[str, Any]]:
+    """
+    Get the traffic-relevant fields of all accounts on a server.
+    
+    Args:
+        server_id: Server (3X-UI panel) ID
+        
+    Returns:
+        List of dictionaries with id, email and traffic_used
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=DictCursor)
+    
+    try:
+        cursor.execute('''
+        SELECT id, config->>'email' AS email, traffic_used
+        FROM accounts
+        WHERE server_id = %s AND status != 'deleted'
+        ''', (server_id,))
+        
+        accounts = cursor.fetchall()
+        return [dict(account) for account in accounts]
+    except Exception as e:
+        logger.error(f"Error getting accounts for server {server_id}: {e}")
+        return []
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
+
+def bulk_update_account_traffic(updates: List[Tuple[int, int]]) -> int:
+    """
+    Update traffic usage for many accounts in a single statement.
+    
+    Args:
+        updates: List of (account_id, traffic_used) tuples, traffic in bytes
+        
+    Returns:
+        Number of updated rows
+    """
+    if not updates:
+        return 0
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        execute_values(
+            cursor,
+            '''
+            UPDATE accounts AS a
+            SET traffic_used = v.traffic_used, updated_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS v (id, traffic_used)
+            WHERE a.id = v.id
+            ''',
+            updates,
+            template='(%s::integer, %s::bigint)',
+            page_size=len(updates)
+        )
+        conn.commit()
+        return cursor.rowcount
+    except Exception as e:
+        logger.error(f"Error bulk updating account traffic: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        cursor.close()
+        release_db_connection(conn)
+
+
 # Support ticket functions
 
 def create_ticket(user_id: int, subject: str, message: str) -> Optional[str]:
@@ -1199,6 +1404,8 @@ def update_system_settings(settings: Dict[str, Any]) -> bool:
             )
         
         conn.commit()
+        for key in settings:
+            settings_cache.invalidate(key)
         logger.info(f"Updated system settings: {settings}")
         return True
     except Exception as e:
@@ -1472,6 +1679,7 @@ def delete_user(user_id: int) -> bool:
         # Then delete the user
         cursor.execute('DELETE FROM users WHERE id = %s', (user_id,))
         conn.commit()
+        user_cache.invalidate(user_id)
         
         if cursor.rowcount > 0:
             logger.info(f"Deleted user {user_id}")
@@ -1510,6 +1718,7 @@ def reset_user_password(user_id: int) -> Optional[str]:
             (new_password, user_id)
         )
         conn.commit()
+        user_cache.invalidate(user_id)
         
         if cursor.rowcount > 0:
             logger.info(f"Reset password for user {user_id}")
@@ -1785,6 +1994,7 @@ def verify_payment(transaction_id: str) -> bool:
         )
         
         conn.commit()
+        user_cache.invalidate(user_id)
         logger.info(f"Verified payment {transaction_id} for user {user_id}")
         return True
     except Exception as e:
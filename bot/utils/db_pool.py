@@ -0,0 +1,224 @@
+"""
+Thread-safe PostgreSQL connection pool for the Telegram bot.
+
+psycopg2's SimpleConnectionPool is not thread-safe and raises as soon as
+every connection is checked out. This pool:
+- Can be shared by the event loop and worker threads
+- Makes getconn() wait up to a timeout for a connection to be returned
+- Checks connections that sat idle for a while before handing them out,
+  and replaces the ones the server has dropped
+- Keeps usage counters (in use, waiting, wait time, timeouts) that
+  utils/metrics.py exports
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+# Configure logging
+logger = logging.getLogger("telegram_bot")
+
+
+class PoolTimeout(PoolError):
+    """No connection became available within the pool timeout."""
+
+
+class ConnectionPool:
+    """Blocking, validating pool of psycopg2 connections."""
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float = 30.0,
+                 validate_after: float = 30.0, **kwargs: Any):
+        """
+        Initialize the pool and open `minconn` connections.
+
+        Args:
+            minconn: Connections opened up front and kept open
+            maxconn: Maximum number of open connections
+            timeout: Seconds getconn() waits for a free connection
+            validate_after: Idle seconds after which a connection is checked
+                with a query before it is handed out
+            **kwargs: Connection parameters passed to psycopg2.connect()
+        """
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: minconn={minconn}, maxconn={maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.validate_after = validate_after
+        self.closed = False
+
+        self._kwargs = kwargs
+        self._cond = threading.Condition()
+        # Idle connections with the time they were returned, most recent last
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        self.checkouts = 0
+        self.timeouts = 0
+        self.replaced = 0
+        self.wait_seconds = 0.0
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        return psycopg2.connect(**self._kwargs)
+
+    def _is_usable(self, conn, returned_at: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.validate_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self, timeout: Optional[float] = None):
+        """
+        Check a connection out of the pool.
+
+        Args:
+            timeout: Seconds to wait for a free connection, defaults to the
+                pool timeout
+
+        Returns:
+            An open psycopg2 connection
+
+        Raises:
+            PoolTimeout: If no connection became available in time
+            PoolError: If the pool is closed
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._cond:
+            while True:
+                if self.closed:
+                    raise PoolError("connection pool is closed")
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    # Reserve the slot; connect outside the lock
+                    self._size += 1
+                    conn, returned_at = None, None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f"No database connection available within {timeout}s "
+                        f"({self.maxconn} in use)"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._in_use += 1
+            self.checkouts += 1
+            self.wait_seconds += time.monotonic() - started
+
+        try:
+            if conn is not None and not self._is_usable(conn, returned_at):
+                logger.warning("Replacing stale database connection")
+                self._close_quietly(conn)
+                self.replaced += 1
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        return conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        """
+        Return a connection to the pool.
+
+        An open transaction is rolled back. Broken connections are closed and
+        their slot freed.
+
+        Args:
+            conn: Connection obtained from getconn()
+            close: Close the connection instead of keeping it
+        """
+        discard = close or self.closed or conn.closed
+        if not discard:
+            try:
+                status = conn.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard:
+            self._close_quietly(conn)
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self) -> None:
+        """Close the idle connections and refuse further checkouts."""
+        with self._cond:
+            self.closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close_quietly(conn)
+                self._size -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the pool's current usage and counters.
+
+        Returns:
+            Dictionary with in_use, idle, max and waiting connection counts,
+            the checkouts, timeouts and replaced counters and the total
+            seconds spent waiting for a connection
+        """
+        with self._cond:
+            return {
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "max": self.maxconn,
+                "waiting": self._waiting,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "replaced": self.replaced,
+                "wait_seconds": self.wait_seconds,
+            }
@@ -6,27 +6,17 @@ This module provides decorators for common bot functionality.
 
 import logging
 import functools
-import os
 from typing import Callable, Any, Optional, List
 
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from utils.database import get_user
+from utils.user_context import resolve_user
+from utils.config import is_admin
 from utils.i18n import get_text
 
 logger = logging.getLogger(__name__)
 
-# Get admin user IDs from environment variable
-ADMIN_USER_IDS = os.getenv("ADMIN_USER_IDS", "[]")
-try:
-    ADMIN_USER_IDS = eval(ADMIN_USER_IDS)
-    if not isinstance(ADMIN_USER_IDS, list):
-        ADMIN_USER_IDS = []
-except Exception as e:
-    logger.error(f"Error parsing ADMIN_USER_IDS: {e}")
-    ADMIN_USER_IDS = []
-
 def require_user(func: Callable) -> Callable:
     """
     Decorator to check if the user exists in the database.
@@ -43,7 +33,7 @@ def require_user(func: Callable) -> Callable:
     @functools.wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args: Any, **kwargs: Any) -> Any:
         user_id = update.effective_user.id
-        user = get_user(user_id)
+        user = await resolve_user(update, context)
         
         if not user:
             # User not found
@@ -74,7 +64,7 @@ def require_auth(func: Callable) -> Callable:
     @functools.wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args: Any, **kwargs: Any) -> Any:
         user_id = update.effective_user.id
-        user = get_user(user_id)
+        user = await resolve_user(update, context)
         
         if not user or user.get('status') != 'active':
             # User not found or not active
@@ -93,7 +83,7 @@ def require_admin(func: Callable) -> Callable:
     """
     Decorator to require admin privileges before executing a handler.
     
-    This decorator checks if the user is in the list of admin user IDs.
+    This decorator checks if the user is in the cached set of admin user IDs.
     If not, it sends a message indicating that the command is only available to admins.
     
     Args:
@@ -106,7 +96,7 @@ def require_admin(func: Callable) -> Callable:
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args: Any, **kwargs: Any) -> Any:
         user_id = update.effective_user.id
         
-        if user_id not in ADMIN_USER_IDS:
+        if not is_admin(user_id):
             # User is not an admin
             await update.effective_message.reply_text(
                 get_text('admin.not_authorized', user_id),
@@ -0,0 +1,155 @@
+"""
+Incremental JSON parsing for large panel responses.
+
+The 3X-UI inbound list arrives as {"success": ..., "msg": ..., "obj": [...]}
+and can be several megabytes for panels with thousands of clients.
+JSONArrayStream pulls the items of the "obj" array out of the response one at
+a time as chunks arrive, so only the item being parsed is held in memory
+instead of the whole document and its parsed copy.
+"""
+
+import re
+import json
+from typing import Any, List
+
+_STRUCTURAL = re.compile(r'[{}\[\]",:]')
+_STRING_END = re.compile(r'["\\]')
+_NON_SPACE = re.compile(r'\S')
+
+
+class JSONArrayStream:
+    """
+    Extract the items of one top-level array from a JSON object fed in chunks.
+
+    Items are expected to be objects or arrays, which is what the panel
+    returns; scalar items are skipped.
+    """
+
+    def __init__(self, key: str = "obj"):
+        """
+        Initialize the stream.
+
+        Args:
+            key: Top-level key holding the array
+        """
+        self.key = key
+        self.found = False
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_start = None
+        self._last_string = None
+        self._expect_value = False
+        self._item_start = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        """
+        Feed the next chunk of the document.
+
+        Args:
+            chunk: Next piece of the response text
+
+        Returns:
+            Items completed by this chunk
+        """
+        if self.done:
+            return []
+
+        self._buffer += chunk
+        items = []
+        buffer = self._buffer
+
+        while not self.done:
+            if self._in_string:
+                match = _STRING_END.search(buffer, self._pos)
+                if not match:
+                    self._pos = len(buffer)
+                    break
+                if match.group() == "\\":
+                    if match.end() >= len(buffer):
+                        # The escaped character is in the next chunk
+                        self._pos = match.start()
+                        break
+                    self._pos = match.end() + 1
+                    continue
+                self._in_string = False
+                self._pos = match.end()
+                if not self.found and self._depth == 1:
+                    self._last_string = buffer[self._string_start + 1:match.start()]
+                continue
+
+            if self._expect_value:
+                match = _NON_SPACE.search(buffer, self._pos)
+                if not match:
+                    self._pos = len(buffer)
+                    break
+                self._expect_value = False
+                if match.group() != "[":
+                    # The key holds null or a non-array value
+                    self.done = True
+                    break
+                self.found = True
+                self._depth = 0
+                self._pos = match.end()
+                continue
+
+            match = _STRUCTURAL.search(buffer, self._pos)
+            if not match:
+                self._pos = len(buffer)
+                break
+
+            char = match.group()
+            self._pos = match.end()
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = match.start()
+                continue
+
+            if not self.found:
+                # Looking for the key among the top-level members
+                if char in "{[":
+                    self._depth += 1
+                elif char in "}]":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self.done = True
+                elif char == ":" and self._depth == 1 and self._last_string == self.key:
+                    self._expect_value = True
+                elif char == ",":
+                    self._last_string = None
+                continue
+
+            if char in "{[":
+                if self._depth == 0:
+                    self._item_start = match.start()
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # End of the array
+                    self.done = True
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    items.append(json.loads(buffer[self._item_start:self._pos]))
+                    self._item_start = None
+
+        self._trim()
+        return items
+
+    def _trim(self) -> None:
+        """Drop the part of the buffer that has been fully consumed."""
+        keep = self._pos
+        if self._item_start is not None:
+            keep = min(keep, self._item_start)
+        if self._in_string and self._string_start is not None:
+            keep = min(keep, self._string_start)
+
+        self._buffer = self._buffer[keep:]
+        self._pos -= keep
+        if self._item_start is not None:
+            self._item_start -= keep
+        if self._string_start is not None:
+            self._string_start -= keep
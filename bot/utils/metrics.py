@@ -0,0 +1,234 @@
+"""
+Prometheus metrics for the Telegram bot.
+
+This module defines the bot's metrics and the helpers that record them:
+- Handler latency per handler and update throughput per update type
+- 3X-UI panel request latency and errors per panel and endpoint
+- Database pool utilization and checkout wait time, read from the pool at
+  scrape time
+- Notification send counts
+
+The panel metrics use the same names as backend/main/metrics.py so both
+processes can be graphed together. The metrics are served by
+start_metrics_server() on the port from the "metrics" config section.
+"""
+
+import time
+import logging
+import functools
+from typing import Any, Callable, Iterable
+from urllib.parse import urlparse
+
+import httpx
+from prometheus_client import Counter, Histogram, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, SummaryMetricFamily, REGISTRY
+from telegram import Update
+from telegram.ext import Application, BaseHandler, ConversationHandler, TypeHandler
+
+# Configure logging
+logger = logging.getLogger("telegram_bot")
+
+UPDATES = Counter(
+    "bot_updates_total",
+    "Telegram updates received",
+    ["type"]
+)
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds",
+    "Time spent in a Telegram handler callback",
+    ["handler"]
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total",
+    "Telegram handler callbacks that raised",
+    ["handler"]
+)
+PANEL_REQUEST_LATENCY = Histogram(
+    "threexui_request_duration_seconds",
+    "Latency of 3X-UI panel requests",
+    ["panel", "endpoint", "method"]
+)
+PANEL_REQUEST_ERRORS = Counter(
+    "threexui_request_errors_total",
+    "Failed 3X-UI panel requests",
+    ["panel", "endpoint", "reason"]
+)
+NOTIFICATIONS = Counter(
+    "bot_notifications_total",
+    "Notifications handled, by type and outcome",
+    ["type", "status"]
+)
+
+
+def endpoint_label(path: str) -> str:
+    """
+    Reduce a panel request path to a low-cardinality label.
+
+    Args:
+        path: URL path of the request
+
+    Returns:
+        The /panel/api/<group>/<action> prefix without IDs or emails
+    """
+    parts = [part for part in path.split('/') if part]
+    for i in range(len(parts) - 1):
+        if parts[i] == 'panel' and parts[i + 1] == 'api':
+            return '/' + '/'.join(parts[i:i + 4])
+    if parts and parts[-1] == 'login':
+        # Panels may be served under a secret base path
+        return '/login'
+    return '/' + '/'.join('{id}' if part.isdigit() else part for part in parts)
+
+
+def panel_label(base_url: str) -> str:
+    """Panel label: host and port of the panel URL."""
+    return urlparse(base_url).netloc or base_url
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records latency and errors of panel requests."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, base_url: str):
+        """
+        Initialize the transport.
+
+        Args:
+            transport: Transport that actually sends the requests
+            base_url: Base URL of the panel
+        """
+        self.transport = transport
+        self.panel = panel_label(base_url)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        """Send a request and record its latency and outcome."""
+        endpoint = endpoint_label(request.url.path)
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except httpx.TransportError as e:
+            PANEL_REQUEST_ERRORS.labels(self.panel, endpoint, type(e).__name__).inc()
+            raise
+        finally:
+            PANEL_REQUEST_LATENCY.labels(self.panel, endpoint, request.method).observe(time.perf_counter() - started)
+
+        if response.status_code >= 400:
+            PANEL_REQUEST_ERRORS.labels(self.panel, endpoint, f"http_{response.status_code}").inc()
+        return response
+
+    async def aclose(self) -> None:
+        """Close the underlying transport."""
+        await self.transport.aclose()
+
+
+def count_notification(notification_type: str, status: str) -> None:
+    """
+    Count a notification.
+
+    Args:
+        notification_type: Notification type (expiry, traffic, payments, system)
+        status: Outcome (sent, disabled, failed)
+    """
+    NOTIFICATIONS.labels(notification_type, status).inc()
+
+
+def _handler_name(callback: Callable) -> str:
+    module = getattr(callback, "__module__", "") or ""
+    return f"{module.rsplit('.', 1)[-1]}.{getattr(callback, '__name__', type(callback).__name__)}"
+
+
+def _timed(callback: Callable) -> Callable:
+    name = _handler_name(callback)
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - started)
+
+    wrapper.__metrics_timed__ = True
+    return wrapper
+
+
+def _instrument_handlers(handlers: Iterable[BaseHandler]) -> None:
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            _instrument_handlers(handler.entry_points)
+            for state_handlers in handler.states.values():
+                _instrument_handlers(state_handlers)
+            _instrument_handlers(handler.fallbacks)
+        elif getattr(handler, "callback", None) and not getattr(handler.callback, "__metrics_timed__", False):
+            handler.callback = _timed(handler.callback)
+
+
+async def _count_update(update: Update, context: Any) -> None:
+    update_type = next((name for name in Update.ALL_TYPES if getattr(update, name, None) is not None), "unknown")
+    UPDATES.labels(update_type).inc()
+
+
+def instrument_application(application: Application) -> None:
+    """
+    Time every registered handler callback and count incoming updates.
+
+    Call it after all handlers have been added.
+
+    Args:
+        application: The bot application
+    """
+    for handlers in application.handlers.values():
+        _instrument_handlers(handlers)
+    # Group -1 runs before the regular handlers and does not stop them
+    application.add_handler(TypeHandler(Update, _count_update), group=-1)
+
+
+class DatabasePoolCollector:
+    """Reports the database connection pool's usage when scraped."""
+
+    def collect(self):
+        from utils.database import pool_stats
+
+        stats = pool_stats()
+        for key, description in (
+            ("in_use", "Connections checked out of the pool"),
+            ("idle", "Idle connections kept in the pool"),
+            ("max", "Maximum connections of the pool"),
+            ("waiting", "Threads waiting for a connection"),
+        ):
+            metric = GaugeMetricFamily(f"bot_db_pool_{key}_connections", description)
+            metric.add_metric([], stats.get(key, 0))
+            yield metric
+
+        yield SummaryMetricFamily(
+            "bot_db_pool_wait_seconds",
+            "Time spent waiting to check a connection out of the pool",
+            count_value=stats.get("checkouts", 0),
+            sum_value=stats.get("wait_seconds", 0.0)
+        )
+        for key, description in (
+            ("timeouts", "Checkouts that timed out waiting for a connection"),
+            ("replaced", "Stale connections replaced on checkout"),
+        ):
+            yield CounterMetricFamily(f"bot_db_pool_{key}", description, value=stats.get(key, 0))
+
+
+_server_started = False
+
+
+def start_metrics_server(port: int) -> None:
+    """
+    Serve /metrics over HTTP from a background thread.
+
+    Args:
+        port: Port to listen on
+    """
+    global _server_started
+    if _server_started:
+        return
+    REGISTRY.register(DatabasePoolCollector())
+    start_http_server(port)
+    _server_started = True
+    logger.info(f"Metrics exposed on port {port}")
@@ -0,0 +1,217 @@
+"""
+In-process cache of the settings table.
+
+Settings are read on the hottest paths of the bot (panel cookies, panel
+lookups, config loading), yet they rarely change. This module keeps every
+setting in memory and drops entries when they change anywhere:
+
+- A trigger on the settings table sends a NOTIFY on the settings_changed
+  channel with the changed key, whichever process made the change
+- A listener thread per process LISTENs on that channel and invalidates
+  the key
+- Each time the listener (re)connects it reloads all settings, since
+  notifications sent while it was disconnected are lost
+
+Other in-process caches derived from the database can subscribe with
+add_listener(). A trigger on the users table reports changes of the admin
+flag on the same channel as the key ADMIN_USERS_KEY.
+
+While the listener is not connected the cache is bypassed and every read
+goes to the database.
+"""
+
+import copy
+import time
+import select
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger("telegram_bot")
+
+CHANNEL = "settings_changed"
+ADMIN_USERS_KEY = "users.is_admin"
+
+# Seconds between keepalive queries on the listening connection
+KEEPALIVE_INTERVAL = 30
+# Seconds to wait before reconnecting the listener
+RECONNECT_DELAY = 5
+
+NOTIFY_TRIGGER_SQL = f'''
+CREATE OR REPLACE FUNCTION notify_settings_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{CHANNEL}', COALESCE(NEW.key, OLD.key));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS settings_changed ON settings;
+CREATE TRIGGER settings_changed
+AFTER INSERT OR UPDATE OR DELETE ON settings
+FOR EACH ROW EXECUTE FUNCTION notify_settings_changed();
+
+CREATE OR REPLACE FUNCTION notify_admin_users_changed() RETURNS trigger AS $$
+BEGIN
+    IF (TG_OP = 'INSERT' AND NEW.is_admin)
+       OR (TG_OP = 'DELETE' AND OLD.is_admin)
+       OR (TG_OP = 'UPDATE' AND NEW.is_admin IS DISTINCT FROM OLD.is_admin) THEN
+        PERFORM pg_notify('{CHANNEL}', '{ADMIN_USERS_KEY}');
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS admin_users_changed ON users;
+CREATE TRIGGER admin_users_changed
+AFTER INSERT OR UPDATE OF is_admin OR DELETE ON users
+FOR EACH ROW EXECUTE FUNCTION notify_admin_users_changed();
+'''
+
+
+class SettingsCache:
+    """Settings by key, invalidated by database notifications."""
+
+    def __init__(self):
+        """Initialize an empty, inactive cache."""
+        self._values: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a read that raced with a change
+        # does not store the old value
+        self._generation = 0
+        self._listening = False
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[Optional[str]], None]] = []
+
+    @property
+    def generation(self) -> int:
+        """Invalidation counter; pass it to store() after reading a setting."""
+        with self._lock:
+            return self._generation
+
+    def lookup(self, key: str) -> Tuple[bool, Any]:
+        """
+        Look a setting up.
+
+        Args:
+            key: Setting key
+
+        Returns:
+            Tuple of (hit, value); value is None for settings known not to exist
+        """
+        with self._lock:
+            if not self._listening or key not in self._values:
+                return False, None
+            return True, copy.deepcopy(self._values[key])
+
+    def store(self, key: str, value: Any, generation: int) -> None:
+        """
+        Cache a setting read from the database.
+
+        Args:
+            key: Setting key
+            value: Setting value, None if the setting does not exist
+            generation: Value of `generation` taken before the read
+        """
+        with self._lock:
+            if self._listening and generation == self._generation:
+                self._values[key] = value
+
+    def add_listener(self, callback: Callable[[Optional[str]], None]) -> None:
+        """
+        Call a function whenever a key is invalidated.
+
+        Args:
+            callback: Called with the changed key, or None when everything
+                may have changed
+        """
+        self._listeners.append(callback)
+
+    def _notify_listeners(self, key: Optional[str]) -> None:
+        for callback in self._listeners:
+            try:
+                callback(key)
+            except Exception as e:
+                logger.error(f"Error in settings change listener: {e}")
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """
+        Drop a setting from the cache.
+
+        Args:
+            key: Setting key, or None to drop every setting
+        """
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
+        self._notify_listeners(key)
+
+    def start(self, connect: Callable[[], Any], load_all: Callable[[], Dict[str, Any]], wait: float = 0) -> None:
+        """
+        Start the listener thread unless it is already running.
+
+        Args:
+            connect: Opens the listener's own psycopg2 connection
+            load_all: Returns all settings by key
+            wait: Seconds to wait for the first load of the settings
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, args=(connect, load_all), name="settings-listener", daemon=True
+            )
+            self._thread.start()
+        if wait:
+            self._ready.wait(wait)
+
+    def _run(self, connect: Callable[[], Any], load_all: Callable[[], Dict[str, Any]]) -> None:
+        while True:
+            conn = None
+            try:
+                conn = connect()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+
+                # Listening before loading: no change can fall in between
+                values = load_all()
+                with self._lock:
+                    self._generation += 1
+                    self._values = values
+                    self._listening = True
+                self._ready.set()
+                self._notify_listeners(None)
+                logger.info(f"Settings cache loaded {len(values)} settings")
+
+                self._listen(conn)
+            except Exception as e:
+                logger.warning(f"Settings cache listener disconnected: {e}")
+            finally:
+                with self._lock:
+                    self._listening = False
+                    self._values.clear()
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            time.sleep(RECONNECT_DELAY)
+
+    def _listen(self, conn: Any) -> None:
+        while True:
+            if select.select([conn], [], [], KEEPALIVE_INTERVAL) == ([], [], []):
+                # Nothing received; make sure the connection is still alive
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                continue
+
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                self.invalidate(notify.payload or None)
+
+
+settings_cache = SettingsCache()
@@ -0,0 +1,185 @@
+"""
+In-process cache of user rows and preferences.
+
+Almost every update reads the same user several times (the user row, the
+language, the preferences). This module keeps the most recently used users
+in a bounded LRU cache with a time-to-live:
+- utils/database.py and utils/async_database.py read through the cache and
+  write through it on update_user() and update_user_preferences()
+- Other writes to a user (balance, deletion) drop the entry
+- USER_CACHE_TTL bounds how long a change made by another process (e.g.
+  the backend) can go unnoticed
+"""
+
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+
+class _Entry:
+    __slots__ = ("user", "preferences", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.user: Optional[Dict[str, Any]] = None
+        self.preferences: Optional[Dict[str, Any]] = None
+        self.expires_at = expires_at
+
+
+class UserCache:
+    """Users and their preferences by Telegram user ID, least recently used evicted first."""
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: Maximum number of cached users
+            ttl: Seconds an entry is served before it is read again
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, user_id: int) -> Optional[_Entry]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return entry
+
+    def _entry(self, user_id: int) -> _Entry:
+        # Fresh data restarts the entry's time-to-live
+        entry = self._get(user_id)
+        if entry is None:
+            entry = self._entries[user_id] = _Entry(0)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        entry.expires_at = time.monotonic() + self.ttl
+        return entry
+
+    def _lookup(self, user_id: int, field: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._get(user_id)
+            value = getattr(entry, field) if entry else None
+            if value is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            return True, copy.deepcopy(value)
+
+    def get_user(self, user_id: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Look a user row up.
+
+        Args:
+            user_id: Telegram user ID
+
+        Returns:
+            Tuple of (hit, user row)
+        """
+        return self._lookup(user_id, "user")
+
+    def get_preferences(self, user_id: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Look a user's preferences up.
+
+        Args:
+            user_id: Telegram user ID
+
+        Returns:
+            Tuple of (hit, preferences)
+        """
+        return self._lookup(user_id, "preferences")
+
+    def matches(self, user_id: int, fields: Dict[str, Any]) -> bool:
+        """
+        Check whether a cached user row has the given column values.
+
+        Args:
+            user_id: Telegram user ID
+            fields: Column values to compare
+
+        Returns:
+            True if the user is cached and every column matches
+        """
+        with self._lock:
+            entry = self._get(user_id)
+            if entry is None or entry.user is None:
+                return False
+            return all(entry.user.get(key) == value for key, value in fields.items())
+
+    def set_user(self, user_id: int, user: Dict[str, Any]) -> None:
+        """
+        Cache a user row read from or written to the database.
+
+        Args:
+            user_id: Telegram user ID
+            user: Complete user row
+        """
+        with self._lock:
+            self._entry(user_id).user = copy.deepcopy(user)
+
+    def update_user(self, user_id: int, fields: Dict[str, Any]) -> None:
+        """
+        Apply an update of some columns to a cached user row.
+
+        Args:
+            user_id: Telegram user ID
+            fields: Updated columns
+        """
+        with self._lock:
+            entry = self._get(user_id)
+            if entry is not None and entry.user is not None:
+                entry.user.update(copy.deepcopy(fields))
+
+    def set_preferences(self, user_id: int, preferences: Dict[str, Any]) -> None:
+        """
+        Cache a user's preferences.
+
+        Args:
+            user_id: Telegram user ID
+            preferences: Preferences as stored in the database
+        """
+        with self._lock:
+            self._entry(user_id).preferences = copy.deepcopy(preferences)
+
+    def invalidate(self, user_id: int) -> None:
+        """
+        Drop a user from the cache.
+
+        Args:
+            user_id: Telegram user ID
+        """
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        """Drop every user from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the cache's size and hit counters.
+
+        Returns:
+            Dictionary with size, max_size, hits and misses
+        """
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache()
@@ -0,0 +1,59 @@
+"""
+Per-update user resolution for the Telegram bot.
+
+install_user_middleware() adds a handler that runs before all others and
+loads the sender's user row once per update (through the user cache). The
+row is kept on the update's context, where handlers and decorators read it
+with resolve_user() instead of querying again.
+"""
+
+import logging
+from typing import Any, Dict, Optional
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+from utils.async_database import get_user
+
+# Configure logging
+logger = logging.getLogger("telegram_bot")
+
+# Runs before the metrics update counter in group -1
+USER_MIDDLEWARE_GROUP = -2
+
+_NOT_RESOLVED = object()
+
+
+async def resolve_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[Dict[str, Any]]:
+    """
+    Get the user row of the update's sender, loading it at most once per update.
+
+    Args:
+        update: The update being handled
+        context: The update's callback context
+
+    Returns:
+        User information as a dictionary, or None if the sender is not registered
+    """
+    user = getattr(context, "db_user", _NOT_RESOLVED)
+    if user is _NOT_RESOLVED:
+        user = None
+        if update.effective_user:
+            user = await get_user(update.effective_user.id)
+        context.db_user = user
+    return user
+
+
+async def _resolve_user_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await resolve_user(update, context)
+
+
+def install_user_middleware(application: Application) -> None:
+    """
+    Resolve the sender's user row before the regular handlers run.
+
+    Args:
+        application: The bot application
+    """
+    # A group of its own: it does not stop the handlers of other groups
+    application.add_handler(TypeHandler(Update, _resolve_user_handler), group=USER_MIDDLEWARE_GROUP)
@@ -9,10 +9,12 @@ import logging
 import json
 import os
 import requests
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional
 from datetime import datetime, timedelta
 from requests.exceptions import RequestException
 
+from utils.json_stream import JSONArrayStream
+
 logger = logging.getLogger(__name__)
 
 class XUIClient:
@@ -128,10 +130,55 @@ class XUIClient:
             logger.error(f"Error during API request: {e}")
             return {"success": False, "msg": f"Error: {str(e)}", "obj": None}
     
+    def iter_inbounds(self) -> Iterator[Dict[str, Any]]:
+        """
+        Stream inbound configurations one at a time.
+        
+        The response is parsed incrementally, so only the inbound being
+        parsed is held in memory. Errors are logged and end the iteration.
+        
+        Yields:
+            Inbound configurations
+        """
+        if not self.is_connected:
+            logger.warning("Not connected to 3x-UI panel. Returning no inbounds.")
+            return
+        
+        url = f"{self.base_url}/panel/api/inbounds/list"
+        
+        try:
+            response = self.session.get(url, stream=True)
+            
+            # Check if session expired
+            if response.status_code == 401 or "login" in response.url:
+                response.close()
+                logger.info("Session expired, logging in again")
+                self._login()
+                response = self.session.get(url, stream=True)
+            
+            with response:
+                if response.status_code != 200:
+                    logger.error(f"Failed to get inbounds: HTTP {response.status_code}")
+                    return
+                
+                # iter_content only decodes when an encoding is known
+                response.encoding = response.encoding or "utf-8"
+                stream = JSONArrayStream()
+                for chunk in response.iter_content(chunk_size=65536, decode_unicode=True):
+                    yield from stream.feed(chunk)
+                
+                if not stream.found:
+                    logger.error("API request failed: no inbound list in response")
+                elif not stream.done:
+                    logger.error("Inbound list response ended early")
+        except RequestException as e:
+            logger.error(f"Network error during API request: {e}")
+        except ValueError as e:
+            logger.error(f"Invalid JSON response: {e}")
+    
     def get_inbounds(self) -> List[Dict[str, Any]]:
         """Get all inbound configurations."""
-        response = self._request("GET", "/panel/api/inbounds/list")
-        return response.get("obj", [])
+        return list(self.iter_inbounds())
     
     def get_inbound(self, inbound_id: int) -> Optional[Dict[str, Any]]:
         """
@@ -143,8 +190,8 @@ class XUIClient:
         Returns:
             Inbound configuration if found, None otherwise
         """
-        inbounds = self.get_inbounds()
-        for inbound in inbounds:
+        # Stop reading the list as soon as the inbound shows up
+        for inbound in self.iter_inbounds():
             if inbound.get("id") == inbound_id:
                 return inbound
         return None
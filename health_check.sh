@@ -128,7 +128,7 @@ check_api() {
     fi
     
     # بررسی اتصال به API
-    if curl -s "http://$API_HOST:$API_PORT/api/health/" | grep -q "status.*ok"; then
+    if curl -s "http://$API_HOST:$API_PORT/api/health/live/" | grep -q "status.*ok"; then
         log_message "SUCCESS" "API در حال اجرا است."
         return 0
     else